@@ -14,14 +14,12 @@
 
 from oslo_config import cfg
 from oslo_log import log as logging
-from oslo_serialization import jsonutils
 from oslo_utils import uuidutils
 
 from webob import exc
 
 from karbor.api import common
 from karbor.api.openstack import wsgi
-from karbor.common import constants
 from karbor import exception
 from karbor.i18n import _
 
@@ -139,6 +137,8 @@ class CheckpointViewBuilder(common.ViewBuilder):
                 'extra_info': checkpoint.get('extra_info'),
             }
         }
+        if checkpoint.get('timings') is not None:
+            checkpoint_ref['checkpoint']['timings'] = checkpoint['timings']
         return checkpoint_ref
 
     def detail_list(self, request, checkpoints, checkpoint_count=None):
@@ -395,20 +395,8 @@ class ProvidersController(wsgi.Controller):
                         "creating a checkpoint.")
                 raise exception.InvalidInput(reason=msg)
 
-        checkpoint_extra_info = None
-        if extra_info is not None:
-            checkpoint_extra_info = jsonutils.dumps(extra_info)
-        checkpoint_properties = {
-            'project_id': context.project_id,
-            'status': constants.CHECKPOINT_STATUS_PROTECTING,
-            'provider_id': provider_id,
-            "protection_plan": {
-                "id": plan.get("id"),
-                "name": plan.get("name"),
-                "resources": plan.get("resources"),
-            },
-            "extra_info": checkpoint_extra_info
-        }
+        checkpoint_properties = protection_api.build_checkpoint_properties(
+            context, plan, extra_info)
         try:
             checkpoint_id = self.protection_api.protect(context, plan,
                                                         checkpoint_properties)
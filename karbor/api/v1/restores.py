@@ -256,6 +256,18 @@ class RestoresController(wsgi.Controller):
                         " a restore.")
                 raise exception.InvalidInput(reason=msg)
 
+        # resources is optional, all the resources of the checkpoint are
+        # restored when it is not provided.
+        resources = restore.get("resources")
+        if resources is not None:
+            if not isinstance(resources, list) or not all(
+                    isinstance(resource, six.string_types) and
+                    "#" in resource for resource in resources):
+                msg = _("resources must be a list of "
+                        "\"<resource type>#<resource id>\" when creating "
+                        "a restore.")
+                raise exception.InvalidInput(reason=msg)
+
         restore_properties = {
             'project_id': context.project_id,
             'provider_id': restore.get('provider_id'),
@@ -272,7 +284,8 @@ class RestoresController(wsgi.Controller):
 
         # call restore rpc API of protection service
         try:
-            self.protection_api.restore(context, restoreobj, restore_auth)
+            self.protection_api.restore(context, restoreobj, restore_auth,
+                                        resources)
         except Exception:
             # update the status of restore
             update_dict = {
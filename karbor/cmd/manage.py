@@ -36,6 +36,8 @@ from karbor.db import migration as db_migration
 from karbor.db.sqlalchemy import api as db_api
 from karbor.i18n import _
 from karbor import objects
+from karbor.services.protection import graph
+from karbor.services.protection import provider
 from karbor import utils
 from karbor import version
 
@@ -140,7 +142,53 @@ class ServiceCommands(object):
                                   svc['updated_at']))
 
 
+class CheckpointCommands(object):
+    """Methods for managing checkpoints in the banks."""
+
+    @args('provider_id', help='Provider of the checkpoint')
+    @args('checkpoint_id', help='Checkpoint to scrub')
+    def scrub(self, provider_id, checkpoint_id):
+        """Verify the data of the resources of a checkpoint.
+
+        Every resource whose protection plugin supports it is verified
+        against the digests it saved in the bank. Exits with 1 if any
+        corrupted data is found.
+        """
+        try:
+            protectable = provider.ProviderRegistry().show_provider(
+                provider_id)
+            plugins = protectable.load_plugins()
+            checkpoint = protectable.get_checkpoint(checkpoint_id)
+            resource_graph = checkpoint.resource_graph
+        except Exception as e:
+            print(_("Scrub command failed, check karbor-manage "
+                    "logs for more details. %s") % e)
+            sys.exit(1)
+
+        corrupted = False
+        resources = graph.pack_graph(resource_graph).nodes.values()
+        for resource in resources:
+            plugin = plugins.get(resource.type)
+            if not hasattr(plugin, 'scrub_backup'):
+                continue
+            objects = plugin.scrub_backup(checkpoint, resource)
+            if objects is None:
+                print(_("%(type)s %(id)s: nothing to verify") %
+                      {'type': resource.type, 'id': resource.id})
+            elif objects:
+                corrupted = True
+                print(_("%(type)s %(id)s: corrupted objects: %(objects)s") %
+                      {'type': resource.type, 'id': resource.id,
+                       'objects': ', '.join(objects)})
+            else:
+                print(_("%(type)s %(id)s: OK") %
+                      {'type': resource.type, 'id': resource.id})
+        if corrupted:
+            sys.exit(1)
+
+
 CATEGORIES = {
+    'checkpoint': CheckpointCommands,
     'config': ConfigCommands,
     'db': DbCommands,
     'service': ServiceCommands,
@@ -40,5 +40,5 @@ def main():
          version=version.version_string())
     logging.setup(CONF, "karbor")
     server = service.Service.create(binary='karbor-protection')
-    service.serve(server)
+    service.serve(server, workers=CONF.protection_workers)
     service.wait()
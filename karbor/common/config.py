@@ -59,6 +59,15 @@ global_opts = [
     cfg.StrOpt('protection_manager',
                default='karbor.services.protection.manager.ProtectionManager',
                help='Full class name for the Manager for Protection'),
+    cfg.IntOpt('protection_workers',
+               default=1, min=1,
+               help='Number of worker processes of the protection service. '
+                    'Every worker consumes from the protection topic and '
+                    'loads its own providers and bank connections. The '
+                    'operation and task limits apply per worker. With more '
+                    'than one worker, [oslo_concurrency] lock_path must be '
+                    'set so that the workers of a host can share the '
+                    'deduplicated chunks of a bank.'),
     cfg.HostAddressOpt('host',
                        default=socket.gethostname(),
                        help='Name of this node.  This can be an opaque '
@@ -78,6 +78,7 @@ OPERATION_EXE_STATE_IN_PROGRESS = 'in_progress'
 OPERATION_EXE_STATE_SUCCESS = 'success'
 OPERATION_EXE_STATE_FAILED = 'failed'
 OPERATION_EXE_STATE_DROPPED_OUT_OF_WINDOW = 'dropped_out_of_window'
+OPERATION_EXE_STATE_DROPPED_QUEUE_FULL = 'dropped_queue_full'
 
 RESTORE_STATUS_SUCCESS = 'success'
 RESTORE_STATUS_FAILURE = 'fail'
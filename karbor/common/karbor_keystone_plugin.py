@@ -18,6 +18,7 @@ from keystoneclient.v3 import client as kc_v3
 from oslo_config import cfg
 from oslo_log import log as logging
 
+from karbor import context as karbor_context
 from karbor import exception
 from karbor import utils
 
@@ -40,6 +41,46 @@ CONF.import_group('keystone_authtoken',
                   'keystonemiddleware.auth_token')
 
 
+def _v3_to_v2_catalog(catalog):
+    """Converts a v3 service catalog to the v2 one of the API requests"""
+    v2_catalog = []
+    for service in catalog:
+        regions = {}
+        for endpoint in service.get('endpoints', []):
+            region_name = endpoint.get('region')
+            region = regions.setdefault(
+                region_name, {'region': region_name} if region_name else {})
+            region['%sURL' % endpoint['interface'].lower()] = endpoint['url']
+        v2_catalog.append({
+            'type': service.get('type'),
+            'name': service.get('name'),
+            'endpoints': list(regions.values()),
+        })
+    return v2_catalog
+
+
+def get_session_context(session):
+    """Returns a request context of the user of a trust session
+
+    Like the context of an API request, it carries the token info and the
+    service catalog the service clients are created from.
+    """
+    access_info = session.auth.get_access(session)
+    service_catalog = access_info.service_catalog.catalog
+    if access_info.version == 'v3':
+        service_catalog = _v3_to_v2_catalog(service_catalog)
+    return karbor_context.RequestContext(
+        user_id=access_info.user_id,
+        project_id=access_info.project_id,
+        project_name=access_info.project_name,
+        roles=access_info.role_names,
+        auth_token=access_info.auth_token,
+        auth_token_info=access_info._data,
+        service_catalog=service_catalog,
+        user_domain=access_info.user_domain_id,
+        project_domain=access_info.project_domain_id)
+
+
 class KarborKeystonePlugin(object):
     """Contruct a keystone client plugin with karbor user
 
@@ -310,6 +310,20 @@ def scheduled_operation_state_update(context, operation_id, values):
     return IMPL.scheduled_operation_state_update(context, operation_id, values)
 
 
+def scheduled_operation_state_bulk_update(context, operation_ids, values):
+    """Set the given properties on the states of several scheduled operations.
+
+    :param context: The security context
+    :param operation_ids: Operation_ids of the scheduled operation states
+    :param values: Dictionary containing scheduled operation state properties
+                   to be updated
+
+    :returns: List of the operation_ids whose states were updated
+    """
+    return IMPL.scheduled_operation_state_bulk_update(context, operation_ids,
+                                                      values)
+
+
 def scheduled_operation_state_delete(context, operation_id):
     """Delete a scheduled operation state from the database.
 
@@ -408,6 +422,22 @@ def scheduled_operation_log_delete_oldest(context, operation_id,
                                                       excepted_states)
 
 
+def scheduled_operation_log_delete_all_oldest(context, retained_num,
+                                              excepted_states=None,
+                                              batch_size=1000):
+    """Delete the oldest logs of all the scheduled operations.
+
+    :param context: The security context
+    :param retained_num: The number of retained logs of every operation
+    :param excepted_states: If the state of log is in excepted_states,
+                            it will not be deleted.
+    :param batch_size: The maximum number of logs deleted by one statement
+    :returns: The number of deleted logs
+    """
+    return IMPL.scheduled_operation_log_delete_all_oldest(
+        context, retained_num, excepted_states, batch_size)
+
+
 def scheduled_operation_log_get_all_by_filters_sort(
         context, filters, limit=None, marker=None,
         sort_keys=None, sort_dirs=None):
@@ -78,6 +78,11 @@ def dispose_engine():
     get_engine().dispose()
 
 _DEFAULT_QUOTA_NAME = 'default'
+# number of rows a bulk update selects with one IN predicate
+_BULK_UPDATE_CHUNK_SIZE = 500
+
+# whether the database supports window functions, checked on first use
+_window_functions_supported = None
 
 
 def get_backend():
@@ -573,6 +578,28 @@ def scheduled_operation_state_update(context, operation_id, values):
     return state_ref
 
 
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+def scheduled_operation_state_bulk_update(context, operation_ids, values):
+    """Update the ScheduledOperationState records of several operations."""
+
+    operation_ids = list(operation_ids)
+    updated_ids = []
+    session = get_session()
+    with session.begin():
+        for index in range(0, len(operation_ids), _BULK_UPDATE_CHUNK_SIZE):
+            chunk = operation_ids[index:index + _BULK_UPDATE_CHUNK_SIZE]
+            query = model_query(
+                context, models.ScheduledOperationState,
+                session=session).filter(
+                models.ScheduledOperationState.operation_id.in_(chunk))
+            chunk_ids = [row.operation_id for row in query.with_entities(
+                models.ScheduledOperationState.operation_id)]
+            if chunk_ids:
+                query.update(values, synchronize_session=False)
+                updated_ids.extend(chunk_ids)
+    return updated_ids
+
+
 def scheduled_operation_state_delete(context, operation_id):
     """Delete a ScheduledOperationState record."""
 
@@ -696,6 +723,82 @@ def scheduled_operation_log_delete_oldest(context, operation_id,
             filters).delete(synchronize_session=False)
 
 
+def _supports_window_functions():
+    global _window_functions_supported
+    if _window_functions_supported is None:
+        try:
+            get_session().execute(
+                expression.select([func.row_number().over()]))
+        except db_exc.DBError:
+            _window_functions_supported = False
+        else:
+            _window_functions_supported = True
+    return _window_functions_supported
+
+
+def _scheduled_operation_log_oldest_ids_ranked(context, session, retained_num,
+                                               excepted_states, limit):
+    """Selects the logs to delete by their rank within their operation"""
+    table = models.ScheduledOperationLog
+    rank = func.row_number().over(
+        partition_by=table.operation_id,
+        order_by=(expression.desc(table.created_at),
+                  expression.desc(table.id))).label('rank')
+    ranked = model_query(context, table.id, table.state, rank,
+                         session=session).subquery()
+    query = session.query(ranked.c.id).filter(ranked.c.rank > retained_num)
+    if excepted_states:
+        query = query.filter(ranked.c.state.notin_(excepted_states))
+    return [row.id for row in query.limit(limit)]
+
+
+def _scheduled_operation_log_oldest_ids_grouped(context, session,
+                                                retained_num, excepted_states,
+                                                limit):
+    """Selects the logs to delete operation by operation"""
+    table = models.ScheduledOperationLog
+    operation_ids = [row.operation_id for row in model_query(
+        context, table.operation_id, session=session).group_by(
+        table.operation_id).having(func.count(table.id) > retained_num)]
+
+    log_ids = []
+    for operation_id in operation_ids:
+        query = model_query(
+            context, table.id, table.state, session=session).filter_by(
+            operation_id=operation_id).order_by(
+            expression.desc(table.created_at),
+            expression.desc(table.id)).offset(retained_num)
+        log_ids.extend(row.id for row in query
+                       if row.state not in excepted_states)
+        if len(log_ids) >= limit:
+            break
+    return log_ids[:limit]
+
+
+def scheduled_operation_log_delete_all_oldest(context, retained_num,
+                                              excepted_states=None,
+                                              batch_size=1000):
+    table = models.ScheduledOperationLog
+    excepted_states = excepted_states or []
+    if _supports_window_functions():
+        get_ids = _scheduled_operation_log_oldest_ids_ranked
+    else:
+        get_ids = _scheduled_operation_log_oldest_ids_grouped
+
+    deleted = 0
+    while True:
+        session = get_session()
+        with session.begin():
+            log_ids = get_ids(context, session, retained_num,
+                              excepted_states, batch_size)
+            if log_ids:
+                model_query(context, table, session=session).filter(
+                    table.id.in_(log_ids)).delete(synchronize_session=False)
+        deleted += len(log_ids)
+        if len(log_ids) < batch_size:
+            return deleted
+
+
 def _scheduled_operation_log_list_query(context, session, **kwargs):
     query = model_query(context, models.ScheduledOperationLog,
                         session=session)
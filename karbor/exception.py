@@ -353,6 +353,10 @@ class BankListObjectsFailed(KarborException):
     message = _("Get Object in Bank Failed: %(reason)s")
 
 
+class BankObjectCorrupted(KarborException):
+    message = _("Object %(key)s in Bank is corrupted: %(reason)s")
+
+
 class BankReadonlyViolation(KarborException):
     message = _("Bank read-only violation")
 
@@ -383,3 +387,9 @@ class CheckpointNotAvailable(KarborException):
 
 class CheckpointNotBeDeleted(KarborException):
     message = _("The checkpoint %(checkpoint_id)s can not be deleted.")
+
+
+class OperationQueueFull(KarborException):
+    message = _("The %(operation_type)s operation was rejected, the "
+                "operation queue is full.")
+    code = http_client.SERVICE_UNAVAILABLE
@@ -82,7 +82,9 @@ class ScheduledOperationLog(base.KarborPersistentObject, base.KarborObject,
 
 @base.KarborObjectRegistry.register
 class ScheduledOperationLogList(base.ObjectListBase, base.KarborObject):
-    VERSION = '1.0'
+    # Version 1.0: Initial version
+    # Version 1.1: Add destroy_oldest
+    VERSION = '1.1'
 
     fields = {
         'objects': fields.ListOfObjectsField('ScheduledOperationLog'),
@@ -98,3 +100,13 @@ class ScheduledOperationLogList(base.ObjectListBase, base.KarborObject):
 
         return base.obj_make_list(
             context, cls(context), ScheduledOperationLog, db_log_list)
+
+    @base.remotable_classmethod
+    def destroy_oldest(cls, context, retained_num, excepted_states=None,
+                       batch_size=1000):
+        """Deletes the oldest logs of all the operations
+
+        Returns the number of deleted logs.
+        """
+        return db.scheduled_operation_log_delete_all_oldest(
+            context, retained_num, excepted_states, batch_size)
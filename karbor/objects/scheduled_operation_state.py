@@ -98,7 +98,9 @@ class ScheduledOperationState(base.KarborPersistentObject, base.KarborObject,
 
 @base.KarborObjectRegistry.register
 class ScheduledOperationStateList(base.ObjectListBase, base.KarborObject):
-    VERSION = '1.0'
+    # Version 1.0: Initial version
+    # Version 1.1: Add bulk_update
+    VERSION = '1.1'
 
     fields = {
         'objects': fields.ListOfObjectsField('ScheduledOperationState'),
@@ -119,3 +121,14 @@ class ScheduledOperationStateList(base.ObjectListBase, base.KarborObject):
         return base.obj_make_list(
             context, cls(context), ScheduledOperationState, db_state_list,
             expected_attrs=valid_columns)
+
+    @base.remotable_classmethod
+    def bulk_update(cls, context, operation_ids, updates):
+        """Updates the states of several operations with one query
+
+        Returns the ids of the operations whose states were updated.
+        """
+        if not operation_ids:
+            return []
+        return db.scheduled_operation_state_bulk_update(
+            context, operation_ids, updates)
@@ -14,6 +14,10 @@
 
 
 from karbor.db import base
+from karbor import exception
+from karbor.i18n import _
+from karbor.services.operationengine.engine import triggers
+from karbor.services.operationengine import partitioner
 from karbor.services.operationengine import rpcapi as oe_rpcapi
 
 
@@ -22,23 +26,28 @@ class API(base.Base):
 
     def __init__(self, db_driver=None):
         self.operationengine_rpcapi = oe_rpcapi.OperationEngineAPI()
+        self._trigger_cls_map = None
         super(API, self).__init__(db_driver)
 
     def create_scheduled_operation(self, context, operation):
         self.operationengine_rpcapi.create_scheduled_operation(
-            context, operation)
+            context, operation,
+            host=partitioner.get_operation_host(operation.id))
 
     def delete_scheduled_operation(self, context, operation_id, trigger_id):
         self.operationengine_rpcapi.delete_scheduled_operation(
-            context, operation_id, trigger_id)
+            context, operation_id, trigger_id,
+            host=partitioner.get_operation_host(operation_id))
 
     def suspend_scheduled_operation(self, context, operation_id, trigger_id):
         self.operationengine_rpcapi.suspend_scheduled_operation(
-            context, operation_id, trigger_id)
+            context, operation_id, trigger_id,
+            host=partitioner.get_operation_host(operation_id))
 
     def resume_scheduled_operation(self, context, operation_id, trigger_id):
         self.operationengine_rpcapi.resume_scheduled_operation(
-            context, operation_id, trigger_id)
+            context, operation_id, trigger_id,
+            host=partitioner.get_operation_host(operation_id))
 
     def create_trigger(self, context, trigger):
         self.operationengine_rpcapi.create_trigger(context, trigger)
@@ -47,4 +56,18 @@ class API(base.Base):
         self.operationengine_rpcapi.delete_trigger(context, trigger_id)
 
     def update_trigger(self, context, trigger):
+        # the services which loaded the trigger update it from a cast, which
+        # reports no error, so the new properties are checked here
+        self._check_trigger_definition(trigger.type, trigger.properties)
         self.operationengine_rpcapi.update_trigger(context, trigger)
+
+    def _check_trigger_definition(self, trigger_type, trigger_definition):
+        if self._trigger_cls_map is None:
+            self._trigger_cls_map = {cls.TRIGGER_TYPE: cls
+                                     for cls in triggers.all_triggers()}
+        trigger_cls = self._trigger_cls_map.get(trigger_type, None)
+        if not trigger_cls:
+            msg = (_("Invalid trigger type:%s") % trigger_type)
+            raise exception.InvalidInput(msg)
+
+        trigger_cls.check_trigger_definition(trigger_definition)
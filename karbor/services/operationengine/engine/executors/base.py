@@ -16,8 +16,14 @@ Executor which receives operations and run them.
 
 from abc import ABCMeta
 from abc import abstractmethod
+from oslo_log import log as logging
 import six
 
+from karbor import context
+from karbor import objects
+
+LOG = logging.getLogger(__name__)
+
 
 @six.add_metaclass(ABCMeta)
 class BaseExecutor(object):
@@ -38,6 +44,29 @@ class BaseExecutor(object):
         """
         pass
 
+    def execute_operations(self, operation_ids, triggered_time,
+                           expect_start_time, window_time, **kwargs):
+        """Execute the operations fired by a trigger at the same time.
+
+        Executors should override it to prepare the operations in bulk.
+
+        :param operation_ids: IDs of operations
+        :param triggered_time: time when the operations are triggered
+        :param expect_start_time: expect time when to run the operations
+        :param window_time: time how long to wait to run the operations
+                      after expect_start_time
+        """
+        for operation_id in operation_ids:
+            self.execute_operation(operation_id, triggered_time,
+                                   expect_start_time, window_time, **kwargs)
+
+    def free_slots(self):
+        """Return how many more operations can run at once.
+
+        None means the executor does not limit the concurrent operations.
+        """
+        return None
+
     @abstractmethod
     def cancel_operation(self, operation_id):
         """Cancel the execution of operation.
@@ -64,3 +93,27 @@ class BaseExecutor(object):
     def shutdown(self):
         """Shutdown the executor"""
         pass
+
+    def _update_operation_state(self, operation_id, updates):
+        return operation_id in self._update_operations_state([operation_id],
+                                                             updates)
+
+    def _update_operations_state(self, operation_ids, updates):
+        """Update the states of operations with one query
+
+        Returns the ids of the operations whose states were updated.
+        """
+        ctxt = context.get_admin_context()
+        try:
+            updated_ids = objects.ScheduledOperationStateList.bulk_update(
+                ctxt, operation_ids, updates)
+        except Exception:
+            LOG.exception("Execute operations(%s), update state failed",
+                          operation_ids)
+            return []
+
+        missing_ids = set(operation_ids).difference(updated_ids)
+        if missing_ids:
+            LOG.error("Execute operations(%s), the states are not found",
+                      list(missing_ids))
+        return updated_ids
@@ -12,6 +12,8 @@
 
 import eventlet
 import greenlet
+import heapq
+import itertools
 
 from datetime import datetime
 from datetime import timedelta
@@ -30,6 +32,17 @@ green_thread_executor_opts = [
                default=0,
                help='number of maximum concurrent running operations,'
                     '0 means no hard limit'
+               ),
+    cfg.IntOpt('max_deferred_operations',
+               default=1000,
+               min=0,
+               help='number of maximum operations waiting for a free slot '
+                    'or for their previous run to finish. They start by '
+                    'earliest end of window first, the ones whose window '
+                    'ends before they can start are dropped out of window. '
+                    'When the queue is full, the operation whose window '
+                    'ends last is dropped. 0 means operations are dropped '
+                    'instead of waiting'
                )
 ]
 
@@ -44,31 +57,63 @@ class GreenThreadExecutor(base.BaseExecutor):
     def __init__(self, operation_manager):
         super(GreenThreadExecutor, self).__init__(operation_manager)
         self._operation_thread_map = {}
+        # heap of [end_time_for_run, counter, operation_id, param] of the
+        # operations waiting to start, param is None when it was canceled
+        self._deferred_operations = []
+        self._deferred_entries = {}
+        self._deferred_counter = itertools.count()
 
     def execute_operation(self, operation_id, triggered_time,
                           expect_start_time, window_time, **kwargs):
+        self.execute_operations([operation_id], triggered_time,
+                                expect_start_time, window_time, **kwargs)
 
-        if operation_id in self._operation_thread_map:
-            LOG.warning("Execute operation(%s), the previous one has not been"
-                        " finished", operation_id)
-            return
+    def execute_operations(self, operation_ids, triggered_time,
+                           expect_start_time, window_time, **kwargs):
+        end_time_for_run = expect_start_time + timedelta(seconds=window_time)
+        if self._deferred_operations:
+            self._drop_expired_operations()
+        params = {}
+        for operation_id in operation_ids:
+            param = {
+                'operation_id': operation_id,
+                'triggered_time': triggered_time,
+                'expect_start_time': expect_start_time,
+                'window_time': window_time,
+                'run_type': constants.OPERATION_RUN_TYPE_EXECUTE
+            }
+            if operation_id in self._operation_thread_map:
+                LOG.info("Execute operation(%s), the previous one has not "
+                         "been finished, defer it", operation_id)
+                self._defer_operation(end_time_for_run, param)
+                continue
 
-        num = CONF.operationengine.max_concurrent_operations
-        if num and len(self._operation_thread_map) >= num:
-            LOG.warning("The amount of concurrent running operations "
-                        "exceeds %d", num)
-            return
-        self._operation_thread_map[operation_id] = None
+            # the deferred operations get the free slots first
+            free_slots = self.free_slots()
+            if free_slots is not None and (
+                    free_slots <= 0 or self._deferred_entries):
+                self._defer_operation(end_time_for_run, param)
+                continue
 
-        end_time_for_run = expect_start_time + timedelta(seconds=window_time)
-        ret = self._update_operation_state(
-            operation_id,
-            {'state': constants.OPERATION_STATE_TRIGGERED,
-             'end_time_for_run': end_time_for_run})
-        if not ret:
-            self._operation_thread_map.pop(operation_id, None)
-            return
+            self._operation_thread_map[operation_id] = None
+            params[operation_id] = param
+
+        if params:
+            updated_ids = set(self._update_operations_state(
+                list(params),
+                {'state': constants.OPERATION_STATE_TRIGGERED,
+                 'end_time_for_run': end_time_for_run}))
 
+            for operation_id, param in params.items():
+                if operation_id not in updated_ids:
+                    self._operation_thread_map.pop(operation_id, None)
+                    continue
+                self._start_operation(operation_id, param)
+
+        if self._deferred_operations:
+            self._start_deferred_operations()
+
+    def _start_operation(self, operation_id, param):
         if operation_id not in self._operation_thread_map:
             # This function is invoked by trigger which may runs in the
             # green thread. So if operation_id is not exist, it may be
@@ -78,21 +123,135 @@ class GreenThreadExecutor(base.BaseExecutor):
                         operation_id)
             return
 
-        param = {
-            'operation_id': operation_id,
-            'triggered_time': triggered_time,
-            'expect_start_time': expect_start_time,
-            'window_time': window_time,
-            'run_type': constants.OPERATION_RUN_TYPE_EXECUTE
-        }
         try:
             self._create_thread(self._run_operation, operation_id, param)
         except Exception:
             self._operation_thread_map.pop(operation_id, None)
-            LOG.exception("Execute operation (%s), and create green thread "
-                          "failed", operation_id)
+            LOG.exception("Execute operation (%s), and create green "
+                          "thread failed", operation_id)
+
+    def _defer_operation(self, end_time_for_run, param):
+        operation_id = param['operation_id']
+        if operation_id in self._deferred_entries:
+            LOG.warning("Execute operation(%s), it is waiting to start "
+                        "already", operation_id)
+            return
+
+        entry = [end_time_for_run, next(self._deferred_counter),
+                 operation_id, param]
+        dropped = None
+        num = CONF.operationengine.max_deferred_operations
+        if len(self._deferred_entries) >= num:
+            # the operation whose window ends last would start last, drop it
+            latest = max(self._deferred_entries.values()) if (
+                self._deferred_entries) else None
+            if latest is None or latest < entry:
+                dropped = param
+            else:
+                del self._deferred_entries[latest[2]]
+                dropped, latest[3] = latest[3], None
+
+        if dropped is not param:
+            self._deferred_entries[operation_id] = entry
+            heapq.heappush(self._deferred_operations, entry)
+
+        if dropped is not None:
+            LOG.warning("The amount of operations waiting to start "
+                        "exceeds %(num)d, operation(%(op)s) is dropped",
+                        {'num': num, 'op': dropped['operation_id']})
+            self._record_dropped_operation(
+                dropped, constants.OPERATION_EXE_STATE_DROPPED_QUEUE_FULL)
+
+    def _drop_expired_operations(self):
+        """Drop the deferred operations whose window ended"""
+        now = datetime.utcnow()
+        while self._deferred_operations:
+            end_time_for_run, _, operation_id, param = (
+                self._deferred_operations[0])
+            if param is not None and end_time_for_run >= now:
+                break
+
+            heapq.heappop(self._deferred_operations)
+            if param is None:
+                continue
+
+            self._deferred_entries.pop(operation_id, None)
+            LOG.warning("Operation(%(op)s) waited until its window "
+                        "ended at %(end)s, drop it",
+                        {'op': operation_id, 'end': end_time_for_run})
+            self._record_dropped_operation(param)
+
+    def _start_deferred_operations(self):
+        """Start the deferred operations by earliest end of window
+
+        The operations whose window ended are dropped out of window.
+        """
+        busy_entries = []
+        while self._deferred_operations:
+            free_slots = self.free_slots()
+            if free_slots is not None and free_slots <= 0:
+                break
+
+            entry = heapq.heappop(self._deferred_operations)
+            end_time_for_run, _, operation_id, param = entry
+            if param is None:
+                continue
+
+            if datetime.utcnow() > end_time_for_run:
+                self._deferred_entries.pop(operation_id, None)
+                LOG.warning("Operation(%(op)s) waited until its window "
+                            "ended at %(end)s, drop it",
+                            {'op': operation_id, 'end': end_time_for_run})
+                self._record_dropped_operation(param)
+                continue
+
+            if operation_id in self._operation_thread_map:
+                busy_entries.append(entry)
+                continue
+
+            self._deferred_entries.pop(operation_id, None)
+            self._operation_thread_map[operation_id] = None
+            if not self._update_operation_state(
+                    operation_id,
+                    {'state': constants.OPERATION_STATE_TRIGGERED,
+                     'end_time_for_run': end_time_for_run}):
+                self._operation_thread_map.pop(operation_id, None)
+                continue
+
+            self._start_operation(operation_id, param)
+
+        for entry in busy_entries:
+            heapq.heappush(self._deferred_operations, entry)
+
+    def _record_dropped_operation(
+            self, param,
+            state=constants.OPERATION_EXE_STATE_DROPPED_OUT_OF_WINDOW):
+        log_info = {
+            'operation_id': param['operation_id'],
+            'expect_start_time': param['expect_start_time'],
+            'triggered_time': param['triggered_time'],
+            'state': state,
+            'end_time': datetime.utcnow(),
+        }
+        log_ref = objects.ScheduledOperationLog(context.get_admin_context(),
+                                                **log_info)
+        try:
+            log_ref.create()
+        except Exception:
+            LOG.exception("Drop operation(%s), create log obj failed",
+                          param['operation_id'])
+
+    def free_slots(self):
+        num = CONF.operationengine.max_concurrent_operations
+        if not num:
+            return None
+        return max(num - len(self._operation_thread_map), 0)
 
     def cancel_operation(self, operation_id):
+        entry = self._deferred_entries.pop(operation_id, None)
+        if entry is not None:
+            entry[3] = None
+
         gt = self._operation_thread_map.get(operation_id, None)
         if gt is not None:  # can not use 'if gt' instead
             # If the thead has not started, it will be killed;
@@ -118,7 +277,7 @@ class GreenThreadExecutor(base.BaseExecutor):
         self._create_thread(self._run_operation, operation_id, param)
 
     def shutdown(self):
-        for op_id, gt in self._operation_thread_map.items():
+        for op_id, gt in list(self._operation_thread_map.items()):
             if gt is None:
                 continue
 
@@ -129,6 +288,8 @@ class GreenThreadExecutor(base.BaseExecutor):
                 pass
 
         self._operation_thread_map = {}
+        self._deferred_operations = []
+        self._deferred_entries = {}
 
     def _run_operation(self, operation_id, param):
 
@@ -161,21 +322,6 @@ class GreenThreadExecutor(base.BaseExecutor):
                 operation_id,
                 {'state': constants.OPERATION_STATE_REGISTERED})
 
-    def _update_operation_state(self, operation_id, updates):
-
-        ctxt = context.get_admin_context()
-        try:
-            state_ref = objects.ScheduledOperationState.get_by_operation_id(
-                ctxt, operation_id)
-            for item, value in updates.items():
-                setattr(state_ref, item, value)
-            state_ref.save()
-        except Exception:
-            LOG.exception("Execute operation(%s), update state failed",
-                          operation_id)
-            return False
-        return True
-
     def _on_gt_done(self, gt, *args, **kwargs):
         op_id = args[0]
         try:
@@ -184,6 +330,9 @@ class GreenThreadExecutor(base.BaseExecutor):
             LOG.warning("Unknown operation id(%s) received, "
                         "when the green thread exit", op_id)
 
+        if self._deferred_operations:
+            eventlet.spawn_n(self._start_deferred_operations)
+
     def _create_thread(self, function, operation_id, param):
         gt = eventlet.spawn(function, operation_id, param)
         self._operation_thread_map[operation_id] = gt
@@ -34,28 +34,38 @@ class ScheduledOperationExecutor(base.BaseExecutor):
 
     def execute_operation(self, operation_id, triggered_time,
                           expect_start_time, window_time, **kwargs):
-
-        if self._check_operation(operation_id, self._CHECK_ITEMS.values()):
-            LOG.warning("Execute operation(%s), it can't be executed",
-                        operation_id)
+        self.execute_operations([operation_id], triggered_time,
+                                expect_start_time, window_time, **kwargs)
+
+    def execute_operations(self, operation_ids, triggered_time,
+                           expect_start_time, window_time, **kwargs):
+        accepted_ids = []
+        for operation_id in operation_ids:
+            if self._check_operation(operation_id,
+                                     self._CHECK_ITEMS.values()):
+                LOG.warning("Execute operation(%s), it can't be executed",
+                            operation_id)
+                continue
+            accepted_ids.append(operation_id)
+
+        if not accepted_ids:
             return
 
         end_time_for_run = expect_start_time + timedelta(seconds=window_time)
-        ret = self._update_operation_state(
-            operation_id,
+        updated_ids = self._update_operations_state(
+            accepted_ids,
             {'state': constants.OPERATION_STATE_TRIGGERED,
              'end_time_for_run': end_time_for_run})
-        if not ret:
-            return
 
-        param = {
-            'operation_id': operation_id,
-            'triggered_time': triggered_time,
-            'expect_start_time': expect_start_time,
-            'window_time': window_time,
-            'run_type': constants.OPERATION_RUN_TYPE_EXECUTE
-        }
-        self._execute_operation(operation_id, self._run_operation, param)
+        for operation_id in updated_ids:
+            param = {
+                'operation_id': operation_id,
+                'triggered_time': triggered_time,
+                'expect_start_time': expect_start_time,
+                'window_time': window_time,
+                'run_type': constants.OPERATION_RUN_TYPE_EXECUTE
+            }
+            self._execute_operation(operation_id, self._run_operation, param)
 
     def resume_operation(self, operation_id, **kwargs):
         end_time = kwargs.get('end_time_for_run')
@@ -108,21 +118,6 @@ class ScheduledOperationExecutor(base.BaseExecutor):
                 operation_id,
                 {'state': constants.OPERATION_STATE_REGISTERED})
 
-    def _update_operation_state(self, operation_id, updates):
-
-        ctxt = context.get_admin_context()
-        try:
-            state_ref = objects.ScheduledOperationState.get_by_operation_id(
-                ctxt, operation_id)
-            for item, value in updates.items():
-                setattr(state_ref, item, value)
-            state_ref.save()
-        except Exception:
-            LOG.exception("Execute operation(%s), update state failed",
-                          operation_id)
-            return False
-        return True
-
     @abstractmethod
     def _execute_operation(self, operation_id, funtion, param):
         pass
@@ -12,17 +12,24 @@
 
 from datetime import datetime
 from datetime import timedelta
+import collections
 import eventlet
+from eventlet import queue
 import functools
+import heapq
+import itertools
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import timeutils
 import six
 from stevedore import driver as import_driver
+import zlib
 
 from karbor import exception
 from karbor.i18n import _
 from karbor.services.operationengine.engine import triggers
+from karbor.services.operationengine.engine.triggers.timetrigger import \
+    timeformats
 
 time_trigger_opts = [
     cfg.IntOpt('min_interval',
@@ -40,30 +47,58 @@ time_trigger_opts = [
 
     cfg.StrOpt('time_format',
                default='calendar',
-               help='The type of time format which is used to compute time')
+               help='The type of time format which is used to compute time'),
+
+    cfg.IntOpt('trigger_dispatch_batch_size',
+               default=100,
+               min=1,
+               help='The number of operations a trigger sends to the '
+                    'executor at once, the executor updates their states '
+                    'with one query'),
+
+    cfg.FloatOpt('trigger_dispatch_spread',
+                 default=0.0,
+                 min=0.0,
+                 max=1.0,
+                 help='The fraction of the trigger window over which the '
+                      'starts of the operations of a trigger are spread, '
+                      'instead of starting them all when the trigger '
+                      'fires. Every operation starts at the same offset '
+                      'into the window on every run, derived from its id. '
+                      'An operation waits for a free slot of the executor '
+                      'when the executor limits the concurrent operations. '
+                      '0 disables the spreading')
 ]
 
+# seconds to wait for a free slot of the executor before checking again
+_FREE_SLOT_POLL_INTERVAL = 1
+# number of time format objects kept for reuse
+_TIMER_CACHE_SIZE = 4096
+
 CONF = cfg.CONF
 CONF.register_opts(time_trigger_opts)
 LOG = logging.getLogger(__name__)
 
 
-class TriggerOperationGreenThread(object):
-    def __init__(self, first_run_time, function):
-        super(TriggerOperationGreenThread, self).__init__()
-        self._is_sleeping = True
-        self._pre_run_time = None
-        self._running = False
-        self._thread = None
+class ScheduledTimer(object):
+    """A function run by the timer scheduler
 
-        self._function = function
+    The function is called with the expected run time and returns the next
+    run time, or None when it should not run again.
+    """
 
-        self._start(first_run_time)
+    def __init__(self, scheduler, function):
+        super(ScheduledTimer, self).__init__()
+        self._scheduler = scheduler
+        self._function = function
+        self._pre_run_time = None
+        self._running = True
+        # the heap entry of the next run, None while the function runs
+        self._entry = None
 
     def kill(self):
         self._running = False
-        if self._is_sleeping:
-            self._thread.kill()
+        self._scheduler.cancel(self)
 
     @property
     def running(self):
@@ -73,38 +108,127 @@ class TriggerOperationGreenThread(object):
     def pre_run_time(self):
         return self._pre_run_time
 
-    def _start(self, first_run_time):
-        self._running = True
+    def _run(self, expect_run_time):
+        if not self._running:
+            return
 
-        now = datetime.utcnow()
-        initial_delay = 0 if first_run_time <= now else (
-            int(timeutils.delta_seconds(now, first_run_time)))
+        self._pre_run_time = expect_run_time
+        next_run_time = None
+        try:
+            next_run_time = self._function(expect_run_time)
+        except Exception:
+            LOG.exception("Run scheduled timer failed, expect run time=%s",
+                          expect_run_time)
+
+        if next_run_time is None or not self._running:
+            self._pre_run_time = None
+            self._running = False
+            return
 
-        self._thread = eventlet.spawn_after(
-            initial_delay, self._run, first_run_time)
-        self._thread.link(self._on_done)
+        self._scheduler.reschedule(self, next_run_time)
 
-    def _on_done(self, gt, *args, **kwargs):
-        self._is_sleeping = True
-        self._pre_run_time = None
-        self._running = False
+
+class TimerScheduler(object):
+    """Runs the functions of all the time triggers from one green thread
+
+    The next run times of the timers are kept in a min-heap. One green
+    thread sleeps until the earliest of them and spawns the function of a
+    timer when it is due, so there is no sleeping green thread per trigger
+    and scheduling or cancelling a timer costs O(log n).
+    """
+
+    def __init__(self):
+        super(TimerScheduler, self).__init__()
+        self._heap = []
+        self._counter = itertools.count()
+        self._cancelled = 0
+        self._wakeup = queue.LightQueue()
         self._thread = None
 
-    def _run(self, expect_run_time):
-        while self._running:
-            self._is_sleeping = False
-            self._pre_run_time = expect_run_time
+    def __len__(self):
+        return len(self._heap) - self._cancelled
+
+    def schedule(self, first_run_time, function):
+        timer = ScheduledTimer(self, function)
+        self.reschedule(timer, first_run_time)
+        return timer
+
+    def reschedule(self, timer, run_time):
+        self.cancel(timer)
+        # the counter keeps timers with the same run time in FIFO order,
+        # and the timers from being compared
+        entry = [run_time, next(self._counter), timer]
+        timer._entry = entry
+        heapq.heappush(self._heap, entry)
+
+        if self._thread is None or self._thread.dead:
+            self._thread = eventlet.spawn(self._run)
+        elif self._heap[0] is entry:
+            self._wakeup.put(None)
+
+    def cancel(self, timer):
+        entry = timer._entry
+        if entry is None:
+            return
 
-            expect_run_time = self._function(expect_run_time)
-            if expect_run_time is None or not self._running:
-                break
+        timer._entry = None
+        entry[2] = None
+        self._cancelled += 1
+        if self._cancelled > len(self._heap) // 2:
+            self._heap = [item for item in self._heap if item[2] is not None]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+    def _pop(self):
+        run_time, _, timer = heapq.heappop(self._heap)
+        if timer is None:
+            self._cancelled -= 1
+        else:
+            timer._entry = None
+        return run_time, timer
+
+    def _run(self):
+        while True:
+            while self._heap and self._heap[0][2] is None:
+                self._pop()
+
+            wait_time = None
+            if self._heap:
+                now = datetime.utcnow()
+                run_time = self._heap[0][0]
+                wait_time = 0 if run_time <= now else int(
+                    timeutils.delta_seconds(now, run_time))
+                if wait_time == 0:
+                    run_time, timer = self._pop()
+                    eventlet.spawn_n(timer._run, run_time)
+                    continue
 
-            self._is_sleeping = True
+            try:
+                self._wakeup.get(timeout=wait_time)
+            except queue.Empty:
+                pass
+
+
+def _dispatch_offset(operation_id):
+    """Returns the offset of an operation in the dispatch spread, in [0, 1)
+
+    The offset only depends on the operation id, so an operation starts at
+    the same point of the window on every run of its trigger.
+    """
+    checksum = zlib.crc32(operation_id.encode('utf-8')) & 0xffffffff
+    return checksum / float(1 << 32)
 
-            now = datetime.utcnow()
-            idle_time = 0 if expect_run_time <= now else int(
-                timeutils.delta_seconds(now, expect_run_time))
-            eventlet.sleep(idle_time)
+
+_scheduler = None
+_time_format_classes = {}
+_timers = collections.OrderedDict()
+
+
+def get_timer_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = TimerScheduler()
+    return _scheduler
 
 
 class TimeTrigger(triggers.BaseTrigger):
@@ -196,7 +320,7 @@ class TimeTrigger(triggers.BaseTrigger):
             trigger_property=self._trigger_property.copy(),
             timer=timer)
 
-        self._greenthread = TriggerOperationGreenThread(
+        self._greenthread = get_timer_scheduler().schedule(
             first_run_time, func)
 
     def _trigger_operations(self, expect_run_time, trigger_property, timer):
@@ -213,24 +337,27 @@ class TimeTrigger(triggers.BaseTrigger):
                 int(timeutils.delta_seconds(entry_time, expect_run_time)) > 0):
             return expect_run_time
 
-        # The self._executor.execute_operation may have I/O operation.
+        # The self._executor.execute_operations may have I/O operation.
         # If it is, this green thread will be switched out during looping
         # operation_ids. In order to avoid changing self._operation_ids
         # during the green thread is switched out, copy self._operation_ids
         # as the iterative object.
-        operation_ids = self._operation_ids.copy()
+        operation_ids = list(self._operation_ids)
         sent_ops = set()
         window = trigger_property.get("window")
         end_time = expect_run_time + timedelta(seconds=window)
-
-        for operation_id in operation_ids:
-            if operation_id not in self._operation_ids:
-                # Maybe, when traversing this operation_id, it has been
-                # removed by self.unregister_operation
-                LOG.warning("Execute operation %s which is not exist, "
-                            "ignore it", operation_id)
-                continue
-
+        batch_size = CONF.trigger_dispatch_batch_size
+        start_times = None
+        spread_time = window * CONF.trigger_dispatch_spread
+        if spread_time > 0:
+            start_times = {
+                operation_id: expect_run_time + timedelta(
+                    seconds=spread_time * _dispatch_offset(operation_id))
+                for operation_id in operation_ids}
+            operation_ids.sort(key=start_times.get)
+
+        index = 0
+        while index < len(operation_ids):
             now = datetime.utcnow()
             if now >= end_time:
                 LOG.error("Can not trigger operations to run. Because it is "
@@ -239,17 +366,45 @@ class TimeTrigger(triggers.BaseTrigger):
                           " wating operations=%(ops)s",
                           {'now': now, 'end_time': end_time,
                            'expect': expect_run_time,
-                           'ops': operation_ids - sent_ops})
+                           'ops': set(operation_ids) - sent_ops})
                 break
 
+            batch_end = min(index + batch_size, len(operation_ids))
+            if start_times is not None:
+                batch_end = self._spread_batch_end(
+                    operation_ids, index, batch_end, start_times, now)
+                if batch_end == index:
+                    next_start_time = start_times[operation_ids[index]]
+                    wait_time = _FREE_SLOT_POLL_INTERVAL
+                    if next_start_time > now:
+                        wait_time = timeutils.delta_seconds(now,
+                                                            next_start_time)
+                    eventlet.sleep(min(
+                        wait_time, timeutils.delta_seconds(now, end_time)))
+                    continue
+
+            batch = []
+            for operation_id in operation_ids[index:batch_end]:
+                if operation_id not in self._operation_ids:
+                    # Maybe, when traversing this operation_id, it has been
+                    # removed by self.unregister_operation
+                    LOG.warning("Execute operation %s which is not exist, "
+                                "ignore it", operation_id)
+                    continue
+                batch.append(operation_id)
+            index = batch_end
+
+            if not batch:
+                continue
+
             try:
-                self._executor.execute_operation(
-                    operation_id, now, expect_run_time, window)
+                self._executor.execute_operations(
+                    batch, now, expect_run_time, window)
             except Exception:
-                LOG.exception("Submit operation to executor failed, operation"
-                              " id=%s", operation_id)
+                LOG.exception("Submit operations to executor failed, "
+                              "operation ids=%s", batch)
 
-            sent_ops.add(operation_id)
+            sent_ops.update(batch)
 
         next_time = self._compute_next_run_time(
             expect_run_time, trigger_property['end_time'], timer)
@@ -263,6 +418,23 @@ class TimeTrigger(triggers.BaseTrigger):
                        'entry': entry_time, 'end': end_time})
         return next_time
 
+    def _spread_batch_end(self, operation_ids, index, batch_end,
+                          start_times, now):
+        """Returns the end of the batch of operations to start now
+
+        The batch has the operations whose start time has come, as many as
+        the executor has free slots for.
+        """
+        free_slots = self._executor.free_slots()
+        if free_slots is not None:
+            batch_end = min(batch_end, index + free_slots)
+
+        due_end = index
+        while due_end < batch_end and (
+                start_times[operation_ids[due_end]] <= now):
+            due_end += 1
+        return due_end
+
     @classmethod
     def check_trigger_definition(cls, trigger_definition):
         """Check trigger definition
@@ -281,7 +453,8 @@ class TimeTrigger(triggers.BaseTrigger):
             raise exception.InvalidInput(msg)
         start_time = cls._check_and_get_datetime(start_time, "start_time")
 
-        interval = tf_cls(start_time, pattern).get_min_interval()
+        interval = cls._get_timer(tf_cls, start_time,
+                                  pattern).get_min_interval()
         if interval is not None and interval < CONF.min_interval:
             msg = (_("The interval of two adjacent time points "
                      "is less than %d") % CONF.min_interval)
@@ -344,15 +517,38 @@ class TimeTrigger(triggers.BaseTrigger):
 
     @classmethod
     def _get_time_format_class(cls):
-        return import_driver.DriverManager(
-            'karbor.operationengine.engine.timetrigger.time_format',
-            CONF.time_format).driver
+        time_format = CONF.time_format
+        if time_format not in _time_format_classes:
+            _time_format_classes[time_format] = import_driver.DriverManager(
+                'karbor.operationengine.engine.timetrigger.time_format',
+                time_format).driver
+        return _time_format_classes[time_format]
+
+    @classmethod
+    def _get_timer(cls, tf_cls, start_time, pattern):
+        """Returns the time format object of a trigger definition
+
+        Parsing a pattern and computing its minimum interval is expensive,
+        the time format objects are kept and shared by the triggers with the
+        same definition, the least recently used are dropped.
+        """
+        key = (tf_cls, start_time, pattern)
+        timer = _timers.pop(key, None)
+        if timer is None:
+            timer = tf_cls(start_time, pattern)
+            if len(_timers) >= _TIMER_CACHE_SIZE:
+                _timers.popitem(last=False)
+        _timers[key] = timer
+        return timer
 
     @classmethod
     def _get_timer_and_first_run_time(cls, trigger_property):
         tf_cls = cls._get_time_format_class()
-        timer = tf_cls(trigger_property['start_time'],
-                       trigger_property['pattern'])
+        timer = cls._get_timer(tf_cls, trigger_property['start_time'],
+                               trigger_property['pattern'])
+        if isinstance(timer, timeformats.TimeFormat):
+            # every trigger computes its next times incrementally
+            timer = timeformats.NextTimeIterator(timer)
         first_run_time = cls._compute_next_run_time(
             datetime.utcnow(), trigger_property['end_time'], timer)
 
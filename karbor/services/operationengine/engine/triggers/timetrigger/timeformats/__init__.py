@@ -53,3 +53,46 @@ class TimeFormat(object):
     def get_min_interval(self):
         """Get minimum interval of two adjacent time points"""
         pass
+
+    def iter_next_times(self, current_time):
+        """Iterate over the time points after current_time in order
+
+        :param current_time: the time before the time points
+        """
+        next_time = self.compute_next_time(current_time)
+        while next_time is not None:
+            yield next_time
+            next_time = self.compute_next_time(next_time)
+
+
+class NextTimeIterator(object):
+    """Computes the next time points of a time format incrementally
+
+    Time triggers compute their next time from the previous one, so the
+    iterator of the time points is kept between the computations instead
+    of computing the time points from the start time again. The time
+    format, which can be shared, is not changed.
+    """
+
+    def __init__(self, time_format):
+        super(NextTimeIterator, self).__init__()
+        self._time_format = time_format
+        self._iterator = None
+        self._current_time = None
+        self._next_time = None
+
+    def compute_next_time(self, current_time):
+        """Compute next time
+
+        :param current_time: the time before the next time
+        :return datetime or None
+        """
+        if self._iterator is None or current_time < self._current_time:
+            self._iterator = self._time_format.iter_next_times(current_time)
+            self._next_time = next(self._iterator, None)
+
+        while self._next_time is not None and self._next_time <= current_time:
+            self._next_time = next(self._iterator, None)
+
+        self._current_time = current_time
+        return self._next_time
@@ -9,6 +9,7 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import itertools
 import os
 
 from datetime import timedelta
@@ -51,6 +52,8 @@ class ICal(timeformats.TimeFormat):
         self.dtstart = start_time
         self.min_freq = self._get_min_freq(vevent)
         self.rrule_obj = self._get_rrule_obj(vevent, start_time)
+        self._min_interval = None
+        self._min_interval_computed = False
 
     @staticmethod
     def _decode_calendar_pattern(pattern):
@@ -114,11 +117,21 @@ class ICal(timeformats.TimeFormat):
         next_time = self.rrule_obj.after(current_time)
         return next_time if next_time else None
 
+    def iter_next_times(self, current_time):
+        return itertools.dropwhile(lambda dt: dt <= current_time,
+                                   self.rrule_obj)
+
     def get_min_interval(self):
         """Get minimum interval of two adjacent time points
 
         :return int(seconds) or None
         """
+        if not self._min_interval_computed:
+            self._min_interval = self._compute_min_interval()
+            self._min_interval_computed = True
+        return self._min_interval
+
+    def _compute_min_interval(self):
         gen = self.rrule_obj
         kwargs = FREQ_TO_KWARGS[self.min_freq]
         endtime = self.dtstart + timedelta(**kwargs)
@@ -25,6 +25,8 @@ class Crontab(timeformats.TimeFormat):
     def __init__(self, start_time, pattern):
         self._start_time = start_time
         self._pattern = pattern
+        self._min_interval = None
+        self._min_interval_computed = False
         super(Crontab, self).__init__(start_time, pattern)
 
     @classmethod
@@ -44,10 +46,24 @@ class Crontab(timeformats.TimeFormat):
             self._start_time)
         return croniter(self._pattern, time).get_next(datetime)
 
+    def iter_next_times(self, current_time):
+        time = current_time if current_time >= self._start_time else (
+            self._start_time)
+        cron = croniter(self._pattern, time)
+        while True:
+            yield cron.get_next(datetime)
+
     def get_min_interval(self):
+        if not self._min_interval_computed:
+            self._min_interval = self._compute_min_interval()
+            self._min_interval_computed = True
+        return self._min_interval
+
+    def _compute_min_interval(self):
         try:
-            t1 = self.compute_next_time(datetime.now())
-            t2 = self.compute_next_time(t1)
+            next_times = self.iter_next_times(datetime.now())
+            t1 = next(next_times)
+            t2 = next(next_times)
             return timeutils.delta_seconds(t1, t2)
         except Exception:
             return None
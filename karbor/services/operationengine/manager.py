@@ -14,9 +14,12 @@
 OperationEngine Service
 """
 
+import eventlet
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging as messaging
+from oslo_service import periodic_task
+from oslo_utils import timeutils
 from stevedore import driver as import_driver
 
 from karbor.common import constants
@@ -26,6 +29,7 @@ from karbor import manager
 from karbor import objects
 from karbor.services.operationengine.engine.triggers import trigger_manager
 from karbor.services.operationengine import operation_manager
+from karbor.services.operationengine import partitioner
 from karbor.services.operationengine import user_trust_manager
 
 
@@ -35,7 +39,24 @@ LOG = logging.getLogger(__name__)
 trigger_manager_opts = [
     cfg.StrOpt('executor',
                default='green_thread',
-               help='The name of executor which is used to run operations')
+               help='The name of executor which is used to run operations'),
+    cfg.IntOpt('restore_page_size',
+               default=1000,
+               min=1,
+               help='The number of triggers or scheduled operations read '
+                    'from the database at a time when the service restores '
+                    'them at startup'),
+    cfg.IntOpt('restore_workers',
+               default=16,
+               min=1,
+               help='The number of scheduled operations the service '
+                    'restores concurrently at startup'),
+    cfg.IntOpt('operation_log_sweep_batch_size',
+               default=1000,
+               min=1,
+               help='The maximum number of scheduled operation logs deleted '
+                    'by one statement when the oldest logs beyond '
+                    'retained_operation_log_number are deleted'),
 ]
 
 cfg.CONF.register_opts(trigger_manager_opts, 'operationengine')
@@ -56,6 +77,9 @@ class OperationEngineManager(manager.Manager):
         self._user_trust_manager = None
         self._operation_manager = None
         self._executor = None
+        self._ring = None
+        # operation_id: trigger_id of the operations registered here
+        self._operations = {}
 
     @property
     def operation_manager(self):
@@ -90,6 +114,7 @@ class OperationEngineManager(manager.Manager):
 
     def init_host(self, **kwargs):
         self._service_id = kwargs.get("service_id")
+        self._refresh_ring()
         self._restore()
 
     def cleanup_host(self):
@@ -97,15 +122,115 @@ class OperationEngineManager(manager.Manager):
             self._trigger_manager.shutdown()
             self._trigger_manager = None
 
+    def _refresh_ring(self):
+        """Rebuilds the hash ring from the live operation engine services
+
+        Returns whether the services on the ring changed. This service is
+        always on the ring, even before its first heartbeat.
+        """
+        hosts = partitioner.get_live_hosts()
+        hosts.add(self.host)
+        if self._ring is not None and self._ring.hosts == hosts:
+            return False
+        LOG.info("Operation engine services on the hash ring: %s",
+                 ', '.join(sorted(hosts)))
+        self._ring = partitioner.HashRing(hosts)
+        return True
+
+    def _owns_operation(self, operation_id):
+        return (self._ring is None or
+                self._ring.get_host(operation_id) == self.host)
+
+    @periodic_task.periodic_task
+    def _rebalance_operations(self, context):
+        """Moves the operations when services join or leave the ring
+
+        The operations now owned by other services are released, and the
+        operations now owned by this service, including the ones of the
+        services which are down, are restored.
+        """
+        if not self._refresh_ring():
+            return
+        released = 0
+        for operation_id, trigger_id in list(self._operations.items()):
+            if self._owns_operation(operation_id):
+                continue
+            try:
+                self.trigger_manager.unregister_operation(trigger_id,
+                                                          operation_id)
+            except exception.TriggerNotFound:
+                pass
+            self.user_trust_manager.release_operation(operation_id)
+            del self._operations[operation_id]
+            released += 1
+        LOG.info("Released %d scheduled operations to other services",
+                 released)
+        self._restore_operations()
+
+    @periodic_task.periodic_task
+    def _refresh_trust_tokens(self, context):
+        refreshed = self.user_trust_manager.refresh_tokens()
+        if refreshed:
+            LOG.debug("Refreshed %d trust tokens", refreshed)
+
+    @periodic_task.periodic_task
+    def _sweep_operation_logs(self, context):
+        """Deletes the oldest logs of all the scheduled operations
+
+        Keeps the newest retained_operation_log_number logs of every
+        operation, and the logs of the runs in progress. One of the
+        services on the hash ring sweeps the logs.
+        """
+        if (self._ring is not None and
+                self._ring.get_host('operation-log-sweeper') != self.host):
+            return
+        try:
+            deleted = objects.ScheduledOperationLogList.destroy_oldest(
+                karbor_context.get_admin_context(),
+                cfg.CONF.retained_operation_log_number,
+                [constants.OPERATION_EXE_STATE_IN_PROGRESS],
+                cfg.CONF.operationengine.operation_log_sweep_batch_size)
+        except Exception:
+            LOG.exception("Delete the oldest scheduled operation logs "
+                          "failed")
+            return
+        if deleted:
+            LOG.info("Deleted %d old scheduled operation logs", deleted)
+
     def _restore(self):
         self._restore_triggers()
         self._restore_operations()
 
+    def _register_operation(self, trigger_id, operation_id, **kwargs):
+        """Registers an operation, loading its trigger when missing
+
+        The triggers created after the service started are only added to
+        the service which validated them, the others load them on first
+        use.
+        """
+        try:
+            self.trigger_manager.register_operation(trigger_id,
+                                                    operation_id, **kwargs)
+        except exception.TriggerNotFound:
+            ctxt = karbor_context.get_admin_context()
+            try:
+                trigger = objects.Trigger.get_by_id(ctxt, trigger_id)
+            except exception.TriggerNotFound:
+                trigger = None
+            if trigger is None:
+                raise
+            self.trigger_manager.add_trigger(trigger.id, trigger.type,
+                                             trigger.properties)
+            self.trigger_manager.register_operation(trigger_id,
+                                                    operation_id, **kwargs)
+        self._operations[operation_id] = trigger_id
+
     def _restore_triggers(self):
-        limit = 100
+        limit = cfg.CONF.operationengine.restore_page_size
         marker = None
         filters = {}
         ctxt = karbor_context.get_admin_context()
+        count = 0
         while True:
             triggers = objects.TriggerList.get_by_filters(
                 ctxt, filters, limit, marker)
@@ -115,43 +240,75 @@ class OperationEngineManager(manager.Manager):
             for trigger in triggers:
                 self.trigger_manager.add_trigger(trigger.id, trigger.type,
                                                  trigger.properties)
+            count += len(triggers)
+            LOG.info("Restored %d triggers", count)
             if len(triggers) < limit:
                 break
             marker = triggers[-1].id
 
+    def _restore_operation(self, state, progress):
+        operation = state.operation
+        resume_states = [constants.OPERATION_STATE_TRIGGERED,
+                         constants.OPERATION_STATE_RUNNING]
+        try:
+            self._register_operation(
+                operation.trigger_id, operation.id,
+                resume=(state.state in resume_states),
+                end_time_for_run=state.end_time_for_run)
+
+            # the trust session is created when the operation first runs
+            self.user_trust_manager.resume_operation(
+                operation.id, operation.user_id,
+                operation.project_id, state.trust_id)
+        except Exception:
+            progress['failed'] += 1
+            LOG.exception("Restore scheduled operation %s failed",
+                          operation.id)
+        else:
+            progress['restored'] += 1
+
     def _restore_operations(self):
-        limit = 100
+        limit = cfg.CONF.operationengine.restore_page_size
         marker = None
-        filters = {"service_id": self._service_id,
-                   "state": [constants.OPERATION_STATE_REGISTERED,
+        filters = {"state": [constants.OPERATION_STATE_REGISTERED,
                              constants.OPERATION_STATE_TRIGGERED,
                              constants.OPERATION_STATE_RUNNING]}
         columns_to_join = ['operation']
         ctxt = karbor_context.get_admin_context()
-        resume_states = [constants.OPERATION_STATE_TRIGGERED,
-                         constants.OPERATION_STATE_RUNNING]
+        pool = eventlet.GreenPool(cfg.CONF.operationengine.restore_workers)
+        progress = {'restored': 0, 'failed': 0}
+        started_at = timeutils.now()
         while True:
-            states = objects.ScheduledOperationStateList.get_by_filters(
+            page = objects.ScheduledOperationStateList.get_by_filters(
                 ctxt, filters, limit, marker, columns_to_join=columns_to_join)
-            if not states:
+            if not page:
                 break
 
+            states = [state for state in page
+                      if state.operation.enabled and
+                      state.operation_id not in self._operations and
+                      self._owns_operation(state.operation_id)]
+            # take over the operations of the services which left the ring
+            taken_over = [state.operation_id for state in states
+                          if state.service_id != self._service_id]
+            if taken_over:
+                objects.ScheduledOperationStateList.bulk_update(
+                    ctxt, taken_over, {'service_id': self._service_id})
             for state in states:
-                operation = state.operation
-                if not operation.enabled:
-                    continue
-
-                resume = (state.state in resume_states)
-                self.trigger_manager.register_operation(
-                    operation.trigger_id, operation.id,
-                    resume=resume, end_time_for_run=state.end_time_for_run)
-
-                self.user_trust_manager.resume_operation(
-                    operation.id, operation.user_id,
-                    operation.project_id, state.trust_id)
-            if len(states) < limit:
+                pool.spawn_n(self._restore_operation, state, progress)
+            LOG.info("Restoring scheduled operations: %(restored)d "
+                     "restored, %(failed)d failed",
+                     progress)
+            if len(page) < limit:
                 break
-            marker = states[-1].id
+            marker = page[-1].operation_id
+
+        pool.waitall()
+        LOG.info("Restored %(restored)d scheduled operations, %(failed)d "
+                 "failed, in %(duration).3f seconds",
+                 {'restored': progress['restored'],
+                  'failed': progress['failed'],
+                  'duration': timeutils.now() - started_at})
 
     @messaging.expected_exceptions(exception.TriggerNotFound,
                                    exception.InvalidInput,
@@ -167,8 +324,7 @@ class OperationEngineManager(manager.Manager):
         )
 
         # register operation
-        self.trigger_manager.register_operation(operation.trigger_id,
-                                                operation.id)
+        self._register_operation(operation.trigger_id, operation.id)
         trust_id = self.user_trust_manager.add_operation(
             context, operation.id)
 
@@ -186,6 +342,7 @@ class OperationEngineManager(manager.Manager):
         except Exception:
             self.trigger_manager.unregister_operation(
                 operation.trigger_id, operation.id)
+            self._operations.pop(operation.id, None)
             raise
 
     @messaging.expected_exceptions(exception.ScheduledOperationStateNotFound,
@@ -200,12 +357,14 @@ class OperationEngineManager(manager.Manager):
             operation_state.save()
 
         self.trigger_manager.unregister_operation(trigger_id, operation_id)
+        self._operations.pop(operation_id, None)
         self.user_trust_manager.delete_operation(context, operation_id)
 
     @messaging.expected_exceptions(exception.TriggerNotFound)
     def suspend_scheduled_operation(self, context, operation_id, trigger_id):
         LOG.debug("Suspend scheduled operation.")
         self.trigger_manager.unregister_operation(trigger_id, operation_id)
+        self._operations.pop(operation_id, None)
 
     @messaging.expected_exceptions(exception.TriggerNotFound,
                                    exception.TriggerIsInvalid)
@@ -213,8 +372,7 @@ class OperationEngineManager(manager.Manager):
         LOG.debug("Resume scheduled operation.")
 
         try:
-            self.trigger_manager.register_operation(
-                trigger_id, operation_id)
+            self._register_operation(trigger_id, operation_id)
         except exception.ScheduledOperationExist:
             pass
         except Exception:
@@ -225,12 +383,19 @@ class OperationEngineManager(manager.Manager):
         self.trigger_manager.add_trigger(trigger.id, trigger.type,
                                          trigger.properties)
 
-    @messaging.expected_exceptions(exception.TriggerNotFound,
-                                   exception.DeleteTriggerNotAllowed)
+    @messaging.expected_exceptions(exception.DeleteTriggerNotAllowed)
     def delete_trigger(self, context, trigger_id):
-        self.trigger_manager.remove_trigger(trigger_id)
+        try:
+            self.trigger_manager.remove_trigger(trigger_id)
+        except exception.TriggerNotFound:
+            # the trigger is cast to all the services, only the ones with
+            # operations of the trigger loaded it
+            pass
 
-    @messaging.expected_exceptions(exception.TriggerNotFound,
-                                   exception.InvalidInput)
+    @messaging.expected_exceptions(exception.InvalidInput)
     def update_trigger(self, context, trigger):
-        self.trigger_manager.update_trigger(trigger.id, trigger.properties)
+        try:
+            self.trigger_manager.update_trigger(trigger.id,
+                                                trigger.properties)
+        except exception.TriggerNotFound:
+            pass
@@ -49,6 +49,9 @@ class Operation(object):
         super(Operation, self).__init__()
         self._user_trust_manager = user_trust_manager
         self._karbor_endpoint = None
+        # (user_id, project_id): (token, client)
+        self._karbor_clients = {}
+        user_trust_manager.register_drop_callback(self._drop_karbor_client)
 
     @abc.abstractmethod
     def check_operation_definition(self, operation_definition):
@@ -86,8 +89,6 @@ class Operation(object):
                         constants.OPERATION_EXE_STATE_DROPPED_OUT_OF_WINDOW)
                 else:
                     self._resume(operation_definition, param, log)
-
-                self._delete_oldest_operation_log(operation_id)
                 return
 
         if is_operation_expired:
@@ -99,8 +100,6 @@ class Operation(object):
         else:
             self._execute(operation_definition, param)
 
-        self._delete_oldest_operation_log(operation_id)
-
     @abc.abstractmethod
     def _execute(self, operation_definition, param):
         """Execute operation.
@@ -141,16 +140,6 @@ class Operation(object):
             return
         return log_ref
 
-    def _delete_oldest_operation_log(self, operation_id):
-        # delete the oldest logs to keep the number of logs
-        # in a reasonable range
-        try:
-            objects.ScheduledOperationLog.destroy_oldest(
-                context.get_admin_context(), operation_id,
-                CONF.retained_operation_log_number)
-        except Exception:
-            pass
-
     def _update_operation_log(self, log_ref, updates):
         if not log_ref:
             return
@@ -188,13 +177,25 @@ class Operation(object):
         except Exception:
             pass
 
+    def _drop_karbor_client(self, user_id, project_id):
+        self._karbor_clients.pop((user_id, project_id), None)
+
     def _create_karbor_client(self, user_id, project_id):
         token = self._user_trust_manager.get_token(user_id, project_id)
         if not token:
             return None
+
+        # the client of a user and project is reused until the token changes
+        key = (user_id, project_id)
+        cached = self._karbor_clients.get(key)
+        if cached and cached[0] == token:
+            return cached[1]
+
         ctx = context.get_admin_context()
         ctx.auth_token = token
         ctx.project_id = project_id
 
         karbor_url = self.karbor_endpoint % {"project_id": project_id}
-        return karbor_client.create(ctx, endpoint=karbor_url)
+        client = karbor_client.create(ctx, endpoint=karbor_url)
+        self._karbor_clients[key] = (token, client)
+        return client
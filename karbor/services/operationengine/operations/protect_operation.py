@@ -10,6 +10,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from oslo_config import cfg
+from oslo_log import log as logging
+import oslo_messaging as messaging
 from oslo_utils import uuidutils
 
 from karbor.common import constants
@@ -17,7 +20,26 @@ from karbor import context
 from karbor import exception
 from karbor.i18n import _
 from karbor import objects
+from karbor import policy
 from karbor.services.operationengine.operations import base
+from karbor.services.protection import api as protection_api
+from karbor.services.protection import rpcapi as protection_rpcapi
+
+protect_operation_opts = [
+    cfg.StrOpt('protect_dispatch',
+               default='rpc',
+               choices=['rpc', 'rest'],
+               help='How the scheduled protect operations create their '
+                    'checkpoints: "rpc" calls the protection service '
+                    'directly with the trust of the operation, falling back '
+                    'to the REST API when the protection service can not '
+                    'be reached; "rest" always calls the REST API'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(protect_operation_opts, 'operationengine')
+
+LOG = logging.getLogger(__name__)
 
 
 class ProtectOperation(base.Operation):
@@ -25,6 +47,10 @@ class ProtectOperation(base.Operation):
 
     OPERATION_TYPE = "protect"
 
+    def __init__(self, user_trust_manager):
+        super(ProtectOperation, self).__init__(user_trust_manager)
+        self._protection_rpcapi = None
+
     def check_operation_definition(self, operation_definition):
         provider_id = operation_definition.get("provider_id")
         if not provider_id or not uuidutils.is_uuid_like(provider_id):
@@ -49,14 +75,62 @@ class ProtectOperation(base.Operation):
         self._run(operation_definition, param, log_ref)
 
     def _run(self, operation_definition, param, log_ref):
-        client = self._create_karbor_client(
-            param.get("user_id"), param.get("project_id"))
         try:
-            client.checkpoints.create(operation_definition.get("provider_id"),
-                                      operation_definition.get("plan_id"))
+            self._protect(operation_definition, param)
         except Exception:
             state = constants.OPERATION_EXE_STATE_FAILED
         else:
             state = constants.OPERATION_EXE_STATE_SUCCESS
 
         self._update_log_when_operation_finished(log_ref, state)
+
+    @property
+    def protection_rpcapi(self):
+        if not self._protection_rpcapi:
+            self._protection_rpcapi = protection_rpcapi.ProtectionAPI()
+        return self._protection_rpcapi
+
+    def _protect(self, operation_definition, param):
+        if CONF.operationengine.protect_dispatch == 'rpc':
+            try:
+                return self._protect_by_rpc(operation_definition, param)
+            except (messaging.MessagingTimeout, messaging.RemoteError):
+                # the protection service may have created the checkpoint
+                raise
+            except messaging.MessagingException as err:
+                LOG.warning("Dispatching the protect operation %(id)s to "
+                            "the protection service failed, using the "
+                            "REST API: %(err)s",
+                            {'id': param.get('operation_id'), 'err': err})
+        return self._protect_by_rest(operation_definition, param)
+
+    def _protect_by_rpc(self, operation_definition, param):
+        """Creates the checkpoint by calling the protection service"""
+        # NOTE: the protection service creates the service clients of the
+        # protect flow from the token info and service catalog of the
+        # context, it needs them as much as the token.
+        ctxt = self._user_trust_manager.get_context(param.get("user_id"),
+                                                    param.get("project_id"))
+        if ctxt is None:
+            raise exception.AuthorizationFailure(obj=param.get(
+                'operation_id'))
+        policy.enforce_action(ctxt, 'provider:checkpoint_create')
+
+        plan = objects.Plan.get_by_id(ctxt,
+                                      operation_definition.get("plan_id"))
+        if operation_definition.get("provider_id") != plan.provider_id:
+            reason = _("Provider_id is invalid")
+            raise exception.InvalidOperationDefinition(reason=reason)
+
+        checkpoint_properties = protection_api.build_checkpoint_properties(
+            ctxt, plan)
+        return self.protection_rpcapi.protect(ctxt, plan,
+                                              checkpoint_properties)
+
+    def _protect_by_rest(self, operation_definition, param):
+        """Creates the checkpoint by calling the REST API of karbor"""
+        client = self._create_karbor_client(
+            param.get("user_id"), param.get("project_id"))
+        return client.checkpoints.create(
+            operation_definition.get("provider_id"),
+            operation_definition.get("plan_id"))
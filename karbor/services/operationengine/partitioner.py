@@ -0,0 +1,91 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Partition the scheduled operations across the operation engine services.
+"""
+
+import bisect
+import hashlib
+
+from oslo_config import cfg
+from oslo_utils import encodeutils
+
+from karbor import context as karbor_context
+from karbor import objects
+from karbor import utils
+
+partitioner_opts = [
+    cfg.IntOpt('partition_replicas',
+               default=64,
+               min=1,
+               help='The number of points of every operation engine '
+                    'service on the hash ring partitioning the scheduled '
+                    'operations. More points spread the operations more '
+                    'evenly'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(partitioner_opts, 'operationengine')
+
+
+def _hash(key):
+    digest = hashlib.md5(encodeutils.safe_encode(key)).hexdigest()
+    return int(digest[:8], 16)
+
+
+class HashRing(object):
+    """Consistent hash ring of the hosts of the operation engine services
+
+    Every host owns the keys hashed between its points and the points
+    before them, so that a host joining or leaving the ring only moves the
+    keys of its own points.
+    """
+
+    def __init__(self, hosts, replicas=None):
+        super(HashRing, self).__init__()
+        if replicas is None:
+            replicas = CONF.operationengine.partition_replicas
+        self._hosts = frozenset(hosts)
+        self._ring = sorted(
+            (_hash('%s-%d' % (host, replica)), host)
+            for host in self._hosts for replica in range(replicas))
+        self._points = [point for point, _ in self._ring]
+
+    @property
+    def hosts(self):
+        return self._hosts
+
+    def get_host(self, key):
+        """Returns the host owning a key, None when the ring is empty"""
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._points, _hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+
+def get_live_hosts(context=None):
+    """Returns the hosts of the operation engine services which are up"""
+    if context is None:
+        context = karbor_context.get_admin_context()
+    services = objects.ServiceList.get_all_by_topic(
+        context, CONF.operationengine_topic, disabled=False)
+    return set(service.host for service in services
+               if utils.service_is_up(service))
+
+
+def get_operation_host(operation_id):
+    """Returns the host of the service running a scheduled operation
+
+    Returns None when no operation engine service is up.
+    """
+    return HashRing(get_live_hosts()).get_host(operation_id)
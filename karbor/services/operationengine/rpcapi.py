@@ -44,30 +44,44 @@ class OperationEngineAPI(object):
                                 serializer=serializer)
         self._client = client.prepare(version='1.0')
 
-    def create_scheduled_operation(self, ctxt, operation):
-        return self._client.call(ctxt, 'create_scheduled_operation',
-                                 operation=operation)
-
-    def delete_scheduled_operation(self, ctxt, operation_id, trigger_id):
-        return self._client.call(ctxt, 'delete_scheduled_operation',
-                                 operation_id=operation_id,
-                                 trigger_id=trigger_id)
-
-    def suspend_scheduled_operation(self, ctxt, operation_id, trigger_id):
-        return self._client.call(ctxt, 'suspend_scheduled_operation',
-                                 operation_id=operation_id,
-                                 trigger_id=trigger_id)
-
-    def resume_scheduled_operation(self, ctxt, operation_id, trigger_id):
-        return self._client.call(ctxt, 'resume_scheduled_operation',
-                                 operation_id=operation_id,
-                                 trigger_id=trigger_id)
+    def _prepare(self, host=None, fanout=False):
+        if host:
+            return self._client.prepare(server=host)
+        if fanout:
+            return self._client.prepare(fanout=True)
+        return self._client
+
+    def create_scheduled_operation(self, ctxt, operation, host=None):
+        return self._prepare(host).call(ctxt, 'create_scheduled_operation',
+                                        operation=operation)
+
+    def delete_scheduled_operation(self, ctxt, operation_id, trigger_id,
+                                   host=None):
+        return self._prepare(host).call(ctxt, 'delete_scheduled_operation',
+                                        operation_id=operation_id,
+                                        trigger_id=trigger_id)
+
+    def suspend_scheduled_operation(self, ctxt, operation_id, trigger_id,
+                                    host=None):
+        return self._prepare(host).call(ctxt, 'suspend_scheduled_operation',
+                                        operation_id=operation_id,
+                                        trigger_id=trigger_id)
+
+    def resume_scheduled_operation(self, ctxt, operation_id, trigger_id,
+                                   host=None):
+        return self._prepare(host).call(ctxt, 'resume_scheduled_operation',
+                                        operation_id=operation_id,
+                                        trigger_id=trigger_id)
 
     def create_trigger(self, ctxt, trigger):
         return self._client.call(ctxt, 'create_trigger', trigger=trigger)
 
     def delete_trigger(self, ctxt, trigger_id):
-        return self._client.call(ctxt, 'delete_trigger', trigger_id=trigger_id)
+        # every service which loaded the trigger removes it
+        return self._prepare(fanout=True).cast(ctxt, 'delete_trigger',
+                                               trigger_id=trigger_id)
 
     def update_trigger(self, ctxt, trigger):
-        return self._client.call(ctxt, 'update_trigger', trigger=trigger)
+        # every service which loaded the trigger updates it
+        return self._prepare(fanout=True).cast(ctxt, 'update_trigger',
+                                               trigger=trigger)
@@ -10,19 +10,50 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from datetime import timedelta
+import zlib
+
+from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import timeutils
 
 from karbor.common import karbor_keystone_plugin
 
 
 LOG = logging.getLogger(__name__)
 
+user_trust_opts = [
+    cfg.IntOpt('token_refresh_margin',
+               default=300,
+               min=0,
+               help='Seconds before the expiry of a trust token when it is '
+                    'not used anymore and a new token is requested'),
+    cfg.IntOpt('token_refresh_spread',
+               default=900,
+               min=0,
+               help='Seconds before the refresh margin over which the '
+                    'trust tokens are refreshed in the background, every '
+                    'user and project at its own offset, so that tokens '
+                    'expiring at the same time are not all requested from '
+                    'keystone at once'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(user_trust_opts, 'operationengine')
+
+
+def _refresh_offset(key):
+    """Returns the fraction of the refresh spread a token is refreshed at"""
+    checksum = zlib.crc32(key.encode('utf-8')) & 0xffffffff
+    return checksum / float(1 << 32)
+
 
 class UserTrustManager(object):
     def __init__(self):
         super(UserTrustManager, self).__init__()
         self._user_trust_map = {}
         self._skp = karbor_keystone_plugin.KarborKeystonePlugin()
+        self._drop_callbacks = []
 
     def _user_trust_key(self, user_id, project_id):
         return "%s_%s" % (user_id, project_id)
@@ -31,9 +62,15 @@ class UserTrustManager(object):
                              operation_id, trust_id, session):
         key = self._user_trust_key(user_id, project_id)
         self._user_trust_map[key] = {
+            'user_id': user_id,
+            'project_id': project_id,
             'operation_ids': {operation_id},
             'trust_id': trust_id,
-            'session': session
+            'session': session,
+            'key': key,
+            'token': None,
+            'expires_at': None,
+            'refresh_at': None,
         }
 
     def _get_user_trust_info(self, user_id, project_id):
@@ -43,6 +80,52 @@ class UserTrustManager(object):
     def _del_user_trust_info(self, user_id, project_id):
         key = self._user_trust_key(user_id, project_id)
         del self._user_trust_map[key]
+        for callback in self._drop_callbacks:
+            callback(user_id, project_id)
+
+    def register_drop_callback(self, callback):
+        """Registers callback(user_id, project_id) to be called when the
+        trust of a user and project is dropped, with its last operation
+        """
+        self._drop_callbacks.append(callback)
+
+    def _get_session(self, auth_info):
+        if auth_info['session'] is None:
+            auth_info['session'] = self._skp.create_trust_session(
+                auth_info['trust_id'])
+        return auth_info['session']
+
+    def _fetch_token(self, auth_info):
+        """Requests a new token of the trust and caches it"""
+        session = self._get_session(auth_info)
+        if auth_info['expires_at'] is not None:
+            # drop the token cached by the auth plugin of the session
+            session.invalidate()
+        token = session.get_token()
+        try:
+            expires = session.auth.get_access(session).expires
+        except Exception:
+            expires = None
+
+        auth_info['token'] = token
+        if expires is None:
+            # not known when the token expires, do not cache it
+            auth_info['expires_at'] = auth_info['refresh_at'] = None
+            return token
+
+        expires_at = timeutils.normalize_time(expires) - timedelta(
+            seconds=CONF.operationengine.token_refresh_margin)
+        spread = CONF.operationengine.token_refresh_spread * (
+            _refresh_offset(auth_info['key']))
+        auth_info['expires_at'] = expires_at
+        auth_info['refresh_at'] = expires_at - timedelta(seconds=spread)
+        return token
+
+    def _get_cached_token(self, auth_info):
+        expires_at = auth_info['expires_at']
+        if expires_at is not None and timeutils.utcnow() < expires_at:
+            return auth_info['token']
+        return self._fetch_token(auth_info)
 
     def get_token(self, user_id, project_id):
         auth_info = self._get_user_trust_info(user_id, project_id)
@@ -50,13 +133,57 @@ class UserTrustManager(object):
             return None
 
         try:
-            return auth_info['session'].get_token()
+            return self._get_cached_token(auth_info)
         except Exception:
             LOG.exception("Get token failed, user_id=%(user_id)s, "
                           "project_id=%(proj_id)s",
                           {'user_id': user_id, 'proj_id': project_id})
         return None
 
+    def get_context(self, user_id, project_id):
+        """Returns a request context with the token of a user trust
+
+        The context carries the token info and the service catalog of the
+        token like the context of an API request. Returns None when the
+        user and project have no trust or no token can be got.
+        """
+        auth_info = self._get_user_trust_info(user_id, project_id)
+        if not auth_info:
+            return None
+
+        try:
+            self._get_cached_token(auth_info)
+            return karbor_keystone_plugin.get_session_context(
+                self._get_session(auth_info))
+        except Exception:
+            LOG.exception("Get context failed, user_id=%(user_id)s, "
+                          "project_id=%(proj_id)s",
+                          {'user_id': user_id, 'proj_id': project_id})
+        return None
+
+    def refresh_tokens(self):
+        """Refreshes the cached tokens which are due
+
+        Every token is refreshed at its own offset before it expires, so
+        that the tokens expiring together are requested over the refresh
+        spread instead of all when the operations next run. Only the
+        tokens which were used are refreshed.
+        """
+        now = timeutils.utcnow()
+        refreshed = 0
+        for auth_info in list(self._user_trust_map.values()):
+            refresh_at = auth_info['refresh_at']
+            if refresh_at is None or now < refresh_at:
+                continue
+            try:
+                self._fetch_token(auth_info)
+            except Exception:
+                LOG.exception("Refresh token of trust %s failed",
+                              auth_info['trust_id'])
+            else:
+                refreshed += 1
+        return refreshed
+
     def add_operation(self, context, operation_id):
         auth_info = self._get_user_trust_info(
             context.user_id, context.project_id)
@@ -88,16 +215,29 @@ class UserTrustManager(object):
             self._skp.delete_trust_to_karbor(auth_info['trust_id'])
             self._del_user_trust_info(context.user_id, context.project_id)
 
+    def release_operation(self, operation_id):
+        """Forgets an operation which another service runs now
+
+        Unlike delete_operation the trust is kept, the other service uses
+        it.
+        """
+        for key, auth_info in list(self._user_trust_map.items()):
+            operation_ids = auth_info['operation_ids']
+            if operation_id not in operation_ids:
+                continue
+            operation_ids.discard(operation_id)
+            if len(operation_ids) == 0:
+                self._del_user_trust_info(auth_info['user_id'],
+                                          auth_info['project_id'])
+            return
+
     def resume_operation(self, operation_id, user_id, project_id, trust_id):
         auth_info = self._get_user_trust_info(user_id, project_id)
         if auth_info:
             auth_info['operation_ids'].add(operation_id)
             return
 
-        try:
-            lsession = self._skp.create_trust_session(trust_id)
-        except Exception:
-            raise
-
+        # the session is created when the token is first needed, so that
+        # restoring the operations does not wait for keystone
         self._add_user_trust_info(user_id, project_id,
-                                  operation_id, trust_id, lsession)
+                                  operation_id, trust_id, None)
@@ -13,10 +13,31 @@
 """Handles all requests relating to protection service."""
 
 
+from oslo_serialization import jsonutils
+
+from karbor.common import constants
 from karbor.db import base
 from karbor.services.protection import rpcapi as protection_rpcapi
 
 
+def build_checkpoint_properties(context, plan, extra_info=None):
+    """Returns the properties of a new checkpoint of a plan"""
+    checkpoint_extra_info = None
+    if extra_info is not None:
+        checkpoint_extra_info = jsonutils.dumps(extra_info)
+    return {
+        'project_id': context.project_id,
+        'status': constants.CHECKPOINT_STATUS_PROTECTING,
+        'provider_id': plan.get("provider_id"),
+        "protection_plan": {
+            "id": plan.get("id"),
+            "name": plan.get("name"),
+            "resources": plan.get("resources"),
+        },
+        "extra_info": checkpoint_extra_info
+    }
+
+
 class API(base.Base):
     """API for interacting with the protection manager."""
 
@@ -24,8 +45,9 @@ class API(base.Base):
         self.protection_rpcapi = protection_rpcapi.ProtectionAPI()
         super(API, self).__init__(db_driver)
 
-    def restore(self, context, restore, restore_auth):
-        return self.protection_rpcapi.restore(context, restore, restore_auth)
+    def restore(self, context, restore, restore_auth, resources=None):
+        return self.protection_rpcapi.restore(context, restore, restore_auth,
+                                              resources)
 
     def protect(self, context, plan, checkpoint_properties):
         return self.protection_rpcapi.protect(context, plan,
@@ -92,10 +92,11 @@ class FileSystemBankPlugin(BankPlugin):
     def _get_object(self, path):
         obj_file_name = self.object_container_path + path
         if not os.path.isfile(obj_file_name):
-            LOG.exception(_("Object is not a file. name: %s"), obj_file_name)
-            raise
+            LOG.error("Object is not a file. name: %s", obj_file_name)
+            raise OSError(errno.ENOENT, os.strerror(errno.ENOENT),
+                          obj_file_name)
         try:
-            with open(obj_file_name, mode='r') as obj_file:
+            with open(obj_file_name, mode='rb') as obj_file:
                 data = obj_file.read()
                 return data
         except OSError:
@@ -117,10 +118,12 @@ class FileSystemBankPlugin(BankPlugin):
 
     def _list_object(self, path):
         obj_file_path = self.object_container_path + path
+        if not os.path.exists(obj_file_path):
+            return []
         if not os.path.isdir(obj_file_path):
-            LOG.exception(_("Path is not a directory. name: %s"),
+            LOG.error("Path is not a directory. name: %s", obj_file_path)
+            raise OSError(errno.ENOTDIR, os.strerror(errno.ENOTDIR),
                           obj_file_path)
-            raise
         try:
             if os.path.isdir(obj_file_path):
                 return os.listdir(obj_file_path)
@@ -143,7 +146,7 @@ class FileSystemBankPlugin(BankPlugin):
         LOG.debug("FsBank: update_object. key: %s", key)
         self._validate_path(key)
         try:
-            if not isinstance(value, str):
+            if not isinstance(value, (str, six.binary_type)):
                 value = jsonutils.dumps(value)
             self._write_object(path=key,
                                data=value)
@@ -171,11 +174,15 @@ class FileSystemBankPlugin(BankPlugin):
             LOG.error("Get object failed. err: %s", err)
             raise exception.BankGetObjectFailed(reason=err,
                                                 key=key)
-        if isinstance(data, six.string_types):
-            try:
-                data = jsonutils.loads(data)
-            except ValueError:
-                pass
+        try:
+            data = data.decode('utf-8')
+        except UnicodeDecodeError:
+            # binary objects, such as image data, are returned as they are
+            return data
+        try:
+            data = jsonutils.loads(data)
+        except ValueError:
+            pass
         return data
 
     def list_objects(self, prefix=None, limit=None, marker=None,
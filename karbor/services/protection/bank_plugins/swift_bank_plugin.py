@@ -10,9 +10,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import math
 import time
 
+from eventlet import pools
 from karbor import exception
 from karbor.i18n import _
 from karbor.services.protection.bank_plugin import BankPlugin
@@ -23,6 +25,7 @@ from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_service import loopingcall
 from oslo_utils import uuidutils
+import six
 from swiftclient import ClientException
 
 
@@ -30,6 +33,10 @@ swift_bank_plugin_opts = [
     cfg.StrOpt('bank_swift_object_container',
                default='karbor',
                help='The default swift container to use.'),
+    cfg.IntOpt('bank_swift_connection_pool_size',
+               default=8, min=1,
+               help='The maximum number of swift connections the bank uses '
+                    'concurrently.'),
 ]
 
 LOG = logging.getLogger(__name__)
@@ -73,6 +80,12 @@ class SwiftBankPlugin(BankPlugin, LeasePlugin):
         self.lease_expire_time = 0
         self.bank_leases_container = "leases"
         self._connection = None
+        # NOTE: swiftclient connections must not be shared between green
+        # threads issuing requests concurrently, so each request borrows
+        # a connection of its own from this pool.
+        self._connection_pool = pools.Pool(
+            max_size=plugin_cfg.bank_swift_connection_pool_size,
+            create=self._setup_connection)
 
     def _setup_connection(self):
         return client_factory.ClientFactory.create_client('swift',
@@ -106,13 +119,21 @@ class SwiftBankPlugin(BankPlugin, LeasePlugin):
                                    initial_delay=self.lease_renew_window)
         return self._connection
 
+    @contextlib.contextmanager
+    def _pooled_connection(self):
+        if not self._connection:
+            # set up the containers and the lease before the first request
+            self.connection
+        with self._connection_pool.item() as connection:
+            yield connection
+
     def get_owner_id(self):
         return self.owner_id
 
     def update_object(self, key, value):
         serialized = False
         try:
-            if not isinstance(value, str):
+            if not isinstance(value, (str, six.binary_type)):
                 value = jsonutils.dumps(value)
                 serialized = True
             self._put_object(container=self.bank_object_container,
@@ -197,17 +218,19 @@ class SwiftBankPlugin(BankPlugin, LeasePlugin):
 
     def _put_object(self, container, obj, contents, headers=None):
         try:
-            self.connection.put_object(container=container,
-                                       obj=obj,
-                                       contents=contents,
-                                       headers=headers)
+            with self._pooled_connection() as connection:
+                connection.put_object(container=container,
+                                      obj=obj,
+                                      contents=contents,
+                                      headers=headers)
         except ClientException as err:
             raise SwiftConnectionFailed(reason=err)
 
     def _get_object(self, container, obj):
         try:
-            (_resp, body) = self.connection.get_object(container=container,
-                                                       obj=obj)
+            with self._pooled_connection() as connection:
+                (_resp, body) = connection.get_object(container=container,
+                                                      obj=obj)
             if _resp.get("x-object-meta-serialized").lower() == "true":
                 body = jsonutils.loads(body)
             return body
@@ -216,34 +239,38 @@ class SwiftBankPlugin(BankPlugin, LeasePlugin):
 
     def _post_object(self, container, obj, headers):
         try:
-            self.connection.post_object(container=container,
-                                        obj=obj,
-                                        headers=headers)
+            with self._pooled_connection() as connection:
+                connection.post_object(container=container,
+                                       obj=obj,
+                                       headers=headers)
         except ClientException as err:
             raise SwiftConnectionFailed(reason=err)
 
     def _delete_object(self, container, obj):
         try:
-            self.connection.delete_object(container=container,
-                                          obj=obj)
+            with self._pooled_connection() as connection:
+                connection.delete_object(container=container,
+                                         obj=obj)
         except ClientException as err:
             raise SwiftConnectionFailed(reason=err)
 
     def _put_container(self, container):
         try:
-            self.connection.put_container(container=container)
+            with self._pooled_connection() as connection:
+                connection.put_container(container=container)
         except ClientException as err:
             raise SwiftConnectionFailed(reason=err)
 
     def _get_container(self, container, prefix=None, limit=None, marker=None,
                        end_marker=None):
         try:
-            (_resp, body) = self.connection.get_container(
-                container=container,
-                prefix=prefix,
-                limit=limit,
-                marker=marker,
-                end_marker=end_marker)
+            with self._pooled_connection() as connection:
+                (_resp, body) = connection.get_container(
+                    container=container,
+                    prefix=prefix,
+                    limit=limit,
+                    marker=marker,
+                    end_marker=end_marker)
             return body
         except ClientException as err:
             raise SwiftConnectionFailed(reason=err)
@@ -25,6 +25,7 @@ CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
 _INDEX_FILE_NAME = "index.json"
+_TIMINGS_FILE_NAME = "timings"
 _UUID_STR_LEN = 36
 
 
@@ -201,12 +202,31 @@ class Checkpoint(object):
             value=self._md_cache,
         )
 
+    def get_timings(self):
+        """Returns the task timing breakdown of the protect operation"""
+        try:
+            return self._checkpoint_section.get_object(_TIMINGS_FILE_NAME)
+        except exception.BankGetObjectFailed:
+            return None
+
+    def update_timings(self, timings):
+        self._checkpoint_section.update_object(
+            key=_TIMINGS_FILE_NAME,
+            value=timings,
+        )
+
+    def _delete_timings(self):
+        if _TIMINGS_FILE_NAME in self._checkpoint_section.list_objects(
+                prefix=_TIMINGS_FILE_NAME):
+            self._checkpoint_section.delete_object(_TIMINGS_FILE_NAME)
+
     def purge(self):
         """Purge the index file of the checkpoint.
 
         Can only be done if the checkpoint has no other files apart from the
         index.
         """
+        self._delete_timings()
         all_objects = self._checkpoint_section.list_objects()
         if len(all_objects) == 1 and all_objects[0] == _INDEX_FILE_NAME:
             created_at = self._md_cache["created_at"]
@@ -228,6 +248,7 @@ class Checkpoint(object):
     def delete(self):
         self.status = constants.CHECKPOINT_STATUS_DELETED
         self.commit()
+        self._delete_timings()
         # delete indices
         created_at = self._md_cache["created_at"]
         timestamp = self._md_cache["timestamp"]
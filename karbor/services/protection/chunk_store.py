@@ -0,0 +1,179 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+
+from eventlet import tpool
+from oslo_concurrency import lockutils
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from karbor import exception
+
+LOG = logging.getLogger(__name__)
+
+CONF = cfg.CONF
+
+_CHUNKS_SECTION = "/chunks"
+_DATA_OBJECT = "data"
+_INDEX_OBJECT = "index"
+_REFS_SECTION = "refs"
+# objects listed per request, Swift returns at most 10000
+_LIST_PAGE_SIZE = 1000
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def chunk_digest(data):
+    """Returns the SHA-256 hex digest of a chunk
+
+    hashlib releases the GIL while hashing large buffers, so the digest is
+    computed in a native thread, leaving the hub free to run other green
+    threads meanwhile.
+    """
+    return tpool.execute(_sha256, data)
+
+
+class ChunkStore(object):
+    """Content addressed store of data chunks shared between checkpoints
+
+    Chunks are kept under /chunks/<sha256>/ in the bank:
+
+    - data: the content of the chunk
+    - index: written once the data is complete, so its presence tells the
+      chunk exists without downloading it
+    - refs/<reference>: one object per referencing resource, the number of
+      these objects is the reference count of the chunk
+
+    A chunk is garbage collected when its last reference is removed.
+
+    The lock only excludes the workers of one host, while all the
+    protection services share the bank. Adding a reference writes the
+    reference before checking the chunk, removing the last reference
+    deletes the index before checking the references again, and an upload
+    checks its data is still there, so that a chunk referenced from
+    another host is uploaded again rather than lost.
+    """
+
+    def __init__(self, bank):
+        super(ChunkStore, self).__init__()
+        self._section = bank.get_sub_section(_CHUNKS_SECTION)
+
+    def _key(self, digest, *parts):
+        return "/".join((digest, ) + parts)
+
+    def _lock(self, digest):
+        # the protection workers of a host must also exclude each other
+        return lockutils.lock("karbor-chunk-%s" % digest,
+                              external=CONF.protection_workers > 1)
+
+    def _object_exists(self, key):
+        return key in self._section.list_objects(prefix=key, limit=1)
+
+    def _list_references(self, digest, limit=None):
+        prefix = self._key(digest, _REFS_SECTION) + "/"
+        marker = None
+        listed = 0
+        while limit is None or listed < limit:
+            page_size = _LIST_PAGE_SIZE if limit is None else min(
+                _LIST_PAGE_SIZE, limit - listed)
+            keys = list(self._section.list_objects(
+                prefix=prefix, limit=page_size, marker=marker))
+            for key in keys:
+                yield key
+            listed += len(keys)
+            if len(keys) < page_size:
+                return
+            marker = keys[-1]
+
+    def _upload(self, digest, data):
+        data_key = self._key(digest, _DATA_OBJECT)
+        self._section.update_object(data_key, data)
+        self._section.update_object(self._key(digest, _INDEX_OBJECT),
+                                    {"size": len(data)})
+        if not self._object_exists(data_key):
+            # another host deleted the chunk while it was uploaded
+            LOG.warning("Data of chunk %s deleted while uploading it, "
+                        "uploading it again.", digest)
+            self._section.update_object(data_key, data)
+
+    def exists(self, digest):
+        try:
+            return self._section.get_object(
+                self._key(digest, _INDEX_OBJECT)) is not None
+        except exception.BankGetObjectFailed:
+            return False
+
+    def put(self, digest, data, reference):
+        """Adds a reference to a chunk, uploading it if it does not exist
+
+        Returns True if the data was uploaded, False if the chunk already
+        existed in the store.
+        """
+        with self._lock(digest):
+            self._section.update_object(
+                self._key(digest, _REFS_SECTION, reference), reference)
+            if self.exists(digest) and self._object_exists(
+                    self._key(digest, _DATA_OBJECT)):
+                return False
+            self._upload(digest, data)
+            return True
+
+    def add_reference(self, digest, reference):
+        """Adds a reference to an existing chunk
+
+        Returns False if the chunk does not exist.
+        """
+        with self._lock(digest):
+            if not self.exists(digest):
+                return False
+            self._section.update_object(
+                self._key(digest, _REFS_SECTION, reference), reference)
+            return True
+
+    def get(self, digest):
+        return self._section.get_object(self._key(digest, _DATA_OBJECT))
+
+    def count_references(self, digest):
+        return len(list(self._list_references(digest)))
+
+    def _has_references(self, digest):
+        return any(True for _ in self._list_references(digest, limit=1))
+
+    def remove_reference(self, digest, reference):
+        """Removes a reference, deleting the chunk if it was the last one
+
+        Returns True if the chunk was deleted.
+        """
+        with self._lock(digest):
+            try:
+                self._section.delete_object(
+                    self._key(digest, _REFS_SECTION, reference))
+            except exception.BankDeleteObjectFailed:
+                LOG.warning("Reference %(ref)s of chunk %(digest)s not "
+                            "found.", {'ref': reference, 'digest': digest})
+
+            if self._has_references(digest):
+                return False
+
+            LOG.debug("Deleting unreferenced chunk %s.", digest)
+            index_key = self._key(digest, _INDEX_OBJECT)
+            index = self._section.get_object(index_key)
+            self._section.delete_object(index_key)
+            # a reference added from another host meanwhile keeps the chunk
+            if self._has_references(digest):
+                self._section.update_object(index_key, index)
+                return False
+            self._section.delete_object(self._key(digest, _DATA_OBJECT))
+            return True
@@ -11,6 +11,7 @@
 # under the License.
 
 from karbor.common import constants
+from karbor.services.protection.flows import scheduling
 from karbor.services.protection import resource_flow
 from oslo_log import log as logging
 from taskflow import task
@@ -36,19 +37,18 @@ class CompleteDeleteTask(task.Task):
         checkpoint.delete()
 
 
-def get_flow(context, workflow_engine, checkpoint, provider):
+def get_flow(context, workflow_engine, checkpoint, provider,
+             persistence=None):
     LOG.info("Start get checkpoint flow, checkpoint_id: %s", checkpoint.id)
     flow_name = "Delete_Checkpoint_" + checkpoint.id
     delete_flow = workflow_engine.build_flow(flow_name, 'linear')
     resource_graph = checkpoint.resource_graph
-    plugins = provider.load_plugins()
-    resources_task_flow = resource_flow.build_resource_flow(
+    flow_cache = resource_flow.get_resource_flow_cache()
+    resources_task_flow = flow_cache.get_flow(
         operation_type=constants.OPERATION_DELETE,
-        context=context,
         workflow_engine=workflow_engine,
+        provider=provider,
         resource_graph=resource_graph,
-        plugins=plugins,
-        parameters=None
     )
     workflow_engine.add_tasks(
         delete_flow,
@@ -56,6 +56,13 @@ def get_flow(context, workflow_engine, checkpoint, provider):
         resources_task_flow,
         CompleteDeleteTask(),
     )
-    flow_engine = workflow_engine.get_engine(delete_flow,
-                                             store={'checkpoint': checkpoint})
+    store = resource_flow.build_resource_store(context, resource_graph, None)
+    store['checkpoint'] = checkpoint
+    history = scheduling.get_history(provider, constants.OPERATION_DELETE)
+    flow_engine = workflow_engine.get_engine(
+        delete_flow, store=store,
+        priorities=scheduling.get_priorities(resources_task_flow, history),
+        **(persistence or {}))
+    flow_cache.release_when_finished(flow_engine, resources_task_flow)
+    scheduling.record_durations(flow_engine, resources_task_flow, history)
     return flow_engine
@@ -0,0 +1,233 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import heapq
+import itertools
+import threading
+
+from concurrent import futures
+from eventlet import greenthread
+import futurist
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from karbor.i18n import _
+
+executor_opts = [
+    cfg.IntOpt('max_concurrent_tasks',
+               default=0, min=0,
+               help='number of maximum concurrent tasks of all the '
+                    'operation flows of the protection service. 0 means '
+                    'no hard limit'),
+    cfg.IntOpt('max_concurrent_tasks_per_flow',
+               default=0, min=0,
+               help='number of maximum concurrent tasks of a single '
+                    'operation flow. 0 means no hard limit'),
+    cfg.DictOpt('max_concurrent_tasks_per_resource_type',
+                default={},
+                help='number of maximum concurrent tasks per resource type '
+                     'of all the operation flows, e.g. '
+                     '"OS::Cinder::Volume:20,OS::Glance::Image:10". '
+                     'Resource types not listed have no hard limit'),
+]
+
+LOG = logging.getLogger(__name__)
+
+CONF = cfg.CONF
+CONF.register_opts(executor_opts)
+
+
+_WorkItem = collections.namedtuple('_WorkItem', [
+    'future', 'fn', 'args', 'kwargs', 'flow_key', 'resource_type',
+    'priority',
+])
+
+
+def _task_resource_type(args):
+    # taskflow submits the task as the first argument, the hook tasks of
+    # the resource flows get the resource injected
+    task = args[0] if args else None
+    resource = (getattr(task, 'inject', None) or {}).get('resource')
+    return getattr(resource, 'type', None)
+
+
+class SharedTaskExecutor(object):
+    """Runs the tasks of all the operation flows of the process
+
+    A task is started once the number of running tasks is below the global
+    limit, the limit of its flow and the limit of its resource type. Tasks
+    which can not start yet wait in a single queue, ordered by priority and
+    then FIFO. A task blocked by its flow or resource type limit does not
+    hold back the tasks queued after it. A limit of 0 means no limit.
+
+    Every flow engine gets its own FlowTaskExecutor, which submits to this
+    executor on behalf of the flow.
+    """
+
+    def __init__(self, max_tasks=0, max_tasks_per_flow=0,
+                 max_tasks_per_type=None):
+        super(SharedTaskExecutor, self).__init__()
+        self._max_tasks = max_tasks
+        self._max_tasks_per_flow = max_tasks_per_flow
+        self._max_tasks_per_type = {
+            resource_type: int(limit)
+            for resource_type, limit in (max_tasks_per_type or {}).items()
+        }
+        self._lock = threading.Lock()
+        self._queue = []
+        self._counter = itertools.count()
+        self._running = 0
+        self._running_per_flow = collections.Counter()
+        self._running_per_type = collections.Counter()
+
+    def flow_executor(self, priorities=None):
+        """Returns an executor for the tasks of a new flow
+
+        :param priorities: task name => priority dictionary, tasks with a
+                           higher priority are started first
+        """
+        return FlowTaskExecutor(self, priorities)
+
+    def submit(self, flow_key, fn, *args, **kwargs):
+        return self.submit_with_priority(flow_key, 0, fn, *args, **kwargs)
+
+    def submit_with_priority(self, flow_key, priority, fn, *args, **kwargs):
+        future = futurist.GreenFuture()
+        item = _WorkItem(future, fn, args, kwargs, flow_key,
+                         _task_resource_type(args), priority)
+        with self._lock:
+            heapq.heappush(self._queue,
+                           (-priority, next(self._counter), item))
+        self._dispatch()
+        return future
+
+    def _can_start(self, item):
+        if self._max_tasks and self._running >= self._max_tasks:
+            return False
+        if (self._max_tasks_per_flow and
+                self._running_per_flow[item.flow_key] >=
+                self._max_tasks_per_flow):
+            return False
+        type_limit = self._max_tasks_per_type.get(item.resource_type)
+        if (type_limit and
+                self._running_per_type[item.resource_type] >= type_limit):
+            return False
+        return True
+
+    def _dispatch(self):
+        started = []
+        with self._lock:
+            blocked = []
+            while self._queue:
+                if self._max_tasks and self._running >= self._max_tasks:
+                    break
+                entry = heapq.heappop(self._queue)
+                item = entry[-1]
+                if not self._can_start(item):
+                    blocked.append(entry)
+                    continue
+                self._running += 1
+                self._running_per_flow[item.flow_key] += 1
+                self._running_per_type[item.resource_type] += 1
+                started.append(item)
+            for entry in blocked:
+                heapq.heappush(self._queue, entry)
+
+        for item in started:
+            greenthread.spawn_n(self._run, item)
+
+    def _run(self, item):
+        try:
+            if not item.future.set_running_or_notify_cancel():
+                return
+            try:
+                result = item.fn(*item.args, **item.kwargs)
+            except BaseException as e:
+                item.future.set_exception(e)
+            else:
+                item.future.set_result(result)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._decrement(self._running_per_flow, item.flow_key)
+                self._decrement(self._running_per_type, item.resource_type)
+            self._dispatch()
+
+    @staticmethod
+    def _decrement(counter, key):
+        counter[key] -= 1
+        if counter[key] <= 0:
+            del counter[key]
+
+    def statistics(self):
+        """Returns the queue depth and the utilization of the executor
+
+        The utilization is the fraction of the global limit in use, None
+        when there is no global limit.
+        """
+        with self._lock:
+            queued_per_type = collections.Counter(
+                entry[-1].resource_type for entry in self._queue)
+            return {
+                'queued': len(self._queue),
+                'running': self._running,
+                'max_tasks': self._max_tasks,
+                'utilization': (float(self._running) / self._max_tasks
+                                if self._max_tasks else None),
+                'flows': len(self._running_per_flow),
+                'running_per_type': {
+                    resource_type: count for resource_type, count
+                    in self._running_per_type.items()
+                    if resource_type is not None},
+                'queued_per_type': {
+                    resource_type: count for resource_type, count
+                    in queued_per_type.items()
+                    if resource_type is not None},
+            }
+
+
+class FlowTaskExecutor(futures.Executor):
+    """Executor of the tasks of one flow, backed by a SharedTaskExecutor"""
+
+    def __init__(self, shared_executor, priorities=None):
+        super(FlowTaskExecutor, self).__init__()
+        self._shared_executor = shared_executor
+        self._priorities = priorities or {}
+        self._shutdown = False
+
+    def submit(self, fn, *args, **kwargs):
+        if self._shutdown:
+            raise RuntimeError(_('Can not schedule new futures after being '
+                                 'shutdown'))
+        # taskflow submits the task as the first argument
+        task_name = getattr(args[0], 'name', None) if args else None
+        return self._shared_executor.submit_with_priority(
+            id(self), self._priorities.get(task_name, 0), fn, *args,
+            **kwargs)
+
+    def shutdown(self, wait=True):
+        self._shutdown = True
+
+
+_shared_executor = None
+
+
+def get_shared_executor():
+    """Returns the task executor shared by the flows of the process"""
+    global _shared_executor
+    if _shared_executor is None:
+        _shared_executor = SharedTaskExecutor(
+            CONF.max_concurrent_tasks,
+            CONF.max_concurrent_tasks_per_flow,
+            CONF.max_concurrent_tasks_per_resource_type)
+    return _shared_executor
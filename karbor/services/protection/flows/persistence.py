@@ -0,0 +1,198 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+import errno
+import os
+
+from oslo_concurrency import lockutils
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_utils import uuidutils
+from six.moves.urllib import parse
+from taskflow.persistence import backends
+from taskflow.persistence import models
+
+from karbor.common import constants
+from karbor.common import karbor_keystone_plugin
+from karbor import exception
+from karbor.services.protection import client_factory
+from karbor.services.protection.flows import workflow
+
+persistence_opts = [
+    cfg.StrOpt('flow_persistence_connection',
+               secret=True,
+               help='Connection URL of the taskflow persistence backend '
+                    'the protect and delete flows are persisted to, e.g. '
+                    'the karbor database connection, '
+                    '"sqlite:////var/lib/karbor/flows.sqlite" or '
+                    '"file:///var/lib/karbor/flows" for a directory. '
+                    'Flows interrupted by a restart of '
+                    'the protection service are resumed when it starts '
+                    'again, skipping the tasks which already completed. '
+                    'Flows are not persisted when not set'),
+]
+
+LOG = logging.getLogger(__name__)
+
+CONF = cfg.CONF
+CONF.register_opts(persistence_opts)
+
+# NOTE: restore flows keep the heat template they build in memory and get
+# credentials of the restore target, they are not persisted.
+PERSISTED_OPERATIONS = (
+    constants.OPERATION_PROTECT,
+    constants.OPERATION_DELETE,
+)
+
+_backend = None
+
+
+def get_backend():
+    """Returns the persistence backend, None if persistence is disabled"""
+    global _backend
+    if not CONF.flow_persistence_connection:
+        return None
+    if _backend is None:
+        conf = {'connection': CONF.flow_persistence_connection}
+        url = parse.urlparse(CONF.flow_persistence_connection)
+        if url.scheme in ('file', 'dir'):
+            # the directory backend takes its path apart from the URL
+            conf['path'] = url.path
+        backend = backends.fetch(conf)
+        with contextlib.closing(backend.get_connection()) as conn:
+            conn.upgrade()
+        _backend = backend
+    return _backend
+
+
+def _create_trust(context, checkpoint):
+    if context is None or not context.auth_token_info:
+        return None
+    try:
+        keystone_plugin = client_factory.ClientFactory.get_keystone_plugin()
+        return keystone_plugin.create_trust_to_karbor(context)
+    except Exception as err:
+        LOG.warning("Creating a trust for the flow of checkpoint "
+                    "%(checkpoint)s failed, it can not be resumed: %(err)s",
+                    {'checkpoint': checkpoint.id, 'err': err})
+        return None
+
+
+def _delete_trust(book):
+    trust_id = (book.meta or {}).get('trust_id')
+    if not trust_id:
+        return
+    try:
+        keystone_plugin = client_factory.ClientFactory.get_keystone_plugin()
+        keystone_plugin.delete_trust_to_karbor(trust_id)
+    except Exception as err:
+        LOG.warning("Deleting the trust of the logbook %(book)s failed: "
+                    "%(err)s", {'book': book.uuid, 'err': err})
+
+
+def create_logbook(backend, operation_type, context, checkpoint, provider,
+                   **meta):
+    """Saves a logbook with a flow detail for a new flow
+
+    The logbook keeps what is needed to build the flow again in its meta,
+    the objects injected into the flows are not persisted. The token of
+    the context is not persisted either, the user delegates its roles to
+    karbor by a trust which the flow gets new credentials from when it is
+    resumed.
+    """
+    book = models.LogBook('%s_%s' % (operation_type, checkpoint.id))
+    meta.update({
+        'host': CONF.host,
+        'owner': os.getpid(),
+        'operation_type': operation_type,
+        'provider_id': provider.id,
+        'checkpoint_id': checkpoint.id,
+        'user_id': context.user_id if context else None,
+        'project_id': context.project_id if context else None,
+        'trust_id': _create_trust(context, checkpoint),
+    })
+    book.meta = meta
+    flow_detail = models.FlowDetail(book.name, uuidutils.generate_uuid())
+    book.add(flow_detail)
+    with contextlib.closing(backend.get_connection()) as conn:
+        conn.save_logbook(book)
+    return book, flow_detail
+
+
+def get_context(book):
+    """Returns a context with new credentials to resume the flow of a book
+
+    Raises AuthorizationFailure if the logbook has no trust.
+    """
+    trust_id = book.meta.get('trust_id')
+    if not trust_id:
+        raise exception.AuthorizationFailure(
+            obj='logbook %s has no trust' % book.uuid)
+    keystone_plugin = client_factory.ClientFactory.get_keystone_plugin()
+    return karbor_keystone_plugin.get_session_context(
+        keystone_plugin.create_trust_session(trust_id))
+
+
+def destroy_logbook(backend, book):
+    try:
+        with contextlib.closing(backend.get_connection()) as conn:
+            conn.destroy_logbook(book.uuid)
+    except Exception as err:
+        LOG.warning("Destroying the logbook %(book)s failed: %(err)s",
+                    {'book': book.uuid, 'err': err})
+        return
+    _delete_trust(book)
+
+
+def _is_process_alive(pid):
+    if pid is None or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError as err:
+        return err.errno == errno.EPERM
+    return True
+
+
+def claim_unfinished_logbooks(backend):
+    """Returns the logbooks of the flows this host has to resume
+
+    The logbooks of the flows of this host whose owner process is gone are
+    claimed by the current process, so that only one of the protection
+    workers of the host resumes a flow. Logbooks of finished flows are
+    destroyed.
+    """
+    claimed = []
+    finished = []
+    with lockutils.lock('karbor-flow-recovery',
+                        external=CONF.protection_workers > 1):
+        with contextlib.closing(backend.get_connection()) as conn:
+            for book in conn.get_logbooks():
+                meta = book.meta or {}
+                if meta.get('host') != CONF.host:
+                    continue
+                if _is_process_alive(meta.get('owner')):
+                    continue
+                flow_details = list(book)
+                if not flow_details or (
+                        flow_details[0].state in workflow.FINISHED_STATES):
+                    conn.destroy_logbook(book.uuid)
+                    finished.append(book)
+                    continue
+                meta['owner'] = os.getpid()
+                book.meta = meta
+                conn.save_logbook(book)
+                claimed.append((book, flow_details[0]))
+    for book in finished:
+        _delete_trust(book)
+    return claimed
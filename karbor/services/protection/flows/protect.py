@@ -12,6 +12,8 @@
 
 from karbor.common import constants
 from karbor.resource import Resource
+from karbor.services.protection.flows import scheduling
+from karbor.services.protection.flows import timings
 from karbor.services.protection import resource_flow
 from oslo_log import log as logging
 from taskflow import task
@@ -39,22 +41,21 @@ class CompleteProtectTask(task.Task):
 
 
 def get_flow(context, protectable_registry, workflow_engine, plan, provider,
-             checkpoint):
-    resources = set(Resource(**item) for item in plan.get("resources"))
-    resource_graph = protectable_registry.build_graph(context,
-                                                      resources)
-    checkpoint.resource_graph = resource_graph
-    checkpoint.commit()
+             checkpoint, resource_graph=None, persistence=None):
+    if resource_graph is None:
+        resources = set(Resource(**item) for item in plan.get("resources"))
+        resource_graph = protectable_registry.build_graph(context,
+                                                          resources)
+        checkpoint.resource_graph = resource_graph
+        checkpoint.commit()
     flow_name = "Protect_" + plan.get('id')
     protection_flow = workflow_engine.build_flow(flow_name, 'linear')
-    plugins = provider.load_plugins()
-    resources_task_flow = resource_flow.build_resource_flow(
+    flow_cache = resource_flow.get_resource_flow_cache()
+    resources_task_flow = flow_cache.get_flow(
         operation_type=constants.OPERATION_PROTECT,
-        context=context,
         workflow_engine=workflow_engine,
+        provider=provider,
         resource_graph=resource_graph,
-        plugins=plugins,
-        parameters=plan.get('parameters'),
     )
     workflow_engine.add_tasks(
         protection_flow,
@@ -62,7 +63,17 @@ def get_flow(context, protectable_registry, workflow_engine, plan, provider,
         resources_task_flow,
         CompleteProtectTask(),
     )
-    flow_engine = workflow_engine.get_engine(protection_flow, store={
-        'checkpoint': checkpoint
-    })
+    store = resource_flow.build_resource_store(context, resource_graph,
+                                               plan.get('parameters'))
+    store['checkpoint'] = checkpoint
+    history = scheduling.get_history(provider, constants.OPERATION_PROTECT)
+    flow_engine = workflow_engine.get_engine(
+        protection_flow, store=store,
+        priorities=scheduling.get_priorities(resources_task_flow, history),
+        **(persistence or {}))
+    flow_cache.release_when_finished(flow_engine, resources_task_flow)
+    scheduling.record_durations(flow_engine, resources_task_flow, history)
+    timings.record_checkpoint_timings(flow_engine,
+                                      constants.OPERATION_PROTECT,
+                                      resources_task_flow, checkpoint)
     return flow_engine
@@ -18,6 +18,7 @@ from oslo_utils import uuidutils
 
 from karbor.common import constants
 from karbor.services.protection import client_factory
+from karbor.services.protection.flows import scheduling
 from karbor.services.protection import resource_flow
 from karbor.services.protection import restore_heat
 from taskflow import task
@@ -146,7 +147,7 @@ class SyncRestoreStatusTask(task.Task):
 
 
 def get_flow(context, workflow_engine, checkpoint, provider, restore,
-             restore_auth):
+             restore_auth, resource_graph=None):
     target = restore.get('restore_target', None)
 
     heat_conf = {}
@@ -158,18 +159,17 @@ def get_flow(context, workflow_engine, checkpoint, provider, restore,
                 heat_conf["username"] = restore_auth["username"]
                 heat_conf["password"] = restore_auth["password"]
 
-    resource_graph = checkpoint.resource_graph
+    if resource_graph is None:
+        resource_graph = checkpoint.resource_graph
     parameters = restore.parameters
     flow_name = "Restore_" + checkpoint.id
     restore_flow = workflow_engine.build_flow(flow_name, 'linear')
-    plugins = provider.load_plugins()
-    resources_task_flow = resource_flow.build_resource_flow(
+    flow_cache = resource_flow.get_resource_flow_cache()
+    resources_task_flow = flow_cache.get_flow(
         operation_type=constants.OPERATION_RESTORE,
-        context=context,
         workflow_engine=workflow_engine,
+        provider=provider,
         resource_graph=resource_graph,
-        plugins=plugins,
-        parameters=parameters
     )
 
     workflow_engine.add_tasks(
@@ -181,7 +181,13 @@ def get_flow(context, workflow_engine, checkpoint, provider, restore,
         SyncRestoreStatusTask(),
         CompleteRestoreTask()
     )
-    flow_engine = workflow_engine.get_engine(restore_flow,
-                                             store={'checkpoint': checkpoint,
-                                                    'restore': restore})
+    store = resource_flow.build_resource_store(context, resource_graph,
+                                               parameters)
+    store.update({'checkpoint': checkpoint, 'restore': restore})
+    history = scheduling.get_history(provider, constants.OPERATION_RESTORE)
+    flow_engine = workflow_engine.get_engine(
+        restore_flow, store=store,
+        priorities=scheduling.get_priorities(resources_task_flow, history))
+    flow_cache.release_when_finished(flow_engine, resources_task_flow)
+    scheduling.record_durations(flow_engine, resources_task_flow, history)
     return flow_engine
@@ -0,0 +1,253 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_utils import timeutils
+from taskflow import states
+
+from karbor.services.protection.flows import workflow
+
+scheduling_opts = [
+    cfg.BoolOpt('critical_path_scheduling',
+                default=True,
+                help='Start the queued tasks of the resource flows by '
+                     'estimated remaining path length, estimated from the '
+                     'durations of the previous runs, so that the long '
+                     'tasks of an operation start as early as possible. '
+                     'Only matters when the task executor limits the '
+                     'number of concurrent tasks'),
+    cfg.IntOpt('task_duration_history_size',
+               default=10000,
+               min=1,
+               help='The number of task durations kept per operation type '
+                    'for critical path scheduling. The durations not '
+                    'updated for the longest time are dropped first'),
+    cfg.IntOpt('task_duration_save_interval',
+               default=60,
+               min=0,
+               help='Seconds between the saves of the task durations to '
+                    'the bank. The durations of the runs finished '
+                    'meanwhile are merged into the durations saved by the '
+                    'other protection services. 0 saves after every run'),
+]
+
+LOG = logging.getLogger(__name__)
+
+CONF = cfg.CONF
+CONF.register_opts(scheduling_opts)
+
+# estimate, in seconds, of tasks which never ran before
+DEFAULT_TASK_DURATION = 1.0
+# weight of the last duration in the estimate of a task
+_SMOOTHING = 0.3
+
+
+def _task_keys(task):
+    """Returns the history keys of a task, most specific first
+
+    The hook tasks of the resource flows are named
+    "<operation>_<hook>_<resource type>_<resource id>", their durations are
+    also kept per hook and resource type, which estimates the tasks of new
+    resources.
+    """
+    keys = [task.name]
+    resource = (getattr(task, 'inject', None) or {}).get('resource')
+    suffix = '_{}'.format(getattr(resource, 'id', None))
+    if resource is not None and task.name.endswith(suffix):
+        keys.append(task.name[:-len(suffix)])
+    return keys
+
+
+def _add_duration(durations, keys, duration):
+    for key in keys:
+        # the last updated durations are kept last
+        previous = durations.pop(key, None)
+        durations[key] = duration if previous is None else (
+            previous + _SMOOTHING * (duration - previous))
+
+
+class TaskDurationHistory(object):
+    """Smoothed durations of the hook tasks of one operation type
+
+    The durations are saved to the bank of the provider, so that they
+    survive restarts and are shared by the protection services using the
+    bank. They are saved every task_duration_save_interval seconds rather
+    than after every run: the durations of the runs finished meanwhile are
+    added to the durations read back from the bank, so that the runs of
+    the other services are not overwritten. The history keeps the
+    task_duration_history_size durations updated last, the per hook and
+    resource type durations of the tasks of new resources are updated by
+    every run of the operation.
+    """
+
+    def __init__(self, bank=None, key=None):
+        super(TaskDurationHistory, self).__init__()
+        self._bank = bank
+        self._key = key
+        self._durations = None
+        # (keys, seconds) of the runs not saved yet
+        self._unsaved = []
+        self._saved_at = timeutils.now()
+
+    def _read(self):
+        durations = {}
+        if self._bank is not None:
+            try:
+                durations = self._bank.get_object(self._key)
+            except Exception as err:
+                LOG.debug("No task durations in the bank at %(key)s: "
+                          "%(err)s", {'key': self._key, 'err': err})
+        return collections.OrderedDict(
+            durations if isinstance(durations, dict) else {})
+
+    def _load(self):
+        if self._durations is None:
+            self._durations = self._read()
+        return self._durations
+
+    @staticmethod
+    def _cap(durations):
+        while len(durations) > CONF.task_duration_history_size:
+            durations.popitem(last=False)
+
+    def estimate(self, task):
+        durations = self._load()
+        for key in _task_keys(task):
+            if key in durations:
+                return durations[key]
+        return DEFAULT_TASK_DURATION
+
+    def update(self, task_durations):
+        """Adds the durations of a run, given as (task, seconds) pairs"""
+        if not task_durations:
+            return
+        durations = self._load()
+        for task, duration in task_durations:
+            keys = _task_keys(task)
+            _add_duration(durations, keys, duration)
+            if self._bank is not None:
+                self._unsaved.append((keys, duration))
+        self._cap(durations)
+        if (timeutils.now() - self._saved_at >=
+                CONF.task_duration_save_interval):
+            self.save()
+
+    def save(self):
+        """Saves the durations added since the last save to the bank"""
+        self._saved_at = timeutils.now()
+        if not self._unsaved:
+            return
+        durations = self._read()
+        for keys, duration in self._unsaved:
+            _add_duration(durations, keys, duration)
+        self._cap(durations)
+        try:
+            self._bank.update_object(self._key, durations)
+        except Exception as err:
+            LOG.warning("Saving the task durations to %(key)s failed: "
+                        "%(err)s", {'key': self._key, 'err': err})
+            return
+        self._durations = durations
+        self._unsaved = []
+
+
+_histories = {}
+
+
+def get_history(provider, operation_type):
+    """Returns the task duration history of an operation of a provider
+
+    Returns None when critical path scheduling is disabled.
+    """
+    if not CONF.critical_path_scheduling:
+        return None
+    key = (provider.id, operation_type)
+    if key not in _histories:
+        bank = getattr(provider, 'bank', None)
+        _histories[key] = TaskDurationHistory(
+            bank, '/task_durations/{}'.format(operation_type))
+    return _histories[key]
+
+
+def save_histories():
+    """Saves the task durations added since the last save to the banks"""
+    for history in list(_histories.values()):
+        history.save()
+
+
+def get_priorities(flow, history):
+    """Returns the estimated remaining path length of the tasks of a flow
+
+    The remaining path length of a task is its estimated duration plus the
+    longest remaining path length of the tasks depending on it, i.e. the
+    least time the flow needs to finish once the task starts. Starting the
+    tasks with the longest remaining path first shortens the flow.
+    """
+    if history is None:
+        return None
+    successors = collections.defaultdict(list)
+    predecessors = collections.Counter()
+    for u, v, _ in flow.iter_links():
+        successors[u].append(v)
+        predecessors[v] += 1
+
+    # the tasks in topological order, walked backwards so that the
+    # successors of a task are done before it, without recursing on deep
+    # graphs
+    order = [task for task, _ in flow.iter_nodes()
+             if not predecessors[task]]
+    for task in order:
+        for successor in successors[task]:
+            predecessors[successor] -= 1
+            if not predecessors[successor]:
+                order.append(successor)
+    remaining = {}
+    for task in reversed(order):
+        remaining[task] = history.estimate(task) + max(
+            [remaining[successor] for successor in successors[task]] or [0])
+    return {task.name: length for task, length in remaining.items()}
+
+
+def record_durations(flow_engine, flow, history):
+    """Adds the durations of the tasks of a flow run by an engine
+
+    The history is updated once the engine finished, with the tasks of the
+    flow which succeeded.
+    """
+    if history is None:
+        return
+    tasks = {task.name: task for task, _ in flow.iter_nodes()}
+    started = {}
+    durations = []
+
+    def _on_task_state(state, details):
+        task_name = details.get('task_name')
+        if task_name not in tasks:
+            return
+        if state == states.RUNNING:
+            started[task_name] = timeutils.now()
+        elif state == states.SUCCESS and task_name in started:
+            durations.append(
+                (task_name, timeutils.now() - started.pop(task_name)))
+
+    def _on_flow_state(state, details):
+        if state not in workflow.FINISHED_STATES or not durations:
+            return
+        history.update([(tasks[task_name], duration)
+                        for task_name, duration in durations])
+        del durations[:]
+
+    flow_engine.atom_notifier.register('*', _on_task_state)
+    flow_engine.notifier.register('*', _on_flow_state)
@@ -0,0 +1,140 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+
+from oslo_log import log as logging
+from oslo_utils import timeutils
+from taskflow import states
+
+from karbor.services.protection.flows import workflow
+from karbor.services.protection import resource_flow
+
+LOG = logging.getLogger(__name__)
+
+
+class FlowTimingRecorder(object):
+    """Records when the hook tasks of a resource flow run
+
+    For every hook task the breakdown has:
+
+    * started_at, finished_at and duration of the task
+    * wait_for_dependencies, the time from the start of the resource flow
+      until the tasks the task depends on finished
+    * queued, the time from then until the task started, waiting for the
+      task executor
+    * result, the state the task ended in
+    """
+
+    def __init__(self, operation_type, flow):
+        super(FlowTimingRecorder, self).__init__()
+        self.operation_type = operation_type
+        self._tasks = {}
+        for task, _ in flow.iter_nodes():
+            resource = (getattr(task, 'inject', None) or {}).get('resource')
+            if resource is None:
+                continue
+            for hook_type in resource_flow.HOOKS:
+                if task.name == resource_flow.hook_task_name(
+                        operation_type, hook_type, resource):
+                    self._tasks[task.name] = (resource, hook_type)
+        self._predecessors = collections.defaultdict(list)
+        for u, v, _ in flow.iter_links():
+            self._predecessors[v.name].append(u.name)
+        self._started = {}
+        self._finished = {}
+        self._results = {}
+
+    def on_task_state(self, state, details):
+        task_name = details.get('task_name')
+        if task_name not in self._tasks:
+            return
+        if state == states.RUNNING:
+            self._started[task_name] = timeutils.utcnow()
+        elif state in (states.SUCCESS, states.FAILURE):
+            self._finished[task_name] = timeutils.utcnow()
+            self._results[task_name] = state
+
+    def breakdown(self):
+        """Returns the timing breakdown of the tasks which ran"""
+        if not self._started:
+            return None
+        flow_started_at = min(self._started.values())
+        flow_finished_at = max(
+            list(self._finished.values()) or [flow_started_at])
+        tasks = []
+        per_resource_type = collections.defaultdict(
+            lambda: collections.defaultdict(float))
+        for task_name, started_at in sorted(self._started.items(),
+                                            key=lambda item: item[1]):
+            resource, hook_type = self._tasks[task_name]
+            finished_at = self._finished.get(task_name)
+            ready_at = max(
+                [self._finished[name]
+                 for name in self._predecessors[task_name]
+                 if name in self._finished] or [flow_started_at])
+            duration = (timeutils.delta_seconds(started_at, finished_at)
+                        if finished_at else None)
+            tasks.append({
+                'resource_type': resource.type,
+                'resource_id': resource.id,
+                'resource_name': resource.name,
+                'hook': hook_type,
+                'started_at': started_at.isoformat(),
+                'finished_at': finished_at.isoformat() if finished_at
+                else None,
+                'duration': duration,
+                'wait_for_dependencies': timeutils.delta_seconds(
+                    flow_started_at, ready_at),
+                'queued': max(timeutils.delta_seconds(ready_at,
+                                                      started_at), 0.0),
+                'result': self._results.get(task_name),
+            })
+            if duration is not None:
+                per_resource_type[resource.type][hook_type] += duration
+        return {
+            'operation_type': self.operation_type,
+            'started_at': flow_started_at.isoformat(),
+            'finished_at': flow_finished_at.isoformat(),
+            'duration': timeutils.delta_seconds(flow_started_at,
+                                                flow_finished_at),
+            'resource_types': {
+                resource_type: dict(hooks)
+                for resource_type, hooks in per_resource_type.items()
+            },
+            'tasks': tasks,
+        }
+
+
+def record_checkpoint_timings(flow_engine, operation_type, flow, checkpoint):
+    """Saves the timing breakdown of a resource flow to the checkpoint
+
+    The breakdown is saved once the engine running the flow finished,
+    whether it succeeded or not.
+    """
+    recorder = FlowTimingRecorder(operation_type, flow)
+
+    def _on_flow_state(state, details):
+        if state not in workflow.FINISHED_STATES:
+            return
+        timings = recorder.breakdown()
+        if timings is None:
+            return
+        try:
+            checkpoint.update_timings(timings)
+        except Exception as err:
+            LOG.warning("Saving the task timings of checkpoint %(id)s "
+                        "failed: %(err)s",
+                        {'id': checkpoint.id, 'err': err})
+
+    flow_engine.atom_notifier.register('*', recorder.on_task_state)
+    flow_engine.notifier.register('*', _on_flow_state)
@@ -10,6 +10,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import weakref
 
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -18,6 +19,7 @@ from oslo_utils import importutils
 from karbor.common import constants
 from karbor import exception
 from karbor.services.protection.flows import delete as flow_delete
+from karbor.services.protection.flows import persistence as flow_persistence
 from karbor.services.protection.flows import protect as flow_protect
 from karbor.services.protection.flows import restore as flow_restore
 
@@ -42,6 +44,7 @@ class Worker(object):
         except Exception:
             LOG.error("load work flow engine failed")
             raise
+        self._flow_books = weakref.WeakKeyDictionary()
 
     def _load_engine(self, engine_path):
         if not engine_path:
@@ -49,8 +52,71 @@ class Worker(object):
         engine = importutils.import_object(engine_path)
         return engine
 
+    def persist_flow(self, context, operation_type, checkpoint, provider,
+                     **meta):
+        """Saves the logbook of a flow which is built later
+
+        Returns the (book, flow_detail) pair to build the flow with, None
+        when the flow is not persisted.
+        """
+        if operation_type not in flow_persistence.PERSISTED_OPERATIONS:
+            return None
+        backend = flow_persistence.get_backend()
+        if backend is None:
+            return None
+        return flow_persistence.create_logbook(
+            backend, operation_type, context, checkpoint, provider, **meta)
+
+    def discard_flow(self, logbook):
+        """Destroys the logbook of a flow which is not run"""
+        if logbook is not None:
+            flow_persistence.destroy_logbook(flow_persistence.get_backend(),
+                                             logbook[0])
+
+    def _get_persistence(self, context, operation_type, checkpoint,
+                         provider, logbook=None, **meta):
+        if logbook is None:
+            logbook = self.persist_flow(context, operation_type, checkpoint,
+                                        provider, **meta)
+            if logbook is None:
+                return None, None
+        book, flow_detail = logbook
+        return book, {
+            'backend': flow_persistence.get_backend(),
+            'book': book,
+            'flow_detail': flow_detail,
+        }
+
     def get_flow(self, context, operation_type, checkpoint, provider,
                  **kwargs):
+        """Builds the engine of an operation flow
+
+        When flow persistence is enabled, protect and delete flows are
+        persisted to a new logbook, or to the logbook given as a
+        (book, flow_detail) pair, saved by persist_flow or of a flow
+        interrupted by a restart.
+        """
+        logbook = kwargs.get('logbook', None)
+        meta = {}
+        if operation_type == constants.OPERATION_PROTECT:
+            meta['plan'] = kwargs.get('plan', None)
+        book, persistence = self._get_persistence(
+            context, operation_type, checkpoint, provider, logbook, **meta)
+        try:
+            flow = self._get_flow(context, operation_type, checkpoint,
+                                  provider, persistence,
+                                  resume=logbook is not None, **kwargs)
+        except Exception:
+            if book is not None and logbook is None:
+                flow_persistence.destroy_logbook(persistence['backend'],
+                                                 book)
+            raise
+        if book is not None:
+            self._flow_books[flow] = (persistence['backend'], book)
+        return flow
+
+    def _get_flow(self, context, operation_type, checkpoint, provider,
+                  persistence, resume=False, **kwargs):
         if operation_type == constants.OPERATION_PROTECT:
             plan = kwargs.get('plan', None)
             protectable_registry = kwargs.get('protectable_registry', None)
@@ -61,6 +127,9 @@ class Worker(object):
                 plan,
                 provider,
                 checkpoint,
+                resource_graph=(checkpoint.resource_graph if resume
+                                else None),
+                persistence=persistence,
             )
         elif operation_type == constants.OPERATION_RESTORE:
             restore = kwargs.get('restore')
@@ -72,6 +141,7 @@ class Worker(object):
                 provider,
                 restore,
                 restore_auth,
+                resource_graph=kwargs.get('resource_graph'),
             )
         elif operation_type == constants.OPERATION_DELETE:
             flow = flow_delete.get_flow(
@@ -79,6 +149,7 @@ class Worker(object):
                 self.workflow_engine,
                 checkpoint,
                 provider,
+                persistence=persistence,
             )
         else:
             raise exception.InvalidParameterValue(
@@ -88,7 +159,13 @@ class Worker(object):
         return flow
 
     def run_flow(self, flow_engine):
-        self.workflow_engine.run_engine(flow_engine)
+        try:
+            self.workflow_engine.run_engine(flow_engine)
+        finally:
+            # a flow is only resumed when the service stopped running it
+            persisted = self._flow_books.pop(flow_engine, None)
+            if persisted is not None:
+                flow_persistence.destroy_logbook(*persisted)
 
     def flow_outputs(self, flow_engine, target=None):
         return self.workflow_engine.output(flow_engine, target=target)
@@ -11,21 +11,25 @@
 #    under the License.
 
 import abc
-import futurist
 import six
 
 from karbor import exception
 from karbor.i18n import _
+from karbor.services.protection.flows import executor as flow_executor
 from oslo_log import log as logging
 
 from taskflow import engines
 from taskflow.patterns import graph_flow
 from taskflow.patterns import linear_flow
+from taskflow import states
 from taskflow import task
 
 
 LOG = logging.getLogger(__name__)
 
+# states a flow does not leave once it reached one
+FINISHED_STATES = (states.SUCCESS, states.REVERTED, states.FAILURE)
+
 
 @six.add_metaclass(abc.ABCMeta)
 class WorkFlowEngine(object):
@@ -103,14 +107,29 @@ class TaskFlowEngine(WorkFlowEngine):
         executor = kwargs.get('executor', None)
         engine = kwargs.get('engine', None)
         store = kwargs.get('store', None)
+        backend = kwargs.get('backend', None)
         if not executor:
-            executor = futurist.GreenThreadPoolExecutor()
+            executor = flow_executor.get_shared_executor().flow_executor(
+                kwargs.get('priorities', None))
         if not engine:
             engine = 'parallel'
+        if backend is None:
+            return engines.load(flow,
+                                executor=executor,
+                                engine=engine,
+                                store=store)
+
         flow_engine = engines.load(flow,
                                    executor=executor,
                                    engine=engine,
-                                   store=store)
+                                   backend=backend,
+                                   book=kwargs.get('book', None),
+                                   flow_detail=kwargs.get('flow_detail',
+                                                          None))
+        if store:
+            # the store holds live objects, the flows are rebuilt with
+            # them on resume instead of persisting them
+            flow_engine.storage.inject(store, transient=True)
         return flow_engine
 
     def karbor_flow_watch(self, state, details):
@@ -235,3 +235,42 @@ def deserialize_resource_graph(serialized_resource_graph):
                                                     extra_info=node[3])
     resource_graph = unpack_graph(packed_resource_graph)
     return resource_graph
+
+
+def select_subgraph(start_nodes, resource_keys):
+    """Return the start nodes of the part of a graph some resources need
+
+    resource_keys are "<resource type>#<resource id>" keys of resources in
+    the graph. The subgraph has the selected resources and all their child
+    nodes, which are the resources they depend on. Selected resources which
+    are child nodes of other selected resources are not start nodes.
+    """
+    wanted = set(resource_keys)
+    selected = []
+    visited = set()
+    stack = list(reversed(start_nodes))
+    while stack:
+        node = stack.pop()
+        if node.value in visited:
+            continue
+        visited.add(node.value)
+        if '#'.join((node.value.type, node.value.id)) in wanted:
+            selected.append(node)
+        stack.extend(reversed(node.child_nodes))
+
+    missing = wanted.difference('#'.join((node.value.type, node.value.id))
+                                for node in selected)
+    if missing:
+        raise exception.InvalidInput(
+            reason=_("Resources %s are not in the resource graph") %
+            ', '.join(sorted(missing)))
+
+    descendants = set()
+    stack = [child for node in selected for child in node.child_nodes]
+    while stack:
+        node = stack.pop()
+        if node.value in descendants:
+            continue
+        descendants.add(node.value)
+        stack.extend(node.child_nodes)
+    return [node for node in selected if node.value not in descendants]
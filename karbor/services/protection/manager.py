@@ -15,14 +15,15 @@ Protection Service
 """
 
 from datetime import datetime
-from eventlet import greenpool
-from eventlet import greenthread
+import os
 import six
 
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging as messaging
+from oslo_service import periodic_task
 
+from oslo_utils import excutils
 from oslo_utils import uuidutils
 
 from karbor.common import constants
@@ -30,7 +31,12 @@ from karbor import exception
 from karbor.i18n import _
 from karbor import manager
 from karbor.resource import Resource
+from karbor.services.protection.flows import executor as flow_executor
+from karbor.services.protection.flows import persistence as flow_persistence
+from karbor.services.protection.flows import scheduling as flow_scheduling
 from karbor.services.protection.flows import worker as flow_manager
+from karbor.services.protection import graph
+from karbor.services.protection import operation_queue
 from karbor.services.protection.protectable_registry import ProtectableRegistry
 from karbor import utils
 
@@ -44,7 +50,18 @@ protection_manager_opts = [
                default=0,
                help='number of maximum concurrent operation (protect, restore,'
                     ' delete) flows. 0 means no hard limit'
-               )
+               ),
+    cfg.IntOpt('max_queued_operations',
+               default=0, min=0,
+               help='number of maximum operations waiting for one of the '
+                    'max_concurrent_operations slots. Further operations '
+                    'are rejected right away. 0 means no hard limit'),
+    cfg.DictOpt('operation_project_weights',
+                default={},
+                help='weights of the projects sharing the operation slots '
+                     'while operations are queued, e.g. '
+                     '"<project_id>:2,<project_id>:0.5". Projects not '
+                     'listed have a weight of 1'),
 ]
 
 CONF = cfg.CONF
@@ -56,38 +73,137 @@ PROVIDER_NAMESPACE = 'karbor.provider'
 class ProtectionManager(manager.Manager):
     """karbor Protection Manager."""
 
-    RPC_API_VERSION = '1.0'
+    RPC_API_VERSION = '1.1'
 
     target = messaging.Target(version=RPC_API_VERSION)
 
     def __init__(self, service_name=None,
                  *args, **kwargs):
         super(ProtectionManager, self).__init__(*args, **kwargs)
+        self._load_registries()
+
+    def _load_registries(self):
         provider_reg = CONF.provider_registry
         self.provider_registry = utils.load_plugin(PROVIDER_NAMESPACE,
                                                    provider_reg)
         self.protectable_registry = ProtectableRegistry()
         self.protectable_registry.load_plugins()
         self.worker = flow_manager.Worker()
-        self._greenpool = None
-        self._greenpool_size = CONF.max_concurrent_operations
-        if self._greenpool_size != 0:
-            self._greenpool = greenpool.GreenPool(self._greenpool_size)
-
-    def _spawn(self, func, *args, **kwargs):
-        if self._greenpool is not None:
-            return self._greenpool.spawn_n(func, *args, **kwargs)
-        else:
-            return greenthread.spawn_n(func, *args, **kwargs)
+        self._operation_queue = operation_queue.OperationQueue(
+            CONF.max_concurrent_operations,
+            CONF.max_queued_operations,
+            CONF.operation_project_weights)
+        self._pid = os.getpid()
+
+    def _spawn(self, operation_type, project_id, func, *args, **kwargs):
+        self._operation_queue.submit(operation_type, project_id,
+                                     func, *args, **kwargs)
+
+    def _spawn_reserved(self, operation_type, project_id, func, *args,
+                        **kwargs):
+        # NOTE: the slot was reserved before the operation had any side
+        # effect, the bank I/O done meanwhile yields to other requests
+        # which could otherwise fill the queue.
+        self._operation_queue.submit_reserved(operation_type, project_id,
+                                              func, *args, **kwargs)
 
     def init_host(self, **kwargs):
         """Handle initialization if this is a standalone service"""
         # TODO(wangliuan)
         LOG.info("Starting protection service")
+        if self._pid != os.getpid():
+            # NOTE: the manager was created before the worker processes
+            # were forked. Every worker loads its own providers, so that
+            # it owns its bank connections and bank leases.
+            LOG.info("Loading providers of protection worker %s",
+                     os.getpid())
+            self._load_registries()
+        self._resume_flows()
+
+    def _resume_flows(self):
+        """Resumes the persisted flows interrupted by a restart"""
+        backend = flow_persistence.get_backend()
+        if backend is None:
+            return
+        for book, flow_detail in flow_persistence.claim_unfinished_logbooks(
+                backend):
+            meta = book.meta
+            operation_type = meta['operation_type']
+            checkpoint_id = meta['checkpoint_id']
+            LOG.info("Resuming %(type)s flow of checkpoint %(checkpoint)s",
+                     {'type': operation_type, 'checkpoint': checkpoint_id})
+            checkpoint = None
+            try:
+                context = flow_persistence.get_context(book)
+                provider = self.provider_registry.show_provider(
+                    meta['provider_id'])
+                checkpoint_collection = provider.get_checkpoint_collection()
+                checkpoint = checkpoint_collection.get(checkpoint_id)
+                flow = self.worker.get_flow(
+                    context=context,
+                    protectable_registry=self.protectable_registry,
+                    operation_type=operation_type,
+                    plan=meta.get('plan'),
+                    provider=provider,
+                    checkpoint=checkpoint,
+                    logbook=(book, flow_detail))
+            except Exception:
+                LOG.exception("Failed to resume %(type)s flow of "
+                              "checkpoint %(checkpoint)s",
+                              {'type': operation_type,
+                               'checkpoint': checkpoint_id})
+                flow_persistence.destroy_logbook(backend, book)
+                if checkpoint is not None:
+                    self._fail_resumed_checkpoint(operation_type, checkpoint)
+                continue
+            self._operation_queue.resubmit(operation_type,
+                                           context.project_id,
+                                           self.worker.run_flow, flow)
+
+    def _fail_resumed_checkpoint(self, operation_type, checkpoint):
+        # the flow is not resumed again, its checkpoint must not be left
+        # protecting or deleting
+        if operation_type == constants.OPERATION_PROTECT:
+            checkpoint.status = constants.CHECKPOINT_STATUS_ERROR
+        else:
+            checkpoint.status = constants.CHECKPOINT_STATUS_ERROR_DELETING
+        try:
+            checkpoint.commit()
+        except Exception:
+            LOG.exception("Failed to set the status of checkpoint %s",
+                          checkpoint.id)
+
+    def show_task_executor_statistics(self, context):
+        """Returns the queue depth and utilization of the task executor"""
+        return flow_executor.get_shared_executor().statistics()
+
+    def show_operation_queue_statistics(self, context):
+        """Returns the queue lengths and queue times of the operations"""
+        return self._operation_queue.statistics()
+
+    @periodic_task.periodic_task
+    def _save_task_durations(self, context):
+        flow_scheduling.save_histories()
+
+    @periodic_task.periodic_task
+    def _report_task_executor_statistics(self, context):
+        statistics = flow_executor.get_shared_executor().statistics()
+        if statistics['running'] or statistics['queued']:
+            LOG.info("Flow tasks running: %(running)s, queued: "
+                     "%(queued)s, utilization: %(utilization)s, "
+                     "running per resource type: %(running_per_type)s, "
+                     "queued per resource type: %(queued_per_type)s",
+                     statistics)
+        statistics = self._operation_queue.statistics()
+        if statistics['running'] or statistics['queued']:
+            LOG.info("Operations running: %(running)s, queued: "
+                     "%(queued)s, per operation type: %(operations)s",
+                     statistics)
 
     @messaging.expected_exceptions(exception.InvalidPlan,
                                    exception.ProviderNotFound,
-                                   exception.FlowError)
+                                   exception.FlowError,
+                                   exception.OperationQueueFull)
     def protect(self, context, plan, checkpoint_properties=None):
         """create protection for the given plan
 
@@ -104,15 +220,42 @@ class ProtectionManager(manager.Manager):
         provider_id = plan.get('provider_id', None)
         plan_id = plan.get('id', None)
         provider = self.provider_registry.show_provider(provider_id)
-        checkpoint_collection = provider.get_checkpoint_collection()
+        self._operation_queue.reserve(constants.OPERATION_PROTECT)
         try:
+            checkpoint_collection = provider.get_checkpoint_collection()
             checkpoint = checkpoint_collection.create(plan,
                                                       checkpoint_properties)
         except Exception as e:
+            self._operation_queue.release()
             LOG.exception("Failed to create checkpoint, plan: %s", plan_id)
             exc = exception.FlowError(flow="protect",
                                       error="Error creating checkpoint")
             six.raise_from(exc, e)
+        # NOTE: the pending protect is persisted before the checkpoint id is
+        # returned, so that a restart of the service resumes it.
+        try:
+            logbook = self.worker.persist_flow(
+                context, constants.OPERATION_PROTECT, checkpoint, provider,
+                plan=plan)
+        except Exception as e:
+            self._operation_queue.release()
+            LOG.exception("Failed to persist protection flow, plan: %s, "
+                          "checkpoint: %s", plan_id, checkpoint.id)
+            checkpoint.status = constants.CHECKPOINT_STATUS_ERROR
+            checkpoint.commit()
+            exc = exception.FlowError(flow="protect",
+                                      error="Error persisting flow")
+            six.raise_from(exc, e)
+        # NOTE: building the resource graph of a plan takes many calls to
+        # the cloud APIs, it is done by the queued operation so that the
+        # checkpoint id is returned right away.
+        self._spawn_reserved(constants.OPERATION_PROTECT,
+                             plan.get('project_id'), self._run_protect,
+                             context, plan, provider, checkpoint, logbook)
+        return checkpoint.id
+
+    def _run_protect(self, context, plan, provider, checkpoint,
+                     logbook=None):
         try:
             flow = self.worker.get_flow(
                 context=context,
@@ -120,22 +263,31 @@ class ProtectionManager(manager.Manager):
                 operation_type=constants.OPERATION_PROTECT,
                 plan=plan,
                 provider=provider,
-                checkpoint=checkpoint)
-        except Exception as e:
-            LOG.exception("Failed to create protection flow, plan: %s",
-                          plan_id)
-            raise exception.FlowError(
-                flow="protect",
-                error=e.msg if hasattr(e, 'msg') else 'Internal error')
-        self._spawn(self.worker.run_flow, flow)
-        return checkpoint.id
+                checkpoint=checkpoint,
+                logbook=logbook)
+        except Exception:
+            LOG.exception("Failed to create protection flow, plan: %s, "
+                          "checkpoint: %s", plan.get('id'), checkpoint.id)
+            self.worker.discard_flow(logbook)
+            checkpoint.status = constants.CHECKPOINT_STATUS_ERROR
+            checkpoint.commit()
+            return
+        self.worker.run_flow(flow)
 
     @messaging.expected_exceptions(exception.ProviderNotFound,
                                    exception.CheckpointNotFound,
                                    exception.CheckpointNotAvailable,
                                    exception.FlowError,
-                                   exception.InvalidInput)
-    def restore(self, context, restore, restore_auth):
+                                   exception.InvalidInput,
+                                   exception.OperationQueueFull)
+    def restore(self, context, restore, restore_auth, resources=None):
+        """Restores the resources of a checkpoint
+
+        :param resources: "<resource type>#<resource id>" keys of the
+                          resources to restore, with the resources they
+                          depend on. All the resources are restored when
+                          not given.
+        """
         LOG.info("Starting restore service:restore action")
 
         checkpoint_id = restore["checkpoint_id"]
@@ -152,6 +304,11 @@ class ProtectionManager(manager.Manager):
         if checkpoint.status != constants.CHECKPOINT_STATUS_AVAILABLE:
             raise exception.CheckpointNotAvailable(
                 checkpoint_id=checkpoint_id)
+        resource_graph = None
+        if resources:
+            resource_graph = graph.select_subgraph(checkpoint.resource_graph,
+                                                   resources)
+        self._operation_queue.reserve(constants.OPERATION_RESTORE)
 
         try:
             flow = self.worker.get_flow(
@@ -160,14 +317,18 @@ class ProtectionManager(manager.Manager):
                 checkpoint=checkpoint,
                 provider=provider,
                 restore=restore,
-                restore_auth=restore_auth)
+                restore_auth=restore_auth,
+                resource_graph=resource_graph)
         except Exception:
+            self._operation_queue.release()
             LOG.exception("Failed to create restore flow checkpoint: %s",
                           checkpoint_id)
             raise exception.FlowError(
                 flow="restore",
                 error=_("Failed to create flow"))
-        self._spawn(self.worker.run_flow, flow)
+        self._spawn_reserved(constants.OPERATION_RESTORE,
+                             restore.get('project_id'),
+                             self.worker.run_flow, flow)
 
     def validate_restore_parameters(self, restore, provider):
         parameters = restore["parameters"]
@@ -217,8 +378,13 @@ class ProtectionManager(manager.Manager):
         ]:
             raise exception.CheckpointNotBeDeleted(
                 checkpoint_id=checkpoint_id)
-        checkpoint.status = constants.CHECKPOINT_STATUS_DELETING
-        checkpoint.commit()
+        self._operation_queue.reserve(constants.OPERATION_DELETE)
+        try:
+            checkpoint.status = constants.CHECKPOINT_STATUS_DELETING
+            checkpoint.commit()
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._operation_queue.release()
 
         try:
             flow = self.worker.get_flow(
@@ -227,12 +393,15 @@ class ProtectionManager(manager.Manager):
                 checkpoint=checkpoint,
                 provider=provider)
         except Exception:
+            self._operation_queue.release()
             LOG.exception("Failed to create delete checkpoint flow,"
                           "checkpoint:%s.", checkpoint_id)
             raise exception.KarborException(_(
                 "Failed to create delete checkpoint flow."
             ))
-        self._spawn(self.worker.run_flow, flow)
+        self._spawn_reserved(constants.OPERATION_DELETE,
+                             checkpoint.project_id, self.worker.run_flow,
+                             flow)
 
     def start(self, plan):
         # TODO(wangliuan)
@@ -273,7 +442,9 @@ class ProtectionManager(manager.Manager):
         provider = self.provider_registry.show_provider(provider_id)
 
         checkpoint = provider.get_checkpoint(checkpoint_id)
-        return checkpoint.to_dict()
+        checkpoint_dict = checkpoint.to_dict()
+        checkpoint_dict['timings'] = checkpoint.get_timings()
+        return checkpoint_dict
 
     def list_protectable_types(self, context):
         LOG.info("Start to list protectable types.")
@@ -0,0 +1,208 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import heapq
+import itertools
+
+from eventlet import greenthread
+from oslo_log import log as logging
+from oslo_utils import timeutils
+
+from karbor.common import constants
+from karbor import exception
+
+LOG = logging.getLogger(__name__)
+
+# lower values are started first
+OPERATION_PRIORITIES = {
+    constants.OPERATION_RESTORE: 0,
+    constants.OPERATION_PROTECT: 1,
+    constants.OPERATION_DELETE: 2,
+}
+
+_QueuedOperation = collections.namedtuple('_QueuedOperation', [
+    'operation_type', 'project_id', 'start_tag', 'enqueued_at', 'func',
+    'args', 'kwargs',
+])
+
+
+class OperationQueue(object):
+    """Admission queue of the operations of the protection service
+
+    Operations are started in priority order, restore before protect before
+    delete, so that restores never wait behind the queued protections.
+
+    Within a priority, the projects share the operation slots by weighted
+    fair queueing: every operation gets a virtual finish tag of its start
+    tag plus 1 / weight of its project, the start tag being the later of
+    the current virtual time and the finish tag of the previous operation
+    of the project. Operations are started in finish tag order, so a
+    project queueing many operations only gets its share of the slots
+    while other projects have operations queued.
+
+    At most max_running operations run at once, and submitting is rejected
+    right away once max_queued operations wait. A limit of 0 means no
+    limit. A caller which must do some work before it can submit an
+    operation reserves its queue slot first, so that the operation can
+    not be rejected once the work is done.
+    """
+
+    def __init__(self, max_running=0, max_queued=0, project_weights=None):
+        super(OperationQueue, self).__init__()
+        self._max_running = max_running
+        self._max_queued = max_queued
+        self._project_weights = {
+            project_id: float(weight)
+            for project_id, weight in (project_weights or {}).items()
+        }
+        self._heap = []
+        self._counter = itertools.count()
+        self._running = 0
+        self._reserved = 0
+        self._virtual_time = collections.defaultdict(float)
+        self._finish_tags = {}
+        self._queued = collections.Counter()
+        self._started = collections.Counter()
+        self._rejected = collections.Counter()
+        self._wait_total = collections.Counter()
+        self._wait_max = collections.Counter()
+
+    def _weight(self, project_id):
+        weight = self._project_weights.get(project_id, 1.0)
+        return weight if weight > 0 else 1.0
+
+    def _is_full(self):
+        if (not self._max_queued or
+                len(self._heap) + self._reserved < self._max_queued):
+            return False
+        return not (self._max_running == 0 or
+                    self._running < self._max_running)
+
+    def check_admission(self, operation_type):
+        """Raises OperationQueueFull if an operation would be rejected
+
+        Lets the callers fail fast, before doing any work for an operation
+        which can not be queued.
+        """
+        if self._is_full():
+            self._rejected[operation_type] += 1
+            LOG.warning("Rejecting %(type)s operation, %(queued)s "
+                        "operations are queued.",
+                        {'type': operation_type,
+                         'queued': len(self._heap) + self._reserved})
+            raise exception.OperationQueueFull(operation_type=operation_type)
+
+    def reserve(self, operation_type):
+        """Reserves a queue slot, raises OperationQueueFull if there is none
+
+        The slot is taken by submit_reserved, or given back by release.
+        """
+        self.check_admission(operation_type)
+        self._reserved += 1
+
+    def release(self):
+        """Gives back a slot reserved for an operation not submitted"""
+        self._reserved -= 1
+
+    def submit(self, operation_type, project_id, func, *args, **kwargs):
+        """Queues func to be run as an operation of a project"""
+        self.check_admission(operation_type)
+        self._push(operation_type, project_id, func, args, kwargs)
+
+    def submit_reserved(self, operation_type, project_id, func, *args,
+                        **kwargs):
+        """Queues func in a slot reserved by reserve, it is never rejected"""
+        self._reserved -= 1
+        self._push(operation_type, project_id, func, args, kwargs)
+
+    def resubmit(self, operation_type, project_id, func, *args, **kwargs):
+        """Queues func for an operation admitted before a restart
+
+        It is never rejected, the operation was accepted already.
+        """
+        self._push(operation_type, project_id, func, args, kwargs)
+
+    def _push(self, operation_type, project_id, func, args, kwargs):
+        priority = OPERATION_PRIORITIES.get(operation_type,
+                                            len(OPERATION_PRIORITIES))
+        key = (priority, project_id)
+        start_tag = max(self._virtual_time[priority],
+                        self._finish_tags.get(key, 0.0))
+        finish_tag = start_tag + 1.0 / self._weight(project_id)
+        self._finish_tags[key] = finish_tag
+
+        operation = _QueuedOperation(operation_type, project_id, start_tag,
+                                     timeutils.utcnow(), func, args, kwargs)
+        heapq.heappush(self._heap, (priority, finish_tag,
+                                    next(self._counter), operation))
+        self._queued[operation_type] += 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._heap and (self._max_running == 0 or
+                              self._running < self._max_running):
+            priority, finish_tag, _, operation = heapq.heappop(self._heap)
+            self._virtual_time[priority] = max(self._virtual_time[priority],
+                                               operation.start_tag)
+            if self._finish_tags.get(
+                    (priority, operation.project_id)) == finish_tag:
+                # the project has nothing else queued in this priority
+                del self._finish_tags[(priority, operation.project_id)]
+
+            wait = timeutils.delta_seconds(operation.enqueued_at,
+                                           timeutils.utcnow())
+            self._queued[operation.operation_type] -= 1
+            self._started[operation.operation_type] += 1
+            self._wait_total[operation.operation_type] += wait
+            self._wait_max[operation.operation_type] = max(
+                self._wait_max[operation.operation_type], wait)
+            LOG.debug("Starting %(type)s operation of project %(project)s "
+                      "after %(wait).3f seconds in queue.",
+                      {'type': operation.operation_type,
+                       'project': operation.project_id, 'wait': wait})
+
+            self._running += 1
+            greenthread.spawn_n(self._run, operation)
+
+    def _run(self, operation):
+        try:
+            operation.func(*operation.args, **operation.kwargs)
+        except Exception:
+            LOG.exception("The %s operation failed.", operation.operation_type)
+        finally:
+            self._running -= 1
+            self._dispatch()
+
+    def statistics(self):
+        """Returns the queue lengths and queue times per operation type"""
+        operations = {}
+        for operation_type in (set(self._queued) | set(self._started) |
+                               set(self._rejected)):
+            started = self._started[operation_type]
+            operations[operation_type] = {
+                'queued': self._queued[operation_type],
+                'started': started,
+                'rejected': self._rejected[operation_type],
+                'average_queue_time': (
+                    self._wait_total[operation_type] / started
+                    if started else 0.0),
+                'max_queue_time': self._wait_max[operation_type],
+            }
+        return {
+            'queued': len(self._heap),
+            'reserved': self._reserved,
+            'running': self._running,
+            'max_queued': self._max_queued,
+            'max_running': self._max_running,
+            'operations': operations,
+        }
@@ -10,12 +10,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 from functools import partial
-import os
+import six
+import zlib
 
-from io import BytesIO
+from eventlet import greenpool
+from eventlet import greenthread
+from eventlet import queue
 from karbor.common import constants
 from karbor import exception
+from karbor.services.protection import chunk_store
 from karbor.services.protection.client_factory import ClientFactory
 from karbor.services.protection import protection_plugin
 from karbor.services.protection.protection_plugins.image \
@@ -33,6 +38,35 @@ image_backup_opts = [
                     'the size of image\'s chunk).'),
     cfg.IntOpt('poll_interval', default=10,
                help='Poll interval for image status'),
+    cfg.IntOpt('backup_image_upload_parallelism', default=4, min=1,
+               help='The number of image objects uploaded to the bank '
+                    'concurrently while protecting an image.'),
+    cfg.IntOpt('backup_image_upload_queue_depth', default=8, min=1,
+               help='The number of image objects read from glance that '
+                    'may wait for an uploader. Together with the '
+                    'parallelism, this bounds the memory used by an image '
+                    'backup to (queue depth + parallelism + 1) x object '
+                    'size.'),
+    cfg.BoolOpt('backup_image_deduplication', default=False,
+                help='Store image objects by content in a chunk store '
+                     'shared by all checkpoints of the bank. Objects which '
+                     'already exist in the store are not uploaded again, '
+                     'so repeated backups of an image only store and '
+                     'upload the changed objects.'),
+    cfg.IntOpt('backup_image_progress_interval', default=16, min=1,
+               help='The number of image objects committed to the bank '
+                    'between two saves of the backup progress. An '
+                    'interrupted image backup continues from the last '
+                    'saved progress.'),
+    cfg.IntOpt('restore_image_prefetch_count', default=4, min=1,
+               help='The number of image objects fetched from the bank '
+                    'ahead of the glance upload while restoring an image. '
+                    'This bounds the memory used by an image restore to '
+                    'prefetch count x object size.'),
+    cfg.IntOpt('restore_image_chunk_retries', default=2, min=0,
+               help='The number of times an image object whose digest '
+                    'does not match the image manifest is fetched again '
+                    'from the bank before the restore fails.'),
 ]
 
 LOG = logging.getLogger(__name__)
@@ -49,12 +83,329 @@ def get_image_status(glance_client, image_id):
     return status
 
 
+def get_image_data(glance_client, image_id, offset=0):
+    """Returns the data of an image, starting at offset bytes"""
+    if not offset:
+        return glance_client.images.data(image_id, do_checksum=True)
+
+    url = '/v2/images/%s/file' % image_id
+    resp, body = glance_client.http_client.get(
+        url, headers={'Range': 'bytes=%d-' % offset})
+    if resp.status_code == 206:
+        return body
+
+    LOG.debug("Glance ignored the range request of image %s, skipping "
+              "%s bytes of its data.", image_id, offset)
+    return _skip_bytes(body, offset)
+
+
+def _skip_bytes(data_iter, length):
+    for data in data_iter:
+        if length >= len(data):
+            length -= len(data)
+            continue
+        yield data[length:]
+        length = 0
+
+
+def get_chunk_reference(checkpoint, image_id):
+    return "%s@%s" % (checkpoint.id, image_id)
+
+
+def release_chunks(store, manifest, reference):
+    for digest in set(manifest or []):
+        try:
+            store.remove_reference(digest, reference)
+        except Exception as err:
+            LOG.warning("Releasing image chunk %(digest)s failed: %(err)s",
+                        {'digest': digest, 'err': err})
+
+
+def _get_object(bank_section, key):
+    try:
+        return bank_section.get_object(key)
+    except exception.BankGetObjectFailed:
+        return None
+
+
+class ImageBackupProgress(object):
+    """Upload progress of an image backup, persisted to the bank
+
+    The uploaders commit objects out of order. The progress is the number
+    of objects committed contiguously from the start of the image, with
+    the rolling CRC32 of the image bytes up to there and the digests of
+    those objects. It is saved to the resource bank section every interval
+    objects, and for deduplicated backups also to a bank wide location per
+    image, so that an interrupted backup continues from there, in the same
+    or in a new checkpoint.
+    """
+
+    def __init__(self, bank_section, image_id, image_checksum, object_size,
+                 reference=None, interval=1, chunks_num=0, checksum=0,
+                 manifest=None, deduplicated=False):
+        super(ImageBackupProgress, self).__init__()
+        self._bank_section = bank_section
+        self._image_id = image_id
+        self._image_checksum = image_checksum
+        self._object_size = object_size
+        self._reference = reference
+        self._interval = interval
+        self.chunks_num = chunks_num
+        self.checksum = checksum
+        self.manifest = manifest if manifest is not None else []
+        self.deduplicated = deduplicated
+        self._pending = {}
+        self._saved_chunks_num = chunks_num
+
+    @classmethod
+    def load(cls, bank_section, image_id, image_checksum, object_size,
+             reference=None, interval=1, store=None):
+        """Loads the progress an interrupted backup of the image left
+
+        The progress of the resource bank section is preferred. When a
+        chunk store is given, the progress of a backup of the image in
+        another checkpoint is taken over, adding references to the chunks
+        it committed. A new progress is returned if there is none to
+        continue from.
+        """
+        progress = cls(bank_section, image_id, image_checksum, object_size,
+                       reference, interval,
+                       deduplicated=store is not None)
+        if image_checksum is None:
+            return progress
+
+        keys = [(bank_section, "progress")]
+        if store is not None:
+            keys.append((bank_section.bank, _shared_progress_key(image_id)))
+        for section, key in keys:
+            try:
+                value = section.get_object(key)
+            except exception.BankGetObjectFailed:
+                continue
+            if not value or (
+                    value.get("image_checksum") != image_checksum or
+                    value.get("object_size") != object_size or
+                    bool(value.get("deduplicated")) != (store is not None)):
+                continue
+            if store is not None and not cls._adopt_chunks(
+                    store, value["manifest"], reference):
+                continue
+
+            progress.chunks_num = value["chunks_num"]
+            progress.checksum = value["checksum"]
+            progress.manifest = value.get("manifest") or []
+            progress._saved_chunks_num = progress.chunks_num
+            return progress
+        return progress
+
+    @staticmethod
+    def _adopt_chunks(store, manifest, reference):
+        for digest in manifest:
+            if not store.add_reference(digest, reference):
+                LOG.info("Chunk %s of the interrupted image backup no "
+                         "longer exists, not resuming.", digest)
+                return False
+        return True
+
+    @property
+    def offset(self):
+        return self.chunks_num * self._object_size
+
+    def to_dict(self):
+        return {
+            "image_id": self._image_id,
+            "image_checksum": self._image_checksum,
+            "object_size": self._object_size,
+            "reference": self._reference,
+            "chunks_num": self.chunks_num,
+            "checksum": self.checksum,
+            "manifest": self.manifest,
+            "deduplicated": self.deduplicated,
+        }
+
+    def commit(self, chunk_num, checksum, digest=None):
+        self._pending[chunk_num] = (checksum, digest)
+        while self.chunks_num + 1 in self._pending:
+            self.chunks_num += 1
+            self.checksum, digest = self._pending.pop(self.chunks_num)
+            self.manifest.append(digest)
+        if self.chunks_num - self._saved_chunks_num >= self._interval:
+            self.save()
+
+    def save(self):
+        if self._image_checksum is None:
+            return
+        self._saved_chunks_num = self.chunks_num
+        value = self.to_dict()
+        self._bank_section.update_object("progress", value)
+        if self.deduplicated:
+            self._bank_section.bank.update_object(
+                _shared_progress_key(self._image_id), value)
+
+    def remove(self):
+        try:
+            self._bank_section.delete_object("progress")
+        except exception.BankDeleteObjectFailed:
+            pass
+        if self.deduplicated:
+            remove_shared_progress(self._bank_section.bank, self._image_id,
+                                   self._reference)
+
+
+def _shared_progress_key(image_id):
+    return "/image-backup-progress/%s" % image_id
+
+
+def remove_shared_progress(bank, image_id, reference):
+    key = _shared_progress_key(image_id)
+    try:
+        value = bank.get_object(key)
+        if value and value.get("reference") == reference:
+            bank.delete_object(key)
+    except (exception.BankGetObjectFailed,
+            exception.BankDeleteObjectFailed):
+        pass
+
+
+class ImageChunkUploader(object):
+    """Uploads an image stream to a bank section as data_N objects
+
+    One reader fills preallocated buffers from the image stream and hands
+    them, through a bounded queue, to a pool of uploader green threads
+    which put the objects to the bank concurrently. Buffers are recycled
+    once uploaded, so memory stays bounded regardless of the image size.
+
+    The SHA-256 digest of every object is kept, in order, in the manifest.
+    When a chunk store is given, the chunks are put to it by content
+    instead of as data_N objects.
+
+    When a progress is given, the stream continues the image after the
+    objects the progress already committed, and every uploaded object is
+    committed to it.
+    """
+
+    _STOP = object()
+
+    def __init__(self, bank_section, object_size, parallelism, queue_depth,
+                 chunk_store=None, reference=None, progress=None):
+        super(ImageChunkUploader, self).__init__()
+        self._bank_section = bank_section
+        self._object_size = object_size
+        self._parallelism = parallelism
+        self._chunk_store = chunk_store
+        self._reference = reference
+        self._progress = progress
+        self._work_queue = queue.LightQueue(queue_depth)
+        self._free_buffers = queue.LightQueue()
+        for _ in range(queue_depth + parallelism + 1):
+            self._free_buffers.put(bytearray(object_size))
+        self._first_chunk_num = 0
+        self._digests = {}
+        self.checksum = 0
+        if progress is not None:
+            self._first_chunk_num = progress.chunks_num
+            self._digests = dict(enumerate(progress.manifest, 1))
+            self.checksum = progress.checksum
+        self._error = None
+
+    @property
+    def manifest(self):
+        """The digests of the uploaded objects, in order"""
+        return [self._digests[num] for num in sorted(self._digests)]
+
+    def upload(self, image_response):
+        """Uploads the image stream, returning the number of objects"""
+        pool = greenpool.GreenPool(self._parallelism)
+        for _ in range(self._parallelism):
+            pool.spawn_n(self._uploader)
+        try:
+            chunks_num = self._read(image_response)
+        finally:
+            for _ in range(self._parallelism):
+                self._work_queue.put(self._STOP)
+            pool.waitall()
+        if self._error is not None:
+            raise self._error
+        return chunks_num
+
+    def _enqueue(self, chunk_num, buf, length):
+        self.checksum = zlib.crc32(memoryview(buf)[:length],
+                                   self.checksum) & 0xffffffff
+        self._work_queue.put((chunk_num, buf, length, self.checksum))
+
+    def _read(self, image_response):
+        chunks_num = self._first_chunk_num
+        buf = None
+        offset = 0
+        for data in image_response:
+            view = memoryview(data)
+            while len(view) > 0 and self._error is None:
+                if buf is None:
+                    buf = self._free_buffers.get()
+                    offset = 0
+                length = min(len(view), self._object_size - offset)
+                buf[offset:offset + length] = view[:length]
+                offset += length
+                view = view[length:]
+                if offset == self._object_size:
+                    chunks_num += 1
+                    self._enqueue(chunks_num, buf, offset)
+                    buf = None
+            if self._error is not None:
+                break
+
+        if buf is not None and offset > 0 and self._error is None:
+            chunks_num += 1
+            self._enqueue(chunks_num, buf, offset)
+        return chunks_num
+
+    def _uploader(self):
+        while True:
+            item = self._work_queue.get()
+            if item is self._STOP:
+                return
+            chunk_num, buf, length, checksum = item
+            try:
+                if self._error is None:
+                    self._upload_chunk(chunk_num,
+                                       memoryview(buf)[:length].tobytes(),
+                                       checksum)
+            except Exception as err:
+                LOG.error("Uploading image object data_%(num)s failed: "
+                          "%(err)s", {'num': chunk_num, 'err': err})
+                if self._error is None:
+                    self._error = err
+            finally:
+                self._free_buffers.put(buf)
+
+    def _upload_chunk(self, chunk_num, data, checksum):
+        digest = chunk_store.chunk_digest(data)
+        self._digests[chunk_num] = digest
+        if self._chunk_store is None:
+            self._bank_section.update_object("data_" + str(chunk_num), data)
+        else:
+            uploaded = self._chunk_store.put(digest, data, self._reference)
+            if not uploaded:
+                LOG.debug("Image object data_%(num)s already exists as "
+                          "chunk %(digest)s, skipped uploading it.",
+                          {'num': chunk_num, 'digest': digest})
+
+        if self._progress is not None:
+            self._progress.commit(chunk_num, checksum, digest)
+
+
 class ProtectOperation(protection_plugin.Operation):
     def __init__(self, backup_image_object_size,
-                 poll_interval):
+                 poll_interval, upload_parallelism=1,
+                 upload_queue_depth=1, deduplication=False,
+                 progress_interval=1):
         super(ProtectOperation, self).__init__()
         self._data_block_size_bytes = backup_image_object_size
         self._interval = poll_interval
+        self._upload_parallelism = upload_parallelism
+        self._upload_queue_depth = upload_queue_depth
+        self._deduplication = deduplication
+        self._progress_interval = progress_interval
 
     def on_main(self, checkpoint, resource, context, parameters, **kwargs):
         image_id = resource.id
@@ -99,43 +450,54 @@ class ProtectOperation(protection_plugin.Operation):
                 reason=err,
                 resource_id=image_id,
                 resource_type=constants.IMAGE_RESOURCE_TYPE)
-        self._create_backup(glance_client, bank_section, image_id)
-
-    def _create_backup(self, glance_client, bank_section, image_id):
+        store = None
+        reference = None
+        if self._deduplication:
+            store = chunk_store.ChunkStore(bank_section.bank)
+            reference = get_chunk_reference(checkpoint, image_id)
+        self._create_backup(glance_client, bank_section, image_id,
+                            store, reference)
+
+    def _create_backup(self, glance_client, bank_section, image_id,
+                       store=None, reference=None):
+        uploader = None
+        progress = None
         try:
-            image_response = glance_client.images.data(image_id,
-                                                       do_checksum=True)
-            bank_chunk_num = int(self._data_block_size_bytes/65536)
-            LOG.debug("Creating image backup, bank_chunk_num: %s.",
-                      bank_chunk_num)
+            resource_definition = bank_section.get_object("metadata")
+            image_checksum = None
+            if resource_definition is not None:
+                image_checksum = (
+                    resource_definition["image_metadata"]["checksum"])
+            progress = ImageBackupProgress.load(
+                bank_section, image_id, image_checksum,
+                self._data_block_size_bytes, reference,
+                self._progress_interval, store)
+            if progress.chunks_num > 0:
+                LOG.info("Resuming image backup (id: %(id)s) after "
+                         "%(num)s objects.",
+                         {'id': image_id, 'num': progress.chunks_num})
+
+            image_response = get_image_data(glance_client, image_id,
+                                            progress.offset)
+            LOG.debug("Creating image backup, upload parallelism: %s.",
+                      self._upload_parallelism)
 
             # backup the data of image
-            image_chunks_num = 0
-            chunks_num = 1
-            image_response_data = BytesIO()
-            for chunk in image_response:
-                image_response_data.write(chunk)
-                image_chunks_num += 1
-                if image_chunks_num == bank_chunk_num:
-                    image_chunks_num = 0
-                    image_response_data.seek(0, os.SEEK_SET)
-                    data = image_response_data.read(
-                        self._data_block_size_bytes)
-                    bank_section.update_object("data_" + str(chunks_num), data)
-                    image_response_data.truncate(0)
-                    image_response_data.seek(0, os.SEEK_SET)
-                    chunks_num += 1
-
-            image_response_data.seek(0, os.SEEK_SET)
-            data = image_response_data.read()
-            if data != '':
-                bank_section.update_object("data_" + str(chunks_num), data)
+            uploader = ImageChunkUploader(bank_section,
+                                          self._data_block_size_bytes,
+                                          self._upload_parallelism,
+                                          self._upload_queue_depth,
+                                          store, reference, progress)
+            chunks_num = uploader.upload(image_response)
+            bank_section.update_object("manifest", uploader.manifest)
 
             # Save the chunks_num to metadata
-            resource_definition = bank_section.get_object("metadata")
             if resource_definition is not None:
                 resource_definition["chunks_num"] = chunks_num
+                resource_definition["deduplicated"] = store is not None
+                resource_definition["crc32"] = uploader.checksum
             bank_section.update_object("metadata", resource_definition)
+            progress.remove()
 
             # Update resource_definition backup_status
             bank_section.update_object("status",
@@ -146,6 +508,7 @@ class ProtectOperation(protection_plugin.Operation):
             # update resource_definition backup_status
             LOG.exception('Protecting image (id: %s) to bank failed.',
                           image_id)
+            self._save_progress(progress, uploader, store, reference)
             bank_section.update_object("status",
                                        constants.RESOURCE_STATUS_ERROR)
             raise exception.CreateBackupFailed(
@@ -153,6 +516,20 @@ class ProtectOperation(protection_plugin.Operation):
                 resource_id=image_id,
                 resource_type=constants.IMAGE_RESOURCE_TYPE)
 
+    def _save_progress(self, progress, uploader, store, reference):
+        committed = []
+        try:
+            if progress is not None:
+                progress.save()
+                committed = progress.manifest
+        except Exception as err:
+            LOG.error("Saving the image backup progress failed: %s", err)
+        if store is not None and uploader is not None:
+            # keep the committed chunks referenced to resume from them
+            uncommitted = (set(uploader.manifest[len(committed):]) -
+                           set(committed))
+            release_chunks(store, uncommitted, reference)
+
 
 class DeleteOperation(protection_plugin.Operation):
     def on_main(self, checkpoint, resource, context, parameters, **kwargs):
@@ -163,6 +540,22 @@ class DeleteOperation(protection_plugin.Operation):
         try:
             bank_section.update_object("status",
                                        constants.RESOURCE_STATUS_DELETING)
+            resource_definition = _get_object(bank_section, "metadata")
+            if resource_definition and resource_definition.get(
+                    "deduplicated"):
+                manifest = bank_section.get_object("manifest")
+            else:
+                # chunks an interrupted backup committed
+                progress = _get_object(bank_section, "progress")
+                manifest = None
+                if progress and progress.get("deduplicated"):
+                    manifest = progress.get("manifest")
+            if manifest:
+                reference = get_chunk_reference(checkpoint, image_id)
+                release_chunks(chunk_store.ChunkStore(bank_section.bank),
+                               manifest, reference)
+                remove_shared_progress(bank_section.bank, image_id,
+                                       reference)
             objects = bank_section.list_objects()
             for obj in objects:
                 if obj == "status":
@@ -180,10 +573,18 @@ class DeleteOperation(protection_plugin.Operation):
                 resource_type=constants.IMAGE_RESOURCE_TYPE)
 
 
+def _list_data_objects(bank_section):
+    objects = [key.split("/")[-1] for key in bank_section.list_objects()
+               if (key.split("/")[-1]).startswith("data_")]
+    return sorted(objects, key=lambda s: int(s[5:]))
+
+
 class RestoreOperation(protection_plugin.Operation):
-    def __init__(self, poll_interval):
+    def __init__(self, poll_interval, prefetch_count=1, chunk_retries=0):
         super(RestoreOperation, self).__init__()
         self._interval = poll_interval
+        self._prefetch_count = prefetch_count
+        self._chunk_retries = chunk_retries
 
     def on_main(self, checkpoint, resource, context, parameters, **kwargs):
         original_image_id = resource.id
@@ -197,27 +598,36 @@ class RestoreOperation(protection_plugin.Operation):
         try:
             resource_definition = bank_section.get_object('metadata')
             image_metadata = resource_definition['image_metadata']
-            objects = [key.split("/")[-1] for key in
-                       bank_section.list_objects()
-                       if (key.split("/")[-1]).startswith("data_")]
+            store = None
+            # backups taken before the digests were kept have no manifest
+            digests = _get_object(bank_section, "manifest")
+            if resource_definition.get("deduplicated"):
+                store = chunk_store.ChunkStore(bank_section.bank)
+                sorted_objects = digests
+            else:
+                sorted_objects = _list_data_objects(bank_section)
 
             # check the chunks_num
             chunks_num = resource_definition.get("chunks_num", 0)
-            if len(objects) != int(chunks_num):
+            if len(sorted_objects) != int(chunks_num):
                 raise exception.RestoreBackupFailed(
                     reason=" The chunks_num of restored image is invalid.",
                     resource_id=original_image_id,
                     resource_type=constants.IMAGE_RESOURCE_TYPE)
 
-            sorted_objects = sorted(objects, key=lambda s: int(s[5:]))
-            image_data = ImageBankIO(bank_section, sorted_objects)
+            image_data = ImageBankIO(bank_section, sorted_objects,
+                                     self._prefetch_count, store,
+                                     digests, self._chunk_retries)
             disk_format = image_metadata["disk_format"]
             container_format = image_metadata["container_format"]
             image = glance_client.images.create(
                 disk_format=disk_format,
                 container_format=container_format,
                 name=name)
-            glance_client.images.upload(image.id, image_data)
+            try:
+                glance_client.images.upload(image.id, image_data)
+            finally:
+                image_data.close()
 
             image_info = glance_client.images.get(image.id)
             if image_info.status != "active":
@@ -253,26 +663,148 @@ class RestoreOperation(protection_plugin.Operation):
 
 
 class ImageBankIO(object):
-        def __init__(self, bank_section, sorted_objects):
-            super(ImageBankIO, self).__init__()
-            self.bank_section = bank_section
-            self.sorted_objects = sorted_objects
-            self.obj_size = len(sorted_objects)
-            self.length = 0
-
-        def readable(self):
-            return True
-
-        def __iter__(self):
-            return self
-
-        def read(self, length=None):
-            obj_index = self.length
-            self.length += 1
-            if self.length > self.obj_size:
-                return ''
-            return self.bank_section.get_object(
-                self.sorted_objects[obj_index])
+    """File-like reader over the data_N objects of an image in the bank
+
+    Up to prefetch_count objects are fetched by green threads ahead of the
+    reader and handed out in order, so the bank latency overlaps with the
+    consumer while memory stays bounded to prefetch_count objects. With a
+    chunk store, the objects are the digests of the image manifest.
+
+    When the digests of the objects are given, every fetched object is
+    verified against its digest and fetched again up to retries times, so
+    a corrupted object fails the restore as soon as it is read.
+    """
+
+    def __init__(self, bank_section, sorted_objects, prefetch_count=1,
+                 store=None, digests=None, retries=0):
+        super(ImageBankIO, self).__init__()
+        self.bank_section = bank_section
+        self.store = store
+        self.sorted_objects = sorted_objects
+        self.digests = dict(zip(sorted_objects, digests or []))
+        self.retries = retries
+        self.obj_size = len(sorted_objects)
+        self._prefetch_count = max(prefetch_count, 1)
+        self._next_index = 0
+        self._pending = collections.deque()
+        self._data = b''
+        self._offset = 0
+
+    def readable(self):
+        return True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        data = self.read()
+        if not data:
+            raise StopIteration()
+        return data
+
+    next = __next__
+
+    def _fetch_object(self, obj_name):
+        if self.store is not None:
+            data = self.store.get(obj_name)
+        else:
+            data = self.bank_section.get_object(obj_name)
+        if isinstance(data, six.text_type):
+            data = data.encode('utf-8')
+        return data
+
+    def get_object(self, obj_name):
+        """Returns an object of the image, verified against its digest
+
+        Raises BankObjectCorrupted if the object still does not match its
+        digest after the retries.
+        """
+        expected = self.digests.get(obj_name)
+        attempt = 0
+        while True:
+            data = self._fetch_object(obj_name)
+            if expected is None:
+                return data
+            digest = chunk_store.chunk_digest(data)
+            if digest == expected:
+                return data
+            if attempt >= self.retries:
+                raise exception.BankObjectCorrupted(
+                    key=obj_name,
+                    reason="digest %s does not match %s" % (digest,
+                                                            expected))
+            attempt += 1
+            LOG.warning("Image object %(obj)s does not match its digest, "
+                        "fetching it again (attempt %(attempt)s).",
+                        {'obj': obj_name, 'attempt': attempt})
+
+    def _prefetch(self):
+        while (len(self._pending) < self._prefetch_count and
+               self._next_index < self.obj_size):
+            obj_name = self.sorted_objects[self._next_index]
+            self._next_index += 1
+            self._pending.append(
+                greenthread.spawn(self.get_object, obj_name))
+
+    def read(self, length=None):
+        if self._offset >= len(self._data):
+            self._data = b''
+            self._offset = 0
+            self._prefetch()
+            if not self._pending:
+                return b''
+            self._data = self._pending.popleft().wait()
+            self._prefetch()
+
+        if self._offset == 0 and (length is None or length < 0 or
+                                  length >= len(self._data)):
+            self._offset = len(self._data)
+            return self._data
+        if length is None or length < 0:
+            length = len(self._data) - self._offset
+        data = self._data[self._offset:self._offset + length]
+        self._offset += len(data)
+        return data
+
+    def close(self):
+        while self._pending:
+            self._pending.popleft().kill()
+        self._data = b''
+        self._offset = 0
+
+
+def scrub_image_backup(bank_section):
+    """Verifies the objects of an image backup against its manifest
+
+    Returns the names of the objects which are missing or whose digest
+    does not match, or None if the backup has no manifest to verify.
+    """
+    resource_definition = _get_object(bank_section, "metadata") or {}
+    digests = _get_object(bank_section, "manifest")
+    if digests is None:
+        return None
+
+    store = None
+    if resource_definition.get("deduplicated"):
+        store = chunk_store.ChunkStore(bank_section.bank)
+        sorted_objects = digests
+    else:
+        sorted_objects = ["data_%s" % num
+                          for num in range(1, len(digests) + 1)]
+
+    corrupted = []
+    image_data = ImageBankIO(bank_section, sorted_objects, store=store,
+                             digests=digests)
+    for index, obj_name in enumerate(sorted_objects):
+        try:
+            image_data.get_object(obj_name)
+        except (exception.BankGetObjectFailed,
+                exception.BankObjectCorrupted) as err:
+            LOG.warning("Image object %(num)s (%(obj)s) is corrupted: "
+                        "%(err)s", {'num': index + 1, 'obj': obj_name,
+                                    'err': err})
+            corrupted.append(obj_name)
+    return corrupted
 
 
 class GlanceProtectionPlugin(protection_plugin.ProtectionPlugin):
@@ -286,6 +818,17 @@ class GlanceProtectionPlugin(protection_plugin.ProtectionPlugin):
         self._data_block_size_bytes = (
             self._plugin_config.backup_image_object_size)
         self._poll_interval = self._plugin_config.poll_interval
+        self._upload_parallelism = (
+            self._plugin_config.backup_image_upload_parallelism)
+        self._upload_queue_depth = (
+            self._plugin_config.backup_image_upload_queue_depth)
+        self._prefetch_count = (
+            self._plugin_config.restore_image_prefetch_count)
+        self._deduplication = self._plugin_config.backup_image_deduplication
+        self._progress_interval = (
+            self._plugin_config.backup_image_progress_interval)
+        self._chunk_retries = (
+            self._plugin_config.restore_image_chunk_retries)
 
         if self._data_block_size_bytes % 65536 != 0 or (
                 self._data_block_size_bytes <= 0):
@@ -315,10 +858,21 @@ class GlanceProtectionPlugin(protection_plugin.ProtectionPlugin):
 
     def get_protect_operation(self, resource):
         return ProtectOperation(self._data_block_size_bytes,
-                                self._poll_interval)
+                                self._poll_interval,
+                                self._upload_parallelism,
+                                self._upload_queue_depth,
+                                self._deduplication,
+                                self._progress_interval)
 
     def get_restore_operation(self, resource):
-        return RestoreOperation(self._poll_interval)
+        return RestoreOperation(self._poll_interval,
+                                self._prefetch_count,
+                                self._chunk_retries)
 
     def get_delete_operation(self, resource):
         return DeleteOperation()
+
+    def scrub_backup(self, checkpoint, resource):
+        """Returns the corrupted objects of the backup of an image"""
+        bank_section = checkpoint.get_resource_bank_section(resource.id)
+        return scrub_image_backup(bank_section)
@@ -9,15 +9,31 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import collections
 from collections import namedtuple
+import hashlib
+import weakref
 
 from karbor.common import constants
 from karbor import exception
+from karbor.services.protection.flows import workflow
 from karbor.services.protection import graph
+from oslo_config import cfg
 from oslo_log import log as logging
 
+resource_flow_opts = [
+    cfg.IntOpt('resource_flow_cache_size',
+               default=64, min=0,
+               help='number of idle resource flows kept to be reused by '
+                    'the next operations of the same type, provider and '
+                    'resource graph. 0 disables the cache'),
+]
+
 LOG = logging.getLogger(__name__)
 
+CONF = cfg.CONF
+CONF.register_opts(resource_flow_opts)
+
 
 HOOKS = (
     HOOK_PRE_BEGIN,
@@ -48,13 +64,25 @@ def noop_handle(*args, **kwargs):
     pass
 
 
+def hook_task_name(operation_type, hook_type, resource):
+    return "{operation_type}_{hook_type}_{type}_{id}".format(
+        type=resource.type,
+        id=resource.id,
+        hook_type=hook_type,
+        operation_type=operation_type,
+    )
+
+
+def parameters_key(resource):
+    """Returns the name of the store entry of the parameters of a resource"""
+    return 'parameters_{}#{}'.format(resource.type, resource.id)
+
+
 class ResourceFlowGraphWalkerListener(graph.GraphWalkerListener):
-    def __init__(self, resource_flow, operation_type, context, parameters,
-                 plugins, workflow_engine):
+    def __init__(self, resource_flow, operation_type, plugins,
+                 workflow_engine):
         super(ResourceFlowGraphWalkerListener, self).__init__()
         self.operation_type = operation_type
-        self.context = context
-        self.parameters = parameters or {}
         self.plugins = plugins
         self.workflow_engine = workflow_engine
         self.flow = resource_flow
@@ -82,30 +110,22 @@ class ResourceFlowGraphWalkerListener(graph.GraphWalkerListener):
             'Resource {} method "{}" is not callable'
         ).format(resource.type, hook_type)
 
-        task_name = "{operation_type}_{hook_type}_{type}_{id}".format(
-            type=resource.type,
-            id=resource.id,
-            hook_type=hook_type,
-            operation_type=self.operation_type,
-        )
+        task_name = hook_task_name(self.operation_type, hook_type, resource)
 
-        parameters = {}
-        parameters.update(self.parameters.get(resource.type, {}))
-        resource_id = '{}#{}'.format(resource.type, resource.id)
-        parameters.update(self.parameters.get(resource_id, {}))
+        # only the resource is injected, the inputs of a run are bound
+        # through the store so that the flow can be reused by later runs
         injects = {
-            'context': self.context,
-            'parameters': parameters,
             'resource': resource,
         }
-        requires = list(injects)
-        requires.append('checkpoint')
+        requires = ['context', 'parameters', 'resource', 'checkpoint']
         requires.extend(OPERATION_EXTRA_ARGS.get(self.operation_type, []))
 
-        task = self.workflow_engine.create_task(method,
-                                                name=task_name,
-                                                inject=injects,
-                                                requires=requires)
+        task = self.workflow_engine.create_task(
+            method,
+            name=task_name,
+            inject=injects,
+            requires=requires,
+            rebind={'parameters': parameters_key(resource)})
         return task
 
     def on_node_enter(self, node, already_visited):
@@ -161,8 +181,8 @@ class ResourceFlowGraphWalkerListener(graph.GraphWalkerListener):
                                            parent_hooks.on_complete)
 
 
-def build_resource_flow(operation_type, context, workflow_engine,
-                        plugins, resource_graph, parameters):
+def build_resource_flow(operation_type, workflow_engine, plugins,
+                        resource_graph):
     LOG.info("Build resource flow for operation %s", operation_type)
 
     resource_graph_flow = workflow_engine.build_flow(
@@ -171,8 +191,6 @@ def build_resource_flow(operation_type, context, workflow_engine,
     )
     resource_walker = ResourceFlowGraphWalkerListener(resource_graph_flow,
                                                       operation_type,
-                                                      context,
-                                                      parameters,
                                                       plugins,
                                                       workflow_engine)
     walker = graph.GraphWalker()
@@ -181,3 +199,110 @@ def build_resource_flow(operation_type, context, workflow_engine,
     walker.walk_graph(resource_graph)
     LOG.debug("Finished resource graph walk (operation %s)", operation_type)
     return resource_graph_flow
+
+
+def build_resource_store(context, resource_graph, parameters):
+    """Returns the store entries a run of a resource flow is bound to
+
+    The parameters of every resource merge the parameters of its type with
+    the ones of the resource itself.
+    """
+    parameters = parameters or {}
+    store = {'context': context}
+    packed_graph = graph.pack_graph(resource_graph)
+    for resource in packed_graph.nodes.values():
+        resource_parameters = {}
+        resource_parameters.update(parameters.get(resource.type, {}))
+        resource_id = '{}#{}'.format(resource.type, resource.id)
+        resource_parameters.update(parameters.get(resource_id, {}))
+        store[parameters_key(resource)] = resource_parameters
+    return store
+
+
+def _graph_hash(resource_graph):
+    serialized_graph = graph.serialize_resource_graph(resource_graph)
+    return hashlib.sha256(serialized_graph.encode('utf-8')).hexdigest()
+
+
+class ResourceFlowCache(object):
+    """Keeps the resource flows of finished operations to reuse them
+
+    Building a resource flow loads the protection plugins and walks the
+    resource graph, which is the same for every run of a plan. The flows
+    are keyed by operation type, provider and a hash of the resource
+    graph, and everything specific to a run is bound through the store of
+    its engine.
+
+    The operation objects of the plugins may keep state between the hooks
+    of a resource, so a flow is only used by one run at a time: it is
+    taken out of the cache when a run starts and put back once the run
+    finished. Runs of the same plan which overlap build their own flow.
+    At most max_size idle flows are kept, the least recently used are
+    dropped first.
+    """
+
+    def __init__(self, max_size=0):
+        super(ResourceFlowCache, self).__init__()
+        self._max_size = max_size
+        self._idle = collections.OrderedDict()
+        self._size = 0
+        self._keys = weakref.WeakKeyDictionary()
+        self.hits = 0
+        self.misses = 0
+
+    def get_flow(self, operation_type, workflow_engine, provider,
+                 resource_graph):
+        """Returns a resource flow for the exclusive use of one run"""
+        key = (operation_type, provider.id, _graph_hash(resource_graph))
+        idle_flows = self._idle.get(key)
+        if idle_flows:
+            flow = idle_flows.pop()
+            self._size -= 1
+            if not idle_flows:
+                del self._idle[key]
+            self.hits += 1
+            LOG.debug("Reusing the %s resource flow of provider %s",
+                      operation_type, provider.id)
+        else:
+            flow = build_resource_flow(operation_type, workflow_engine,
+                                       provider.load_plugins(),
+                                       resource_graph)
+            self.misses += 1
+        self._keys[flow] = key
+        return flow
+
+    def release(self, flow):
+        """Puts back a flow taken by get_flow once its run finished"""
+        key = self._keys.pop(flow, None)
+        if key is None or self._max_size == 0:
+            return
+        self._idle.setdefault(key, []).append(flow)
+        # keep the most recently used key last
+        self._idle[key] = self._idle.pop(key)
+        self._size += 1
+        while self._size > self._max_size:
+            oldest_key = next(iter(self._idle))
+            oldest_flows = self._idle[oldest_key]
+            oldest_flows.pop(0)
+            self._size -= 1
+            if not oldest_flows:
+                del self._idle[oldest_key]
+
+    def release_when_finished(self, flow_engine, flow):
+        """Releases the flow once the engine running it finished"""
+        def _on_flow_state(state, details):
+            if state in workflow.FINISHED_STATES:
+                self.release(flow)
+        flow_engine.notifier.register('*', _on_flow_state)
+
+
+_resource_flow_cache = None
+
+
+def get_resource_flow_cache():
+    """Returns the resource flow cache of the process"""
+    global _resource_flow_cache
+    if _resource_flow_cache is None:
+        _resource_flow_cache = ResourceFlowCache(
+            CONF.resource_flow_cache_size)
+    return _resource_flow_cache
@@ -19,11 +19,22 @@ Client side of the protection manager RPC API.
 from oslo_config import cfg
 import oslo_messaging as messaging
 
+from karbor import exception
+from karbor.i18n import _
 from karbor.objects import base as objects_base
 from karbor import rpc
 
 
+rpcapi_opts = [
+    cfg.StrOpt('protection',
+               help='The highest RPC API version of the messages sent to '
+                    'the protection services, e.g. 1.0 while protection '
+                    'services of the previous release are still running. '
+                    'Unset, the latest version is sent'),
+]
+
 CONF = cfg.CONF
+CONF.register_opts(rpcapi_opts, 'upgrade_levels')
 
 
 class ProtectionAPI(object):
@@ -32,25 +43,38 @@ class ProtectionAPI(object):
     API version history:
 
         1.0 - Initial version.
+        1.1 - Add resources to restore, add show_task_executor_statistics
+              and show_operation_queue_statistics.
     """
 
-    RPC_API_VERSION = '1.0'
+    RPC_API_VERSION = '1.1'
 
     def __init__(self):
         super(ProtectionAPI, self).__init__()
         target = messaging.Target(topic=CONF.protection_topic,
                                   version=self.RPC_API_VERSION)
         serializer = objects_base.KarborObjectSerializer()
-        self.client = rpc.get_client(target, version_cap=None,
-                                     serializer=serializer)
-
-    def restore(self, ctxt, restore=None, restore_auth=None):
-        cctxt = self.client.prepare(version='1.0')
+        self.client = rpc.get_client(
+            target, version_cap=CONF.upgrade_levels.protection,
+            serializer=serializer)
+
+    def restore(self, ctxt, restore=None, restore_auth=None, resources=None):
+        version = '1.0'
+        kwargs = {}
+        if resources:
+            if not self.client.can_send_version('1.1'):
+                raise exception.InvalidInput(reason=_(
+                    'The protection service does not support restoring '
+                    'selected resources'))
+            version = '1.1'
+            kwargs['resources'] = resources
+        cctxt = self.client.prepare(version=version)
         return cctxt.call(
             ctxt,
             'restore',
             restore=restore,
-            restore_auth=restore_auth)
+            restore_auth=restore_auth,
+            **kwargs)
 
     def protect(self, ctxt, plan=None, checkpoint_properties=None):
         cctxt = self.client.prepare(version='1.0')
@@ -68,6 +92,14 @@ class ProtectionAPI(object):
             provider_id=provider_id,
             checkpoint_id=checkpoint_id)
 
+    def show_task_executor_statistics(self, ctxt):
+        cctxt = self.client.prepare(version='1.1')
+        return cctxt.call(ctxt, 'show_task_executor_statistics')
+
+    def show_operation_queue_statistics(self, ctxt):
+        cctxt = self.client.prepare(version='1.1')
+        return cctxt.call(ctxt, 'show_operation_queue_statistics')
+
     def show_checkpoint(self, ctxt, provider_id, checkpoint_id):
         cctxt = self.client.prepare(version='1.0')
         return cctxt.call(
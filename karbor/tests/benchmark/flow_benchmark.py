@@ -0,0 +1,246 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark of the resource flows of the protection service
+
+Builds the resource flows of synthetic resource graphs and runs them with
+the noop protection plugin and an in-memory bank, reporting the time to
+build the resource graph, build the flow, compile the engine and run it,
+and, with --trace-memory, the peak memory allocated by each run. The
+memory is traced with tracemalloc, which slows the phases down.
+
+Run it with::
+
+    tox -e benchmark -- --sizes 100,500,1000 --fan-out 4 --fan-in 2 \\
+        --latency on_main=0.01
+"""
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+
+import eventlet
+from oslo_config import cfg
+
+from karbor.common import constants
+from karbor.resource import Resource
+from karbor.services.protection.bank_plugin import Bank
+from karbor.services.protection.checkpoint import CheckpointCollection
+from karbor.services.protection.flows import workflow
+from karbor.services.protection import graph
+from karbor.services.protection.protection_plugins import noop_plugin
+from karbor.services.protection import resource_flow
+from karbor.services.protection import restore_heat
+from karbor.tests.unit.protection.fakes import InMemoryBankPlugin
+from karbor.tests.unit.protection.fakes import InMemoryLeasePlugin
+
+CONF = cfg.CONF
+
+PHASES = ('graph_build', 'flow_build', 'engine_compile', 'execution')
+
+OPERATIONS = (
+    constants.OPERATION_PROTECT,
+    constants.OPERATION_RESTORE,
+    constants.OPERATION_DELETE,
+)
+
+
+class LatencyOperation(noop_plugin.NoopOperation):
+    """Noop operation sleeping a given number of seconds in every hook"""
+
+    def __init__(self, latency):
+        super(LatencyOperation, self).__init__()
+        self._latency = latency
+
+    def _sleep(self, hook_type):
+        latency = self._latency.get(hook_type)
+        if latency:
+            eventlet.sleep(latency)
+
+    def on_prepare_begin(self, *args, **kwargs):
+        self._sleep(resource_flow.HOOK_PRE_BEGIN)
+
+    def on_prepare_finish(self, *args, **kwargs):
+        self._sleep(resource_flow.HOOK_PRE_FINISH)
+
+    def on_main(self, *args, **kwargs):
+        self._sleep(resource_flow.HOOK_MAIN)
+
+    def on_complete(self, *args, **kwargs):
+        self._sleep(resource_flow.HOOK_COMPLETE)
+
+
+class LatencyProtectionPlugin(noop_plugin.NoopProtectionPlugin):
+    def __init__(self, config=None, latency=None):
+        super(LatencyProtectionPlugin, self).__init__(config)
+        self._latency = latency or {}
+
+    def get_protect_operation(self, resource):
+        return LatencyOperation(self._latency)
+
+    def get_restore_operation(self, resource):
+        return LatencyOperation(self._latency)
+
+    def get_delete_operation(self, resource):
+        return LatencyOperation(self._latency)
+
+
+def build_resources(size, fan_out=4, fan_in=1):
+    """Returns the start nodes and child function of a synthetic graph
+
+    The resources form a tree where every resource has fan_out children,
+    and every resource but the root also gets up to fan_in - 1 extra
+    parents among the resources before its first parent. The resource
+    types cycle through the supported resource types.
+    """
+    resources = [
+        Resource(type=constants.RESOURCE_TYPES[
+                 index % len(constants.RESOURCE_TYPES)],
+                 id='resource-%s' % index,
+                 name='resource %s' % index)
+        for index in range(size)
+    ]
+    children = {resource: [] for resource in resources}
+    for index in range(1, size):
+        parent_index = (index - 1) // fan_out
+        for extra in range(fan_in):
+            if parent_index - extra < 0:
+                break
+            children[resources[parent_index - extra]].append(
+                resources[index])
+    return resources[:1], children.__getitem__
+
+
+def _peak_memory_mb():
+    """Returns the peak memory allocated since the trace was started"""
+    return tracemalloc.get_traced_memory()[1] / (1024.0 * 1024.0)
+
+
+def run_operation(operation_type, size, fan_out=4, fan_in=1, latency=None,
+                  trace_memory=False):
+    """Builds and runs the resource flow of an operation, timing each phase"""
+    timings = {'peak_memory_mb': None}
+    if trace_memory:
+        tracemalloc.start()
+    workflow_engine = workflow.TaskFlowEngine()
+    plugin = LatencyProtectionPlugin(latency=latency)
+    plugins = {resource_type: plugin
+               for resource_type in constants.RESOURCE_TYPES}
+
+    started_at = time.time()
+    start_nodes, get_child_nodes = build_resources(size, fan_out, fan_in)
+    resource_graph = graph.build_graph(start_nodes, get_child_nodes)
+    timings['graph_build'] = time.time() - started_at
+
+    started_at = time.time()
+    flow = resource_flow.build_resource_flow(operation_type,
+                                             workflow_engine, plugins,
+                                             resource_graph)
+    timings['flow_build'] = time.time() - started_at
+
+    checkpoint_collection = CheckpointCollection(Bank(InMemoryBankPlugin()),
+                                                 InMemoryLeasePlugin())
+    checkpoint = checkpoint_collection.create({
+        'id': 'benchmark', 'name': 'benchmark', 'provider_id': 'benchmark',
+        'project_id': 'benchmark', 'resources': [],
+    })
+    store = resource_flow.build_resource_store(None, resource_graph, None)
+    store['checkpoint'] = checkpoint
+    if operation_type == constants.OPERATION_RESTORE:
+        store['heat_template'] = restore_heat.HeatTemplate()
+        store['restore'] = None
+
+    started_at = time.time()
+    flow_engine = workflow_engine.get_engine(flow, store=store)
+    flow_engine.compile()
+    flow_engine.prepare()
+    timings['engine_compile'] = time.time() - started_at
+
+    started_at = time.time()
+    workflow_engine.run_engine(flow_engine)
+    timings['execution'] = time.time() - started_at
+
+    timings['tasks'] = len(flow)
+    if trace_memory:
+        timings['peak_memory_mb'] = _peak_memory_mb()
+        tracemalloc.stop()
+    return timings
+
+
+def _parse_latency(value):
+    latency = {}
+    for item in value.split(','):
+        if not item:
+            continue
+        hook_type, seconds = item.split('=')
+        if hook_type not in resource_flow.HOOKS:
+            raise argparse.ArgumentTypeError(
+                'unknown hook %s, expected one of %s' % (
+                    hook_type, ', '.join(resource_flow.HOOKS)))
+        latency[hook_type] = float(seconds)
+    return latency
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the resource flows of the protection service')
+    parser.add_argument('--sizes', default='100,200,500',
+                        type=lambda value: [int(size) for size in
+                                            value.split(',')],
+                        help='comma separated numbers of resources')
+    parser.add_argument('--fan-out', default=4, type=int,
+                        help='number of children of every resource')
+    parser.add_argument('--fan-in', default=1, type=int,
+                        help='number of parents of every resource')
+    parser.add_argument('--operations',
+                        default=','.join(OPERATIONS),
+                        type=lambda value: value.split(','),
+                        help='comma separated operation types')
+    parser.add_argument('--latency', default={}, type=_parse_latency,
+                        help='seconds every hook sleeps, e.g. '
+                             '"on_main=0.01,on_complete=0.001"')
+    parser.add_argument('--max-concurrent-tasks', default=0, type=int,
+                        help='limit of the shared task executor')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='report the peak memory allocated by every '
+                             'run, slows the runs down')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    eventlet.monkey_patch()
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+    if args.fan_out < 1 or args.fan_in < 1:
+        sys.exit('fan-out and fan-in must be at least 1')
+    CONF.set_override('max_concurrent_tasks', args.max_concurrent_tasks)
+    # graph.build_graph recurses once per resource level
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 4 * max(args.sizes)))
+
+    header = ('operation', 'resources', 'tasks') + PHASES + ('peak MB',)
+    print('%-10s %9s %7s %12s %12s %15s %12s %9s' % header)
+    for size in args.sizes:
+        for operation_type in args.operations:
+            gc.collect()
+            timings = run_operation(operation_type, size, args.fan_out,
+                                    args.fan_in, args.latency,
+                                    args.trace_memory)
+            peak = timings['peak_memory_mb']
+            print('%-10s %9d %7d %12.3f %12.3f %15.3f %12.3f %9s' % (
+                (operation_type, size, timings['tasks']) +
+                tuple(timings[phase] for phase in PHASES) +
+                ('-' if peak is None else '%.1f' % peak,)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark of the time triggers of the operation engine
+
+Registers an operation to each of many time triggers firing periodically,
+spread evenly over the interval, and reports the time to register and
+unregister the operations, how late the operations were triggered, the
+number of green threads and, with --trace-memory, the peak memory
+allocated by the run, traced with tracemalloc.
+
+Run it with::
+
+    tox -e benchmark-triggers -- --triggers 100000 --interval 10 \\
+        --duration 30
+"""
+
+import argparse
+from datetime import datetime
+from datetime import timedelta
+import gc
+import sys
+import time
+import tracemalloc
+
+import eventlet
+import greenlet
+from oslo_config import cfg
+
+from karbor.services.operationengine.engine.triggers.timetrigger import \
+    time_trigger
+
+CONF = cfg.CONF
+
+
+class IntervalTimeFormat(object):
+    """Time format of the pattern "<offset>/<interval>" in seconds"""
+
+    def __init__(self, start_time, pattern):
+        super(IntervalTimeFormat, self).__init__()
+        offset, interval = pattern.split('/')
+        self._first_time = start_time + timedelta(seconds=float(offset))
+        self._interval = float(interval)
+
+    @classmethod
+    def check_time_format(cls, pattern):
+        pass
+
+    def compute_next_time(self, current_time):
+        if current_time < self._first_time:
+            return self._first_time
+        periods = int((current_time - self._first_time).total_seconds() //
+                      self._interval) + 1
+        return self._first_time + timedelta(
+            seconds=periods * self._interval)
+
+    def get_min_interval(self):
+        return self._interval
+
+
+class BenchmarkTimeTrigger(time_trigger.TimeTrigger):
+    @classmethod
+    def _get_time_format_class(cls):
+        return IntervalTimeFormat
+
+
+class LatencyExecutor(object):
+    """Executor recording how late the operations are triggered"""
+
+    def __init__(self):
+        super(LatencyExecutor, self).__init__()
+        self.latencies = []
+
+    def execute_operation(self, operation_id, triggered_time,
+                          expect_start_time, window):
+        self.latencies.append(
+            (datetime.utcnow() - expect_start_time).total_seconds())
+
+    def execute_operations(self, operation_ids, triggered_time,
+                           expect_start_time, window):
+        for operation_id in operation_ids:
+            self.execute_operation(operation_id, triggered_time,
+                                   expect_start_time, window)
+
+
+def _peak_memory_mb():
+    """Returns the peak memory allocated since the trace was started"""
+    return tracemalloc.get_traced_memory()[1] / (1024.0 * 1024.0)
+
+
+def _green_threads():
+    return len([item for item in gc.get_objects()
+                if isinstance(item, greenlet.greenlet) and item])
+
+
+def run_triggers(triggers, interval, duration, trace_memory=False):
+    """Runs triggers firing every interval seconds for duration seconds
+
+    The interval must be allowed by the min_interval option, and between
+    the min_window_time and max_window_time options.
+    """
+    window = CONF.min_window_time
+    executor = LatencyExecutor()
+    start_time = datetime.utcnow()
+    results = {'peak_memory_mb': None}
+    if trace_memory:
+        tracemalloc.start()
+
+    started_at = time.time()
+    trigger_list = []
+    for index in range(triggers):
+        # the first runs are after an interval, to leave time to register
+        trigger = BenchmarkTimeTrigger(
+            'trigger-%s' % index,
+            {'pattern': '%s/%s' % (interval * (1 + index / float(triggers)),
+                                   interval),
+             'start_time': start_time,
+             'window': window},
+            executor)
+        trigger.register_operation('operation-%s' % index)
+        trigger_list.append(trigger)
+    results['register'] = time.time() - started_at
+    results['green_threads'] = _green_threads()
+
+    eventlet.sleep(duration)
+
+    started_at = time.time()
+    for index, trigger in enumerate(trigger_list):
+        trigger.unregister_operation('operation-%s' % index)
+    results['unregister'] = time.time() - started_at
+
+    latencies = sorted(executor.latencies)
+    results['runs'] = len(latencies)
+    results['latency_p50'] = latencies[len(latencies) // 2] if (
+        latencies) else None
+    results['latency_p99'] = latencies[
+        min(len(latencies) - 1, len(latencies) * 99 // 100)] if (
+        latencies) else None
+    results['latency_max'] = latencies[-1] if latencies else None
+    if trace_memory:
+        results['peak_memory_mb'] = _peak_memory_mb()
+        tracemalloc.stop()
+    return results
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the time triggers of the operation engine')
+    parser.add_argument('--triggers', default=100000, type=int,
+                        help='number of time triggers')
+    parser.add_argument('--interval', default=10, type=int,
+                        help='seconds between two runs of a trigger')
+    parser.add_argument('--duration', default=30, type=int,
+                        help='seconds to run the triggers')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='report the peak memory allocated by the run, '
+                             'slows the triggers down')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    eventlet.monkey_patch()
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+    CONF.set_override('min_interval', args.interval)
+    CONF.set_override('min_window_time', args.interval)
+    CONF.set_override('max_window_time', args.interval * 2)
+
+    results = run_triggers(args.triggers, args.interval, args.duration,
+                           args.trace_memory)
+    print('triggers:             %d' % args.triggers)
+    print('register (s):         %.3f' % results['register'])
+    print('unregister (s):       %.3f' % results['unregister'])
+    print('green threads:        %d' % results['green_threads'])
+    print('runs:                 %d' % results['runs'])
+    if results['runs']:
+        print('latency p50/p99/max:  %.3f / %.3f / %.3f' % (
+            results['latency_p50'], results['latency_p99'],
+            results['latency_max']))
+    if results['peak_memory_mb'] is not None:
+        print('peak memory (MB):     %.1f' % results['peak_memory_mb'])
+
+
+if __name__ == '__main__':
+    main()
@@ -77,6 +77,28 @@ class RestoreApiTest(base.TestCase):
         self.assertRaises(exception.InvalidInput, self.controller.create,
                           req, body)
 
+    @mock.patch(
+        'karbor.services.protection.api.API.restore')
+    @mock.patch(
+        'karbor.objects.restore.Restore.create')
+    def test_restore_create_with_resources(self, mock_restore_create,
+                                           mock_rpc_restore):
+        restore = self._restore_in_request_body()
+        restore['resources'] = ['OS::Nova::Server#server_id']
+        body = {"restore": restore}
+        req = fakes.HTTPRequest.blank('/v1/restores')
+        self.controller.create(req, body)
+        self.assertEqual(['OS::Nova::Server#server_id'],
+                         mock_rpc_restore.call_args[0][3])
+
+    def test_restore_create_InvalidResources(self):
+        restore = self._restore_in_request_body()
+        restore['resources'] = ['server_id']
+        body = {"restore": restore}
+        req = fakes.HTTPRequest.blank('/v1/restores')
+        self.assertRaises(exception.InvalidInput, self.controller.create,
+                          req, body)
+
     @mock.patch(
         'karbor.api.v1.restores.RestoresController._get_all')
     def test_restore_list_detail(self, moak_get_all):
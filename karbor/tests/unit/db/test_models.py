@@ -14,6 +14,7 @@
 
 from datetime import datetime
 from datetime import timedelta
+import mock
 from oslo_config import cfg
 from oslo_utils import uuidutils
 import six
@@ -311,6 +312,16 @@ class ScheduledOperationStateTestCase(base.TestCase):
                           db.scheduled_operation_state_update,
                           self.ctxt, '100', {"state": "success"})
 
+    def test_scheduled_operation_state_bulk_update(self):
+        state_ref = self._create_scheduled_operation_state()
+        operation_id = state_ref['operation_id']
+        updated_ids = db.scheduled_operation_state_bulk_update(
+            self.ctxt, [operation_id, 'unknown_id'], {"state": "triggered"})
+        self.assertEqual([operation_id], updated_ids)
+
+        state_ref = db.scheduled_operation_state_get(self.ctxt, operation_id)
+        self.assertEqual('triggered', state_ref['state'])
+
     def test_scheduled_operation_state_get(self):
         state_ref = self._create_scheduled_operation_state()
         state_ref = db.scheduled_operation_state_get(self.ctxt,
@@ -399,6 +410,37 @@ class ScheduledOperationLogTestCase(base.TestCase):
                           db.scheduled_operation_log_get,
                           self.ctxt, log_ids[2])
 
+    def _test_scheduled_operation_log_delete_all_oldest(self):
+        other_operation_id = '1354ca9ddcd046b693340d78759fd274'
+        log_ids = {}
+        states = ['success', 'in_progress', 'success', 'success']
+        for operation_id in (self.operation_id, other_operation_id):
+            log_ids[operation_id] = []
+            for i in range(4):
+                log = db.scheduled_operation_log_create(self.ctxt, {
+                    'operation_id': operation_id,
+                    'state': states[i],
+                    'created_at': datetime.now() + timedelta(hours=i)})
+                log_ids[operation_id].append(log['id'])
+
+        self.assertEqual(2, db.scheduled_operation_log_delete_all_oldest(
+            self.ctxt, 3))
+        self.assertEqual(2, db.scheduled_operation_log_delete_all_oldest(
+            self.ctxt, 1, ['in_progress'], batch_size=1))
+        for operation_id, ids in log_ids.items():
+            logs = db.scheduled_operation_log_get_all_by_filters_sort(
+                self.ctxt, {'operation_id': operation_id})
+            self.assertEqual(sorted([ids[1], ids[3]]),
+                             sorted(log['id'] for log in logs))
+
+    def test_scheduled_operation_log_delete_all_oldest(self):
+        self._test_scheduled_operation_log_delete_all_oldest()
+
+    @mock.patch('karbor.db.sqlalchemy.api._supports_window_functions',
+                return_value=False)
+    def test_scheduled_operation_log_delete_all_oldest_grouped(self, _):
+        self._test_scheduled_operation_log_delete_all_oldest()
+
     def test_scheduled_operation_log_update(self):
         log_ref = self._create_scheduled_operation_log()
         log_id = log_ref['id']
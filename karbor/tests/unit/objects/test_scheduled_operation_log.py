@@ -101,6 +101,14 @@ class TestScheduledOperationLogList(test_objects.BaseObjectsTestCase):
         log1 = logs.objects[0]
         self.assertEqual(log.id, log1.id)
 
+    @mock.patch('karbor.db.scheduled_operation_log_delete_all_oldest')
+    def test_destroy_oldest(self, delete_all_oldest):
+        delete_all_oldest.return_value = 3
+        self.assertEqual(3, objects.ScheduledOperationLogList.destroy_oldest(
+            self.context, 5, ['in_progress'], 100))
+        delete_all_oldest.assert_called_once_with(
+            self.context, 5, ['in_progress'], 100)
+
     def _create_operation_log(self, operation_id):
         log_info = {
             'operation_id': operation_id,
@@ -104,6 +104,15 @@ class TestScheduledOperationStateList(test_objects.BaseObjectsTestCase):
         self.assertEqual(state.id, state1.id)
         self.assertEqual(operation.id, state1.operation.id)
 
+    def test_bulk_update(self):
+        service, trigger, operation, state = FakeEnv(self.context).do_init()
+        updated_ids = objects.ScheduledOperationStateList.bulk_update(
+            self.context, [operation.id], {'state': 'running'})
+        self.assertEqual([operation.id], updated_ids)
+        state = objects.ScheduledOperationState.get_by_operation_id(
+            self.context, operation.id)
+        self.assertEqual('running', state.state)
+
 
 class FakeEnv(object):
 
@@ -11,6 +11,7 @@
 #    under the License.
 
 import eventlet
+import mock
 
 from datetime import datetime
 from datetime import timedelta
@@ -27,9 +28,11 @@ class FakeOperationManager(object):
     def __init__(self):
         super(FakeOperationManager, self).__init__()
         self._op_id = 0
+        self._run_ops = []
 
     def run_operation(self, operation_type, operation_definition, **kwargs):
         self._op_id = kwargs['param']['operation_id']
+        self._run_ops.append(self._op_id)
         return
 
 
@@ -70,6 +73,171 @@ class GreenThreadExecutorTestCase(base.TestCase):
         self.assertIsNotNone(state.end_time_for_run)
         self.assertEqual(constants.OPERATION_STATE_REGISTERED, state.state)
 
+    def test_execute_operations(self):
+        operation = self._create_operation()
+        self._create_operation_state(operation.id, 0)
+        now = datetime.utcnow()
+        window_time = 30
+        with mock.patch.object(
+                objects.ScheduledOperationStateList, 'bulk_update',
+                wraps=objects.ScheduledOperationStateList.bulk_update
+        ) as bulk_update:
+            self._executor.execute_operations(
+                [self._op_id, operation.id, 'unknown_id'], now, now,
+                window_time)
+        self.assertEqual(1, bulk_update.call_count)
+        self.assertEqual({self._op_id, operation.id},
+                         set(self._executor._operation_thread_map))
+
+        eventlet.sleep(1)
+
+        self.assertTrue(not self._executor._operation_thread_map)
+        for op_id in (self._op_id, operation.id):
+            state = objects.ScheduledOperationState.get_by_operation_id(
+                self.context, op_id)
+            self.assertEqual(now + timedelta(seconds=window_time),
+                             state.end_time_for_run)
+            self.assertEqual(constants.OPERATION_STATE_REGISTERED,
+                             state.state)
+
+    def test_free_slots(self):
+        self.assertIsNone(self._executor.free_slots())
+
+        self.override_config('max_concurrent_operations', 2,
+                             group='operationengine')
+        self.assertEqual(2, self._executor.free_slots())
+        now = datetime.utcnow()
+        self._executor.execute_operation(self._op_id, now, now, 30)
+        self.assertEqual(1, self._executor.free_slots())
+
+    def test_defer_operation_when_full(self):
+        self.override_config('max_concurrent_operations', 1,
+                             group='operationengine')
+        operation = self._create_operation()
+        self._create_operation_state(operation.id, 0)
+        now = datetime.utcnow()
+        self._executor.execute_operations([self._op_id, operation.id],
+                                          now, now, 30)
+        self.assertEqual([self._op_id],
+                         list(self._executor._operation_thread_map))
+        self.assertIn(operation.id, self._executor._deferred_entries)
+
+        eventlet.sleep(1)
+
+        self.assertEqual([self._op_id, operation.id],
+                         self._operation_manager._run_ops)
+        self.assertFalse(self._executor._deferred_entries)
+
+    def test_defer_operation_when_running(self):
+        now = datetime.utcnow()
+        self._executor.execute_operation(self._op_id, now, now, 30)
+        self._executor.execute_operation(self._op_id, now, now, 30)
+        self.assertIn(self._op_id, self._executor._deferred_entries)
+
+        eventlet.sleep(1)
+
+        self.assertEqual([self._op_id] * 2, self._operation_manager._run_ops)
+
+    def test_drop_deferred_operation_out_of_window(self):
+        self.override_config('max_concurrent_operations', 1,
+                             group='operationengine')
+        operation = self._create_operation()
+        self._create_operation_state(operation.id, 0)
+        now = datetime.utcnow()
+        self._executor.execute_operation(self._op_id, now, now, 30)
+        self._executor.execute_operation(
+            operation.id, now, now - timedelta(seconds=30), 30)
+
+        eventlet.sleep(1)
+
+        self.assertEqual([self._op_id], self._operation_manager._run_ops)
+        logs = objects.ScheduledOperationLogList.get_by_filters(
+            self.context, {'operation_id': operation.id})
+        self.assertEqual(
+            [constants.OPERATION_EXE_STATE_DROPPED_OUT_OF_WINDOW],
+            [log.state for log in logs])
+
+    def test_drop_latest_deferred_operation_when_full(self):
+        self.override_config('max_concurrent_operations', 1,
+                             group='operationengine')
+        self.override_config('max_deferred_operations', 1,
+                             group='operationengine')
+        later_operation = self._create_operation()
+        self._create_operation_state(later_operation.id, 0)
+        operation = self._create_operation()
+        self._create_operation_state(operation.id, 0)
+        now = datetime.utcnow()
+        self._executor.execute_operation(self._op_id, now, now, 30)
+        self._executor.execute_operation(later_operation.id, now, now, 60)
+        self._executor.execute_operation(operation.id, now, now, 30)
+        self.assertEqual([operation.id],
+                         list(self._executor._deferred_entries))
+
+        eventlet.sleep(1)
+
+        self.assertEqual([self._op_id, operation.id],
+                         self._operation_manager._run_ops)
+        logs = objects.ScheduledOperationLogList.get_by_filters(
+            self.context, {'operation_id': later_operation.id})
+        self.assertEqual(
+            [constants.OPERATION_EXE_STATE_DROPPED_QUEUE_FULL],
+            [log.state for log in logs])
+
+    def test_drop_new_operation_when_full(self):
+        self.override_config('max_concurrent_operations', 1,
+                             group='operationengine')
+        self.override_config('max_deferred_operations', 1,
+                             group='operationengine')
+        operation = self._create_operation()
+        self._create_operation_state(operation.id, 0)
+        later_operation = self._create_operation()
+        self._create_operation_state(later_operation.id, 0)
+        now = datetime.utcnow()
+        self._executor.execute_operation(self._op_id, now, now, 30)
+        self._executor.execute_operation(operation.id, now, now, 30)
+        self._executor.execute_operation(later_operation.id, now, now, 60)
+
+        eventlet.sleep(1)
+
+        self.assertEqual([self._op_id, operation.id],
+                         self._operation_manager._run_ops)
+        logs = objects.ScheduledOperationLogList.get_by_filters(
+            self.context, {'operation_id': later_operation.id})
+        self.assertEqual(
+            [constants.OPERATION_EXE_STATE_DROPPED_QUEUE_FULL],
+            [log.state for log in logs])
+
+    def test_drop_expired_operations_on_execute(self):
+        self.override_config('max_concurrent_operations', 1,
+                             group='operationengine')
+        operation = self._create_operation()
+        self._create_operation_state(operation.id, 0)
+        other_operation = self._create_operation()
+        self._create_operation_state(other_operation.id, 0)
+        now = datetime.utcnow()
+        self._executor.execute_operation(self._op_id, now, now, 30)
+        self._executor.execute_operation(
+            operation.id, now, now - timedelta(seconds=30), 30)
+        self._executor.execute_operation(other_operation.id, now, now, 30)
+
+        self.assertEqual([other_operation.id],
+                         list(self._executor._deferred_entries))
+        logs = objects.ScheduledOperationLogList.get_by_filters(
+            self.context, {'operation_id': operation.id})
+        self.assertEqual(
+            [constants.OPERATION_EXE_STATE_DROPPED_OUT_OF_WINDOW],
+            [log.state for log in logs])
+
+    def test_cancel_deferred_operation(self):
+        now = datetime.utcnow()
+        self._executor.execute_operation(self._op_id, now, now, 30)
+        self._executor.execute_operation(self._op_id, now, now, 30)
+        self._executor.cancel_operation(self._op_id)
+
+        eventlet.sleep(1)
+
+        self.assertEqual([], self._operation_manager._run_ops)
+
     def test_resume_operation(self):
         now = datetime.utcnow()
         window_time = 30
@@ -17,6 +17,10 @@ import mock
 from oslo_config import cfg
 
 from karbor import exception
+from karbor.services.operationengine.engine.triggers.timetrigger import \
+    time_trigger
+from karbor.services.operationengine.engine.triggers.timetrigger.time_trigger \
+    import TimerScheduler
 from karbor.services.operationengine.engine.triggers.timetrigger.time_trigger \
     import TimeTrigger
 from karbor.tests import base
@@ -41,6 +45,7 @@ class FakeExecutor(object):
     def __init__(self):
         super(FakeExecutor, self).__init__()
         self._ops = {}
+        self.slots = None
 
     def execute_operation(self, operation_id, triggered_time,
                           expect_start_time, window):
@@ -49,8 +54,66 @@ class FakeExecutor(object):
         self._ops[operation_id] += 1
         eventlet.sleep(0.5)
 
+    def execute_operations(self, operation_ids, triggered_time,
+                           expect_start_time, window):
+        for operation_id in operation_ids:
+            self.execute_operation(operation_id, triggered_time,
+                                   expect_start_time, window)
+
+    def free_slots(self):
+        return self.slots
+
     def clear(self):
         self._ops.clear()
+        self.slots = None
+
+
+class TimerSchedulerTestCase(base.TestCase):
+
+    def setUp(self):
+        super(TimerSchedulerTestCase, self).setUp()
+        self._scheduler = TimerScheduler()
+        self._runs = []
+
+    def _function(self, name, runs=1):
+        def _run(expect_run_time):
+            self._runs.append(name)
+            if self._runs.count(name) < runs:
+                return expect_run_time + timedelta(seconds=0.1)
+        return _run
+
+    def test_run_in_time_order(self):
+        now = datetime.utcnow()
+        self._scheduler.schedule(now, self._function('second'))
+        self._scheduler.schedule(now - timedelta(seconds=1),
+                                 self._function('first'))
+        eventlet.sleep(0.1)
+
+        self.assertEqual(['first', 'second'], self._runs)
+        self.assertEqual(0, len(self._scheduler))
+
+    def test_kill(self):
+        later = datetime.utcnow() + timedelta(seconds=1.5)
+        timers = [self._scheduler.schedule(later, self._function(str(i)))
+                  for i in range(4)]
+        self.assertEqual(4, len(self._scheduler))
+
+        for timer in timers[:3]:
+            timer.kill()
+            self.assertFalse(timer.running)
+        self.assertEqual(1, len(self._scheduler))
+
+        timers[3].kill()
+        eventlet.sleep(1.6)
+        self.assertEqual([], self._runs)
+
+    def test_reschedule(self):
+        timer = self._scheduler.schedule(datetime.utcnow(),
+                                         self._function('timer', runs=3))
+        eventlet.sleep(0.1)
+        self.assertEqual(['timer'] * 3, self._runs)
+        self.assertFalse(timer.running)
+        self.assertIsNone(timer.pre_run_time)
 
 
 class TimeTriggerTestCase(base.TestCase):
@@ -73,6 +136,14 @@ class TimeTriggerTestCase(base.TestCase):
                                TimeTrigger.check_configuration)
         self._set_configuration()
 
+    def test_get_timer(self):
+        start_time = datetime(2016, 1, 20, 15, 11, 0)
+        timer = TimeTrigger._get_timer(FakeTimeFormat, start_time, '* * *')
+        self.assertIs(timer, TimeTrigger._get_timer(FakeTimeFormat,
+                                                    start_time, '* * *'))
+        self.assertIsNot(timer, TimeTrigger._get_timer(FakeTimeFormat,
+                                                       start_time, '* *'))
+
     def test_check_trigger_property_start_time(self):
         trigger_property = {
             "pattern": "",
@@ -167,6 +238,7 @@ class TimeTriggerTestCase(base.TestCase):
         self.assertNotIn(operation_id, trigger._operation_ids)
 
     def test_unregister_operation_when_scheduling(self):
+        self.override_config('trigger_dispatch_batch_size', 1)
         trigger = self._generate_trigger()
 
         for op_id in ['1', '2', '3']:
@@ -184,6 +256,70 @@ class TimeTriggerTestCase(base.TestCase):
         self.assertTrue(('2' not in trigger._executor._ops) or (
             '3' not in trigger._executor._ops))
 
+    def test_trigger_operations_in_batches(self):
+        self.override_config('trigger_dispatch_batch_size', 2)
+        trigger = self._generate_trigger()
+        for op_id in ['1', '2', '3']:
+            trigger.register_operation(op_id)
+
+        with mock.patch.object(self._default_executor,
+                               'execute_operations') as execute_operations:
+            trigger._trigger_operations(
+                datetime.utcnow(), trigger._trigger_property,
+                FakeTimeFormat(None, None))
+        batches = [call[0][0] for call in execute_operations.call_args_list]
+        self.assertEqual([2, 1], [len(batch) for batch in batches])
+        self.assertEqual({'1', '2', '3'}, set(sum(batches, [])))
+
+    def test_dispatch_offset(self):
+        offsets = [time_trigger._dispatch_offset(str(i)) for i in range(100)]
+        self.assertEqual(offsets, [time_trigger._dispatch_offset(str(i))
+                                   for i in range(100)])
+        self.assertTrue(all(0 <= offset < 1 for offset in offsets))
+        self.assertGreater(len(set(offsets)), 90)
+
+    def test_spread_batch_end(self):
+        trigger = self._generate_trigger()
+        now = datetime.utcnow()
+        operation_ids = ['1', '2', '3', '4']
+        start_times = {
+            '1': now - timedelta(seconds=2),
+            '2': now - timedelta(seconds=1),
+            '3': now,
+            '4': now + timedelta(seconds=1),
+        }
+        self.assertEqual(3, trigger._spread_batch_end(
+            operation_ids, 0, 4, start_times, now))
+        self.assertEqual(2, trigger._spread_batch_end(
+            operation_ids, 0, 2, start_times, now))
+        self.assertEqual(3, trigger._spread_batch_end(
+            operation_ids, 3, 4, start_times, now))
+
+        self._default_executor.slots = 1
+        self.assertEqual(2, trigger._spread_batch_end(
+            operation_ids, 1, 4, start_times, now))
+        self._default_executor.slots = 0
+        self.assertEqual(0, trigger._spread_batch_end(
+            operation_ids, 0, 4, start_times, now))
+
+    def test_trigger_operations_spread(self):
+        self.override_config('trigger_dispatch_spread', 0.5)
+        trigger = self._generate_trigger()
+        for op_id in ['1', '2', '3']:
+            trigger.register_operation(op_id)
+
+        # the window of the run is almost over, all the operations are due
+        expect_run_time = datetime.utcnow() - timedelta(seconds=14)
+        with mock.patch.object(self._default_executor,
+                               'execute_operations') as execute_operations:
+            trigger._trigger_operations(
+                expect_run_time, trigger._trigger_property,
+                FakeTimeFormat(None, None))
+        batch = execute_operations.call_args[0][0]
+        self.assertEqual(
+            sorted(['1', '2', '3'], key=time_trigger._dispatch_offset),
+            batch)
+
     def test_update_trigger_property(self):
         trigger = self._generate_trigger()
 
@@ -0,0 +1,37 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from datetime import datetime
+from datetime import timedelta
+
+from karbor.tests.benchmark import trigger_benchmark
+from karbor.tests import base
+
+
+class TriggerBenchmarkTest(base.TestCase):
+    def test_interval_time_format(self):
+        start_time = datetime(2017, 1, 1)
+        time_format = trigger_benchmark.IntervalTimeFormat(start_time, '5/10')
+        self.assertEqual(start_time + timedelta(seconds=5),
+                         time_format.compute_next_time(start_time))
+        self.assertEqual(
+            start_time + timedelta(seconds=15),
+            time_format.compute_next_time(start_time + timedelta(seconds=5)))
+
+    def test_run_triggers(self):
+        self.override_config('min_interval', 1)
+        self.override_config('min_window_time', 1)
+        self.override_config('max_window_time', 2)
+        results = trigger_benchmark.run_triggers(20, 1, 2.1,
+                                                 trace_memory=True)
+        self.assertGreaterEqual(results['runs'], 20)
+        self.assertGreater(results['peak_memory_mb'], 0.0)
@@ -13,6 +13,7 @@
 import re
 
 from datetime import datetime
+import mock
 from oslo_serialization import jsonutils
 
 from karbor import exception
@@ -173,3 +174,32 @@ class CalendarTimeTestCase(base.TestCase):
         dtstart = datetime(2016, 2, 20, 17, 0, 0)
         time_obj = calendar_time.ICal(dtstart, pattern)
         self.assertIsNone(time_obj.get_min_interval())
+
+    def test_get_min_interval_cached(self):
+        pattern = (
+            "BEGIN:VEVENT\n"
+            "RRULE:FREQ=WEEKLY;INTERVAL=1;BYHOUR=17;BYMINUTE=1\n"
+            "END:VEVENT"
+        )
+        dtstart = datetime(2016, 2, 20, 17, 0, 0)
+        time_obj = calendar_time.ICal(dtstart, pattern)
+        with mock.patch.object(time_obj, '_compute_min_interval',
+                               return_value=604800) as compute:
+            self.assertEqual(604800, time_obj.get_min_interval())
+            self.assertEqual(604800, time_obj.get_min_interval())
+            self.assertEqual(1, compute.call_count)
+
+    def test_iter_next_times(self):
+        pattern = (
+            "BEGIN:VEVENT\n"
+            "RRULE:FREQ=WEEKLY;BYDAY=MO,WE,FR;BYHOUR=10;BYMINUTE=0\n"
+            "RRULE:FREQ=WEEKLY;BYDAY=TU,TH,SA;BYHOUR=20;BYMINUTE=0\n"
+            "END:VEVENT"
+        )
+        dtstart = datetime(2016, 2, 20, 17, 0, 0)
+        time_obj = calendar_time.ICal(dtstart, pattern)
+        times = time_obj.iter_next_times(datetime(2016, 7, 31, 15, 11, 0))
+        self.assertEqual([datetime(2016, 8, 1, 10, 0, 0),
+                          datetime(2016, 8, 2, 20, 0, 0),
+                          datetime(2016, 8, 3, 10, 0, 0)],
+                         [next(times) for _ in range(3)])
@@ -12,8 +12,11 @@
 
 from datetime import datetime
 from datetime import timedelta
+import mock
 
 from karbor import exception
+from karbor.services.operationengine.engine.triggers.timetrigger import \
+    timeformats
 from karbor.services.operationengine.engine.triggers.timetrigger.timeformats \
     import crontab_time
 from karbor.tests import base
@@ -48,3 +51,29 @@ class CrontabTimeTestCase(base.TestCase):
     def test_get_interval(self):
         obj = self._time_format(datetime.now(), "* * * * *")
         self.assertEqual(60, obj.get_min_interval())
+
+    def test_get_min_interval_cached(self):
+        obj = self._time_format(datetime.now(), "* * * * *")
+        with mock.patch.object(crontab_time, 'croniter',
+                               wraps=crontab_time.croniter) as mock_croniter:
+            self.assertEqual(60, obj.get_min_interval())
+            self.assertEqual(60, obj.get_min_interval())
+        self.assertEqual(1, mock_croniter.call_count)
+
+    def test_iter_next_times(self):
+        now = datetime(2016, 1, 20, 15, 11, 0, 0)
+        obj = self._time_format(now, "* * * * *")
+        times = obj.iter_next_times(now)
+        self.assertEqual(now + timedelta(minutes=1), next(times))
+        self.assertEqual(now + timedelta(minutes=2), next(times))
+
+    def test_next_time_iterator(self):
+        now = datetime(2016, 1, 20, 15, 11, 0, 0)
+        obj = timeformats.NextTimeIterator(
+            self._time_format(now, "*/5 * * * *"))
+        for minutes in (1, 4, 5, 12, 3):
+            current_time = now + timedelta(minutes=minutes)
+            self.assertEqual(
+                self._time_format(now, "*/5 * * * *").compute_next_time(
+                    current_time),
+                obj.compute_next_time(current_time))
@@ -11,15 +11,23 @@
 #    under the License.
 
 from datetime import datetime
+from keystoneauth1 import access
+from keystoneauth1 import fixture
 import mock
+import oslo_messaging as messaging
 
 from karbor.common import constants
+from karbor.common import karbor_keystone_plugin
 from karbor import context
 from karbor import exception
 from karbor import objects
+from karbor.services.operationengine import karbor_client
 from karbor.services.operationengine.operations import base as base_operation
 from karbor.services.operationengine.operations import protect_operation
+from karbor.services.protection import client_factory
+from karbor.services.protection import rpcapi as protection_rpcapi
 from karbor.tests import base
+from karbor.tests.unit import fake_plan
 
 
 class FakeUserTrustManager(object):
@@ -32,6 +40,23 @@ class FakeUserTrustManager(object):
     def resume_operation(self, operation_id, user_id, project_id, trust_id):
         pass
 
+    def register_drop_callback(self, callback):
+        pass
+
+    def get_token(self, user_id, project_id):
+        return 'token'
+
+    def get_context(self, user_id, project_id):
+        token = fixture.V3Token(user_id=user_id, project_id=project_id)
+        token.add_role(name='member')
+        service = token.add_service('compute', name='nova')
+        service.add_standard_endpoints(
+            public='http://127.0.0.1:8774/v2.1/%s' % project_id)
+        session = mock.Mock()
+        session.auth.get_access.return_value = access.create(
+            body=token, auth_token='token')
+        return karbor_keystone_plugin.get_session_context(session)
+
 
 class FakeCheckPoint(object):
     def create(self, provider_id, plan_id):
@@ -60,6 +85,20 @@ class ProtectOperationTestCase(base.TestCase):
         self._operation_db = self._create_operation()
         self._fake_karbor_client = FakeKarborClient()
 
+    @mock.patch.object(karbor_client, 'create')
+    def test_karbor_client_dropped_with_trust(self, mock_create):
+        user_trust_manager = mock.MagicMock()
+        user_trust_manager.get_token.return_value = 'token'
+        operation = protect_operation.ProtectOperation(user_trust_manager)
+        operation._karbor_endpoint = 'http://karbor/%(project_id)s'
+        client = operation._create_karbor_client('user', 'project')
+        self.assertIs(client, operation._create_karbor_client(
+            'user', 'project'))
+
+        drop = user_trust_manager.register_drop_callback.call_args[0][0]
+        drop('user', 'project')
+        self.assertEqual({}, operation._karbor_clients)
+
     def test_check_operation_definition(self):
         self.assertRaises(exception.InvalidOperationDefinition,
                           self._operation.check_operation_definition,
@@ -67,6 +106,7 @@ class ProtectOperationTestCase(base.TestCase):
 
     @mock.patch.object(base_operation.Operation, '_create_karbor_client')
     def test_execute(self, client):
+        self.override_config('protect_dispatch', 'rest', 'operationengine')
         client.return_value = self._fake_karbor_client
         now = datetime.utcnow()
         param = {
@@ -93,6 +133,7 @@ class ProtectOperationTestCase(base.TestCase):
 
     @mock.patch.object(base_operation.Operation, '_create_karbor_client')
     def test_resume(self, client):
+        self.override_config('protect_dispatch', 'rest', 'operationengine')
         log = self._create_operation_log(self._operation_db.id)
         client.return_value = self._fake_karbor_client
         now = datetime.utcnow()
@@ -118,6 +159,89 @@ class ProtectOperationTestCase(base.TestCase):
         log1 = logs.objects[0]
         self.assertTrue(log.id, log1.id)
 
+    @mock.patch.object(protection_rpcapi.ProtectionAPI, 'protect')
+    @mock.patch.object(objects.Plan, 'get_by_id')
+    def test_protect_by_rpc(self, get_plan, protect):
+        db_plan = fake_plan.fake_db_plan()
+        get_plan.return_value = objects.Plan._from_db_object(
+            context.get_admin_context(), objects.Plan(), db_plan)
+        operation_definition = {'provider_id': db_plan['provider_id'],
+                                'plan_id': db_plan['id']}
+        param = {'operation_id': self._operation_db.id,
+                 'user_id': '123', 'project_id': '456'}
+        self._operation._protect(operation_definition, param)
+
+        ctxt, plan, checkpoint_properties = protect.call_args[0]
+        self.assertEqual('token', ctxt.auth_token)
+        self.assertEqual('456', ctxt.project_id)
+        self.assertEqual('456', checkpoint_properties['project_id'])
+        self.assertEqual(db_plan['id'],
+                         checkpoint_properties['protection_plan']['id'])
+
+        # the protection service creates the clients of the flow from it
+        with mock.patch.object(karbor_keystone_plugin.KarborKeystonePlugin,
+                               'auth_uri', new_callable=mock.PropertyMock,
+                               return_value='http://127.0.0.1/identity/v3'):
+            nova = client_factory.ClientFactory.create_client('nova', ctxt)
+        self.assertIsNotNone(nova.client.session)
+        self.assertEqual('http://127.0.0.1:8774/v2.1/456',
+                         nova.client.endpoint_override)
+
+    @mock.patch.object(protection_rpcapi.ProtectionAPI, 'protect')
+    @mock.patch.object(objects.Plan, 'get_by_id')
+    def test_protect_by_rpc_not_authorized(self, get_plan, protect):
+        operation_definition = {'provider_id': 'fake_provider',
+                                'plan_id': 'fake_plan'}
+        param = {'operation_id': self._operation_db.id,
+                 'user_id': '123', 'project_id': '456'}
+        with mock.patch.object(protect_operation.policy, 'enforce_action',
+                               side_effect=exception.PolicyNotAuthorized(
+                                   action='provider:checkpoint_create')):
+            self.assertRaises(exception.PolicyNotAuthorized,
+                              self._operation._protect,
+                              operation_definition, param)
+        self.assertFalse(protect.called)
+
+    @mock.patch.object(protect_operation.ProtectOperation,
+                       '_protect_by_rest')
+    @mock.patch.object(protection_rpcapi.ProtectionAPI, 'protect')
+    @mock.patch.object(objects.Plan, 'get_by_id')
+    def test_protect_by_rpc_fallback(self, get_plan, protect, by_rest):
+        db_plan = fake_plan.fake_db_plan()
+        get_plan.return_value = objects.Plan._from_db_object(
+            context.get_admin_context(), objects.Plan(), db_plan)
+        operation_definition = {'provider_id': db_plan['provider_id'],
+                                'plan_id': db_plan['id']}
+        param = {'operation_id': self._operation_db.id,
+                 'user_id': '123', 'project_id': '456'}
+
+        protect.side_effect = messaging.MessageDeliveryFailure()
+        self._operation._protect(operation_definition, param)
+        by_rest.assert_called_once_with(operation_definition, param)
+
+        # the checkpoint may have been created, no fallback
+        protect.side_effect = messaging.MessagingTimeout()
+        self.assertRaises(messaging.MessagingTimeout,
+                          self._operation._protect,
+                          operation_definition, param)
+        self.assertEqual(1, by_rest.call_count)
+
+    @mock.patch.object(karbor_client, 'create')
+    def test_reuse_karbor_client(self, create):
+        self._operation._karbor_endpoint = 'http://127.0.0.1/%(project_id)s'
+        client = self._operation._create_karbor_client('123', '123')
+        self.assertIs(client,
+                      self._operation._create_karbor_client('123', '123'))
+        self.assertEqual(1, create.call_count)
+
+        self._operation._create_karbor_client('123', '456')
+        self.assertEqual(2, create.call_count)
+
+        with mock.patch.object(FakeUserTrustManager, 'get_token',
+                               return_value='new-token'):
+            self._operation._create_karbor_client('123', '123')
+        self.assertEqual(3, create.call_count)
+
     def _create_operation(self):
         operation_info = {
             'name': 'protect vm',
@@ -11,21 +11,28 @@
 #    under the License.
 
 import mock
+from oslo_config import cfg
 from oslo_messaging.rpc import dispatcher as rpc_dispatcher
 
 from karbor.common import constants
 from karbor import context
 from karbor import exception
 from karbor import objects
+from karbor.services.operationengine import api as engine_api
 from karbor.services.operationengine import manager as service_manager
+from karbor.services.operationengine import partitioner
 from karbor.tests import base
 
+cfg.CONF.import_opt('time_format', 'karbor.services.operationengine.engine.'
+                    'triggers.timetrigger.time_trigger')
+
 
 class FakeTriggerManager(object):
 
     def __init__(self):
         super(FakeTriggerManager, self).__init__()
         self._trigger = {}
+        self._properties = {}
 
     def register_operation(self, trigger_id, operation_id, **kwargs):
         if trigger_id not in self._trigger:
@@ -37,22 +44,40 @@ class FakeTriggerManager(object):
         self._trigger[trigger_id].append(operation_id)
 
     def unregister_operation(self, trigger_id, operation_id, **kwargs):
-        pass
+        if operation_id in self._trigger.get(trigger_id, []):
+            self._trigger[trigger_id].remove(operation_id)
 
     def add_trigger(self, trigger_id, trigger_type, trigger_property):
         self._trigger[trigger_id] = []
+        self._properties[trigger_id] = trigger_property
+
+    def remove_trigger(self, trigger_id):
+        if trigger_id not in self._trigger:
+            raise exception.TriggerNotFound(id=trigger_id)
+        del self._trigger[trigger_id]
+
+    def update_trigger(self, trigger_id, trigger_property):
+        if trigger_id not in self._trigger:
+            raise exception.TriggerNotFound(id=trigger_id)
+        self._properties[trigger_id] = trigger_property
 
 
 class FakeUserTrustManager(object):
     def add_operation(self, context, operation_id):
         return "123"
 
+    def release_operation(self, operation_id):
+        pass
+
     def delete_operation(self, context, operation_id):
         pass
 
     def resume_operation(self, operation_id, user_id, project_id, trust_id):
         pass
 
+    def register_drop_callback(self, callback):
+        pass
+
 
 class OperationEngineManagerTestCase(base.TestCase):
     """Test cases for OperationEngineManager class."""
@@ -85,6 +110,140 @@ class OperationEngineManagerTestCase(base.TestCase):
         self.assertIn(operation_id, trigger_manager._trigger[trigger_id])
         self.assertNotIn(op.id, trigger_manager._trigger[trigger_id])
 
+    def test_restore_in_pages(self):
+        self.override_config('restore_page_size', 1, 'operationengine')
+        trigger = self._create_one_trigger()
+        operations = [self._operation,
+                      self._create_scheduled_operation(trigger.id),
+                      self._create_scheduled_operation(trigger.id)]
+        for operation in operations:
+            self._create_operation_state(operation.id)
+
+        self.manager._restore()
+
+        trigger_manager = self.manager._trigger_manager
+        self.assertEqual([self._operation.id],
+                         trigger_manager._trigger[self._trigger.id])
+        self.assertEqual(sorted(op.id for op in operations[1:]),
+                         sorted(trigger_manager._trigger[trigger.id]))
+
+    @mock.patch.object(FakeTriggerManager, 'add_trigger')
+    @mock.patch.object(FakeTriggerManager, 'register_operation')
+    def test_register_operation_loads_trigger(self, register, add_trigger):
+        register.side_effect = [
+            exception.TriggerNotFound(id=self._trigger.id), None]
+        self.manager.resume_scheduled_operation(
+            self.ctxt, self._operation.id, self._trigger.id)
+        add_trigger.assert_called_once_with(
+            self._trigger.id, self._trigger.type, self._trigger.properties)
+        self.assertEqual(2, register.call_count)
+        self.assertIn(self._operation.id, self.manager._operations)
+
+    def _cast_to(self, managers):
+        def cast(ctxt, method, **kwargs):
+            for manager in managers:
+                getattr(manager, method)(ctxt, **kwargs)
+        return cast
+
+    def test_update_and_delete_trigger(self):
+        self.override_config('time_format', 'crontab')
+        # the trigger is loaded by this service only, not by the other one
+        # which a call would have been sent to
+        other_manager = service_manager.OperationEngineManager()
+        other_manager._trigger_manager = FakeTriggerManager()
+        trigger_manager = self.manager._trigger_manager
+        trigger_manager.add_trigger(self._trigger.id, self._trigger.type,
+                                    self._trigger.properties)
+        api = engine_api.API()
+        properties = {
+            "format": "crontab",
+            "pattern": "0 * * * *",
+            "start_time": "2026-01-01 00:00:00",
+            "window": "900",
+        }
+
+        with mock.patch.object(api.operationengine_rpcapi._client,
+                               'prepare') as prepare:
+            prepare.return_value.cast.side_effect = self._cast_to(
+                [other_manager, self.manager])
+            self._trigger.properties = properties
+            api.update_trigger(self.ctxt, self._trigger)
+            self.assertEqual(properties,
+                             trigger_manager._properties[self._trigger.id])
+
+            api.delete_trigger(self.ctxt, self._trigger.id)
+            self.assertNotIn(self._trigger.id, trigger_manager._trigger)
+
+        prepare.assert_called_with(fanout=True)
+        self.assertEqual(2, prepare.return_value.cast.call_count)
+        self.assertFalse(prepare.return_value.call.called)
+        self.assertEqual({}, other_manager._trigger_manager._trigger)
+
+    def test_update_trigger_invalid_properties(self):
+        self.override_config('time_format', 'crontab')
+        api = engine_api.API()
+        self._trigger.properties = {"format": "crontab",
+                                    "pattern": "* * * * *"}
+        with mock.patch.object(api.operationengine_rpcapi._client,
+                               'prepare') as prepare:
+            self.assertRaises(exception.InvalidInput, api.update_trigger,
+                              self.ctxt, self._trigger)
+        self.assertFalse(prepare.return_value.cast.called)
+
+    @mock.patch('karbor.services.operationengine.partitioner.'
+                'get_live_hosts')
+    def test_rebalance_operations(self, get_live_hosts):
+        get_live_hosts.return_value = set()
+        self.manager._refresh_ring()
+        operations = [self._operation] + [
+            self._create_scheduled_operation(self._trigger.id)
+            for _ in range(9)]
+        for operation in operations:
+            self._create_operation_state(operation.id)
+        self.manager._restore()
+        trigger_manager = self.manager._trigger_manager
+        self.assertEqual(10, len(trigger_manager._trigger[self._trigger.id]))
+
+        get_live_hosts.return_value = {'other-host'}
+        self.manager._rebalance_operations(self.ctxt)
+        ring = partitioner.HashRing([self.manager.host, 'other-host'])
+        owned = sorted(op.id for op in operations
+                       if ring.get_host(op.id) == self.manager.host)
+        self.assertEqual(
+            owned, sorted(trigger_manager._trigger[self._trigger.id]))
+        self.assertEqual(owned, sorted(self.manager._operations))
+
+        get_live_hosts.return_value = set()
+        self.manager._rebalance_operations(self.ctxt)
+        self.assertEqual(10, len(trigger_manager._trigger[self._trigger.id]))
+
+    @mock.patch.object(objects.ScheduledOperationLogList, 'destroy_oldest')
+    def test_sweep_operation_logs(self, destroy_oldest):
+        self.override_config('retained_operation_log_number', 3)
+        self.override_config('operation_log_sweep_batch_size', 10,
+                             'operationengine')
+        self.manager._sweep_operation_logs(self.ctxt)
+        destroy_oldest.assert_called_once_with(
+            mock.ANY, 3, [constants.OPERATION_EXE_STATE_IN_PROGRESS], 10)
+
+        destroy_oldest.reset_mock()
+        self.manager._ring = partitioner.HashRing(['other-host'])
+        self.manager._sweep_operation_logs(self.ctxt)
+        destroy_oldest.assert_not_called()
+
+    @mock.patch.object(FakeUserTrustManager, 'resume_operation')
+    def test_restore_operation_failed(self, resume_operation):
+        resume_operation.side_effect = [Exception(), None]
+        op = self._create_scheduled_operation(self._trigger.id)
+        self._create_operation_state(self._operation.id)
+        self._create_operation_state(op.id)
+
+        self.manager._restore()
+
+        self.assertEqual(2, resume_operation.call_count)
+        trigger_manager = self.manager._trigger_manager
+        self.assertEqual(2, len(trigger_manager._trigger[self._trigger.id]))
+
     def test_create_operation(self):
         op = self._create_scheduled_operation(self._trigger.id, False)
         with mock.patch(
@@ -28,6 +28,9 @@ class FakeUserTrustManager(object):
     def resume_operation(self, operation_id, user_id, project_id, trust_id):
         pass
 
+    def register_drop_callback(self, callback):
+        pass
+
 
 class FakeOperation(operations.base.Operation):
     OPERATION_TYPE = 'fake'
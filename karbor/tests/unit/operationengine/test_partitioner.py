@@ -0,0 +1,74 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from datetime import timedelta
+
+from oslo_utils import timeutils
+
+from karbor import context
+from karbor import objects
+from karbor.services.operationengine import partitioner
+from karbor.tests import base
+
+
+class HashRingTestCase(base.TestCase):
+    """Test cases for HashRing class."""
+
+    def setUp(self):
+        super(HashRingTestCase, self).setUp()
+        self._keys = ['operation-%d' % index for index in range(1000)]
+
+    def test_empty_ring(self):
+        self.assertIsNone(partitioner.HashRing([]).get_host('abc'))
+
+    def test_spread(self):
+        ring = partitioner.HashRing(['host1', 'host2', 'host3'])
+        counts = {}
+        for key in self._keys:
+            host = ring.get_host(key)
+            counts[host] = counts.get(host, 0) + 1
+        self.assertEqual({'host1', 'host2', 'host3'}, set(counts))
+        for count in counts.values():
+            self.assertGreater(count, 150)
+
+    def test_host_leaving_moves_only_its_keys(self):
+        ring = partitioner.HashRing(['host1', 'host2', 'host3'])
+        smaller_ring = partitioner.HashRing(['host1', 'host2'])
+        for key in self._keys:
+            host = ring.get_host(key)
+            if host != 'host3':
+                self.assertEqual(host, smaller_ring.get_host(key))
+
+
+class LiveHostsTestCase(base.TestCase):
+    """Test cases for the live operation engine services."""
+
+    def _create_service(self, host, topic='karbor-operationengine',
+                        disabled=False):
+        service = objects.Service(context.get_admin_context(), host=host,
+                                  binary='karbor-operationengine',
+                                  topic=topic, disabled=disabled)
+        service.create()
+        return service
+
+    def test_get_live_hosts(self):
+        self.override_config('operationengine_topic',
+                             'karbor-operationengine')
+        self._create_service('host1')
+        self._create_service('host2', disabled=True)
+        self._create_service('host3', topic='karbor-protection')
+        service = self._create_service('host4')
+        service.updated_at = timeutils.utcnow() - timedelta(days=1)
+        service.save()
+
+        self.assertEqual({'host1'}, partitioner.get_live_hosts())
+        self.assertEqual('host1', partitioner.get_operation_host('abc'))
@@ -10,7 +10,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from datetime import timedelta
+
 import mock
+from oslo_utils import timeutils
 
 from karbor import context
 from karbor.services.operationengine import user_trust_manager
@@ -26,6 +29,34 @@ class FakeSession(object):
         return G_TOKEN_ID
 
 
+class FakeAccess(object):
+    def __init__(self, expires):
+        super(FakeAccess, self).__init__()
+        self.expires = expires
+
+
+class FakeExpiringSession(object):
+    """Session whose tokens expire one hour after they are requested"""
+
+    def __init__(self):
+        super(FakeExpiringSession, self).__init__()
+        self.auth = self
+        self.tokens = 0
+        self._expires = None
+
+    def get_token(self):
+        if self._expires is None:
+            self.tokens += 1
+            self._expires = timeutils.utcnow() + timedelta(hours=1)
+        return 'token-%d' % self.tokens
+
+    def get_access(self, session):
+        return FakeAccess(self._expires)
+
+    def invalidate(self):
+        self._expires = None
+
+
 class FakeSKP(object):
     def create_trust_to_karbor(self, context):
         return G_TRUST_ID
@@ -79,6 +110,24 @@ class UserTrustManagerTestCase(base.TestCase):
         self.assertEqual(0, len(info['operation_ids']))
         del_trust.assert_called_once_with(G_TRUST_ID)
 
+    @mock.patch.object(FakeSKP, 'delete_trust_to_karbor')
+    def test_release_operation(self, del_trust):
+        manager = self._manager
+        for op_id in ('abc', '123'):
+            manager.add_operation(self._ctx, op_id)
+
+        manager.release_operation('abc')
+        info = manager._get_user_trust_info(self._user_id, self._project_id)
+        self.assertEqual({'123'}, info['operation_ids'])
+
+        callback = mock.Mock()
+        manager.register_drop_callback(callback)
+        manager.release_operation('123')
+        self.assertIsNone(manager._get_user_trust_info(
+            self._user_id, self._project_id))
+        del_trust.assert_not_called()
+        callback.assert_called_once_with(self._user_id, self._project_id)
+
     def test_resume_operation(self):
         manager = self._manager
         operation_id = 'abc'
@@ -92,9 +141,85 @@ class UserTrustManagerTestCase(base.TestCase):
                                  self._project_id, G_TRUST_ID)
         self.assertEqual(1, len(info['operation_ids']))
 
+    @mock.patch.object(FakeSKP, 'create_trust_session')
+    def test_resume_operation_lazy_session(self, create_session):
+        create_session.return_value = FakeSession()
+        manager = self._manager
+        manager.resume_operation('abc', self._user_id,
+                                 self._project_id, G_TRUST_ID)
+        manager.resume_operation('def', self._user_id,
+                                 self._project_id, G_TRUST_ID)
+        create_session.assert_not_called()
+
+        self.assertEqual(G_TOKEN_ID, manager.get_token(
+            self._user_id, self._project_id))
+        self.assertEqual(G_TOKEN_ID, manager.get_token(
+            self._user_id, self._project_id))
+        create_session.assert_called_once_with(G_TRUST_ID)
+
     def test_get_token(self):
         manager = self._manager
         manager.add_operation(self._ctx, 'abc')
 
         self.assertEqual(G_TOKEN_ID, manager.get_token(
             self._user_id, self._project_id))
+
+    @mock.patch.object(user_trust_manager.karbor_keystone_plugin,
+                       'get_session_context')
+    def test_get_context(self, get_session_context):
+        manager = self._manager
+        self.assertIsNone(manager.get_context(self._user_id,
+                                              self._project_id))
+
+        manager.add_operation(self._ctx, 'abc')
+        self.assertIs(get_session_context.return_value,
+                      manager.get_context(self._user_id, self._project_id))
+        info = manager._get_user_trust_info(self._user_id, self._project_id)
+        get_session_context.assert_called_once_with(info['session'])
+
+        get_session_context.side_effect = Exception()
+        self.assertIsNone(manager.get_context(self._user_id,
+                                              self._project_id))
+
+    def test_get_token_cached(self):
+        self.override_config('token_refresh_margin', 300, 'operationengine')
+        self.override_config('token_refresh_spread', 600, 'operationengine')
+        session = FakeExpiringSession()
+        manager = self._manager
+        with mock.patch.object(FakeSKP, 'create_trust_session',
+                               return_value=session):
+            manager.add_operation(self._ctx, 'abc')
+        self.assertEqual('token-1', manager.get_token(
+            self._user_id, self._project_id))
+        self.assertEqual('token-1', manager.get_token(
+            self._user_id, self._project_id))
+
+        info = manager._get_user_trust_info(self._user_id, self._project_id)
+        expires_at = info['expires_at']
+        self.assertLessEqual(info['refresh_at'], expires_at)
+        self.assertGreaterEqual(info['refresh_at'],
+                                expires_at - timedelta(seconds=600))
+
+        # the token is used until the refresh margin
+        with mock.patch.object(timeutils, 'utcnow',
+                               return_value=expires_at):
+            self.assertEqual('token-2', manager.get_token(
+                self._user_id, self._project_id))
+
+    def test_refresh_tokens(self):
+        session = FakeExpiringSession()
+        manager = self._manager
+        with mock.patch.object(FakeSKP, 'create_trust_session',
+                               return_value=session):
+            manager.add_operation(self._ctx, 'abc')
+        self.assertEqual(0, manager.refresh_tokens())
+        manager.get_token(self._user_id, self._project_id)
+        self.assertEqual(0, manager.refresh_tokens())
+
+        info = manager._get_user_trust_info(self._user_id, self._project_id)
+        with mock.patch.object(timeutils, 'utcnow',
+                               return_value=info['refresh_at']):
+            self.assertEqual(1, manager.refresh_tokens())
+        self.assertEqual(2, session.tokens)
+        self.assertEqual('token-2', manager.get_token(
+            self._user_id, self._project_id))
@@ -13,16 +13,22 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from collections import OrderedDict
+from copy import deepcopy
 import futurist
 import mock
 
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import uuidutils
+import six
 
+from karbor import exception
 from karbor.resource import Resource
 from karbor.services.protection.bank_plugin import Bank
 from karbor.services.protection.bank_plugin import BankPlugin
 from karbor.services.protection.bank_plugin import BankSection
+from karbor.services.protection.bank_plugin import LeasePlugin
 from karbor.services.protection.graph import build_graph
 from karbor.services.protection import protection_plugin
 from karbor.services.protection import provider
@@ -111,6 +117,54 @@ class FakeBankPlugin(BankPlugin):
         return
 
 
+class InMemoryBankPlugin(BankPlugin):
+    def __init__(self, config=None):
+        super(InMemoryBankPlugin, self).__init__(config)
+        self._data = OrderedDict()
+
+    def update_object(self, key, value):
+        self._data[key] = value
+
+    def get_object(self, key):
+        try:
+            return deepcopy(self._data[key])
+        except KeyError:
+            raise exception.BankGetObjectFailed('no such object')
+
+    def list_objects(self, prefix=None, limit=None, marker=None,
+                     sort_dir=None):
+        marker_found = marker is None
+        for key in six.iterkeys(self._data):
+            if marker is not True and key != marker:
+                if marker_found:
+                    if prefix is None or key.startswith(prefix):
+                        if limit is not None:
+                            limit -= 1
+                            if limit < 0:
+                                return
+                        yield key
+            else:
+                marker_found = True
+
+    def delete_object(self, key):
+        del self._data[key]
+
+    def get_owner_id(self):
+        return uuidutils.generate_uuid()
+
+
+class InMemoryLeasePlugin(LeasePlugin):
+
+    def acquire_lease(self):
+        pass
+
+    def renew_lease(self):
+        pass
+
+    def check_lease_validity(self):
+        return True
+
+
 def fake_restore():
     restore = {
         'id': 'fake_id',
@@ -205,6 +259,12 @@ class FakeCheckpoint(object):
     def commit(self):
         pass
 
+    def get_timings(self):
+        return None
+
+    def update_timings(self, timings):
+        pass
+
     def get_resource_bank_section(self, resource_id):
         bank = Bank(FakeBankPlugin())
         return BankSection(bank, resource_id)
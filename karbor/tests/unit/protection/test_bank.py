@@ -10,65 +10,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from collections import OrderedDict
-from copy import deepcopy
-from oslo_utils import uuidutils
-import six
-
 from karbor import exception
 from karbor.services.protection.bank_plugin import Bank
-from karbor.services.protection.bank_plugin import BankPlugin
 from karbor.services.protection.bank_plugin import BankSection
-from karbor.services.protection.bank_plugin import LeasePlugin
 from karbor.tests import base
-
-
-class _InMemoryBankPlugin(BankPlugin):
-    def __init__(self, config=None):
-        super(_InMemoryBankPlugin, self).__init__(config)
-        self._data = OrderedDict()
-
-    def update_object(self, key, value):
-        self._data[key] = value
-
-    def get_object(self, key):
-        try:
-            return deepcopy(self._data[key])
-        except KeyError:
-            raise exception.BankGetObjectFailed('no such object')
-
-    def list_objects(self, prefix=None, limit=None, marker=None,
-                     sort_dir=None):
-        marker_found = marker is None
-        for key in six.iterkeys(self._data):
-            if marker is not True and key != marker:
-                if marker_found:
-                    if prefix is None or key.startswith(prefix):
-                        if limit is not None:
-                            limit -= 1
-                            if limit < 0:
-                                return
-                        yield key
-            else:
-                marker_found = True
-
-    def delete_object(self, key):
-        del self._data[key]
-
-    def get_owner_id(self):
-        return uuidutils.generate_uuid()
-
-
-class _InMemoryLeasePlugin(LeasePlugin):
-
-    def acquire_lease(self):
-        pass
-
-    def renew_lease(self):
-        pass
-
-    def check_lease_validity(self):
-        return True
+from karbor.tests.unit.protection.fakes import InMemoryBankPlugin
 
 
 class BankSectionTest(base.TestCase):
@@ -90,7 +36,7 @@ class BankSectionTest(base.TestCase):
     )
 
     def _create_test_bank(self):
-        return Bank(_InMemoryBankPlugin())
+        return Bank(InMemoryBankPlugin())
 
     def test_empty_key(self):
         bank = self._create_test_bank()
@@ -17,8 +17,8 @@ from karbor.services.protection import graph
 
 from karbor.tests import base
 from karbor.tests.unit.protection.fakes import fake_protection_plan
-from karbor.tests.unit.protection.test_bank import _InMemoryBankPlugin
-from karbor.tests.unit.protection.test_bank import _InMemoryLeasePlugin
+from karbor.tests.unit.protection.fakes import InMemoryBankPlugin
+from karbor.tests.unit.protection.fakes import InMemoryLeasePlugin
 
 A = Resource(id="A", type="fake", name="fake")
 B = Resource(id="B", type="fake", name="fake")
@@ -37,8 +37,8 @@ resource_map = {
 
 class CheckpointTest(base.TestCase):
     def test_create_in_section(self):
-        bank = bank_plugin.Bank(_InMemoryBankPlugin())
-        bank_lease = _InMemoryLeasePlugin()
+        bank = bank_plugin.Bank(InMemoryBankPlugin())
+        bank_lease = InMemoryLeasePlugin()
         checkpoints_section = bank_plugin.BankSection(bank, "/checkpoints")
         indices_section = bank_plugin.BankSection(bank, "/indices")
         owner_id = bank.get_owner_id()
@@ -61,8 +61,8 @@ class CheckpointTest(base.TestCase):
         self.assertEqual("protecting", cp.status)
 
     def test_resource_graph(self):
-        bank = bank_plugin.Bank(_InMemoryBankPlugin())
-        bank_lease = _InMemoryLeasePlugin()
+        bank = bank_plugin.Bank(InMemoryBankPlugin())
+        bank_lease = InMemoryLeasePlugin()
         checkpoints_section = bank_plugin.BankSection(bank, "/checkpoints")
         indices_section = bank_plugin.BankSection(bank, "/indices")
         owner_id = bank.get_owner_id()
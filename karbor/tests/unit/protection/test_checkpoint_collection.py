@@ -19,14 +19,14 @@ from karbor.services.protection.bank_plugin import Bank
 from karbor.services.protection.checkpoint import CheckpointCollection
 from karbor.tests import base
 from karbor.tests.unit.protection.fakes import fake_protection_plan
-from karbor.tests.unit.protection.test_bank import _InMemoryBankPlugin
-from karbor.tests.unit.protection.test_bank import _InMemoryLeasePlugin
+from karbor.tests.unit.protection.fakes import InMemoryBankPlugin
+from karbor.tests.unit.protection.fakes import InMemoryLeasePlugin
 
 
 class CheckpointCollectionTest(base.TestCase):
     def _create_test_collection(self):
-        return CheckpointCollection(Bank(_InMemoryBankPlugin()),
-                                    _InMemoryLeasePlugin())
+        return CheckpointCollection(Bank(InMemoryBankPlugin()),
+                                    InMemoryLeasePlugin())
 
     def test_create_checkpoint(self):
         collection = self._create_test_collection()
@@ -95,6 +95,20 @@ class CheckpointCollectionTest(base.TestCase):
         checkpoint.purge()
         self.assertEqual(set(collection.list_ids(provider_id)), result)
 
+    def test_checkpoint_timings(self):
+        collection = self._create_test_collection()
+        plan = fake_protection_plan()
+        provider_id = plan['provider_id']
+        checkpoint = collection.create(plan)
+        self.assertIsNone(checkpoint.get_timings())
+
+        checkpoint.update_timings({'duration': 1.5})
+        checkpoint = collection.get(checkpoint_id=checkpoint.id)
+        self.assertEqual({'duration': 1.5}, checkpoint.get_timings())
+
+        checkpoint.purge()
+        self.assertEqual([], collection.list_ids(provider_id))
+
     def test_write_checkpoint_with_invalid_lease(self):
         collection = self._create_test_collection()
         checkpoint = collection.create(fake_protection_plan())
@@ -0,0 +1,98 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from karbor import exception
+from karbor.services.protection.bank_plugin import Bank
+from karbor.services.protection import chunk_store
+from karbor.tests import base
+from karbor.tests.unit.protection.fakes import InMemoryBankPlugin
+
+
+class ChunkStoreTest(base.TestCase):
+    def setUp(self):
+        super(ChunkStoreTest, self).setUp()
+        self.bank_plugin = InMemoryBankPlugin()
+        self.store = chunk_store.ChunkStore(Bank(self.bank_plugin))
+
+    def test_put_new_chunk(self):
+        digest = chunk_store.chunk_digest(b'data')
+        self.assertFalse(self.store.exists(digest))
+        self.assertTrue(self.store.put(digest, b'data', 'cp1@image'))
+        self.assertTrue(self.store.exists(digest))
+        self.assertEqual(b'data', self.store.get(digest))
+        self.assertEqual(1, self.store.count_references(digest))
+
+    def test_put_existing_chunk(self):
+        digest = chunk_store.chunk_digest(b'data')
+        self.store.put(digest, b'data', 'cp1@image')
+        self.assertFalse(self.store.put(digest, b'data', 'cp2@image'))
+        self.assertEqual(2, self.store.count_references(digest))
+        data_key = '/chunks/%s/data' % digest
+        self.assertIn(data_key, self.bank_plugin._data)
+
+    def test_remove_reference(self):
+        digest = chunk_store.chunk_digest(b'data')
+        self.store.put(digest, b'data', 'cp1@image')
+        self.store.put(digest, b'data', 'cp2@image')
+
+        self.assertFalse(self.store.remove_reference(digest, 'cp1@image'))
+        self.assertTrue(self.store.exists(digest))
+        self.assertTrue(self.store.remove_reference(digest, 'cp2@image'))
+        self.assertFalse(self.store.exists(digest))
+        self.assertRaises(exception.BankGetObjectFailed,
+                          self.store.get, digest)
+        self.assertEqual({}, dict(self.bank_plugin._data))
+
+    def test_add_reference(self):
+        digest = chunk_store.chunk_digest(b'data')
+        self.assertFalse(self.store.add_reference(digest, 'cp2@image'))
+        self.store.put(digest, b'data', 'cp1@image')
+        self.assertTrue(self.store.add_reference(digest, 'cp2@image'))
+        self.assertEqual(2, self.store.count_references(digest))
+
+    @mock.patch.object(chunk_store, '_LIST_PAGE_SIZE', 2)
+    def test_count_references_paginated(self):
+        digest = chunk_store.chunk_digest(b'data')
+        for i in range(5):
+            self.store.put(digest, b'data', 'cp%d@image' % i)
+        self.assertEqual(5, self.store.count_references(digest))
+
+    def test_put_uploads_missing_data(self):
+        digest = chunk_store.chunk_digest(b'data')
+        self.store.put(digest, b'data', 'cp1@image')
+        # the data was deleted from another host after the index was read
+        del self.bank_plugin._data['/chunks/%s/data' % digest]
+        self.assertTrue(self.store.put(digest, b'data', 'cp2@image'))
+        self.assertEqual(b'data', self.store.get(digest))
+
+    def test_remove_reference_keeps_chunk_referenced_meanwhile(self):
+        digest = chunk_store.chunk_digest(b'data')
+        self.store.put(digest, b'data', 'cp1@image')
+        has_references = self.store._has_references
+        checks = []
+
+        def _has_references(digest):
+            checks.append(digest)
+            if len(checks) == 2:
+                # another host adds a reference after the first check
+                self.store._section.update_object(
+                    '%s/refs/cp2@image' % digest, 'cp2@image')
+            return has_references(digest)
+
+        with mock.patch.object(self.store, '_has_references',
+                               _has_references):
+            self.assertFalse(
+                self.store.remove_reference(digest, 'cp1@image'))
+        self.assertTrue(self.store.exists(digest))
+        self.assertEqual(b'data', self.store.get(digest))
@@ -80,3 +80,14 @@ class FileSystemBankPluginTest(base.TestCase):
         value = self.fs_bank_plugin.get_object(
             "/index.json")
         self.assertEqual(value, {"key": "value"})
+
+    def test_create_get_binary_object(self):
+        data = b'\x00\xff\xfe' * 10
+        self.fs_bank_plugin.update_object("/data_1", data)
+        value = self.fs_bank_plugin.get_object("/data_1")
+        self.assertEqual(data, value)
+
+    def test_get_missing_object(self):
+        self.assertRaises(exception.BankGetObjectFailed,
+                          self.fs_bank_plugin.get_object,
+                          "/missing")
@@ -0,0 +1,41 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from karbor.services.protection import graph
+from karbor.services.protection import resource_flow
+from karbor.tests.benchmark import flow_benchmark
+from karbor.tests import base
+
+
+class FlowBenchmarkTest(base.TestCase):
+    def test_build_resources(self):
+        start_nodes, get_child_nodes = flow_benchmark.build_resources(
+            10, fan_out=3, fan_in=2)
+        resource_graph = graph.build_graph(start_nodes, get_child_nodes)
+        nodes = graph.pack_graph(resource_graph).nodes
+        self.assertEqual(10, len(nodes))
+        # resource-4 is a child of resource-1 and resource-0
+        self.assertEqual(2, len([
+            resource for resource in nodes.values()
+            if any(child.id == 'resource-4'
+                   for child in get_child_nodes(resource))]))
+
+    def test_run_operations(self):
+        for operation_type in flow_benchmark.OPERATIONS:
+            timings = flow_benchmark.run_operation(
+                operation_type, 20, fan_out=2, fan_in=2,
+                latency={resource_flow.HOOK_MAIN: 0.001}, trace_memory=True)
+            self.assertEqual(20 * len(resource_flow.HOOKS),
+                             timings['tasks'])
+            for phase in flow_benchmark.PHASES:
+                self.assertGreaterEqual(timings[phase], 0.0)
+            self.assertGreater(timings['peak_memory_mb'], 0.0)
@@ -0,0 +1,124 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from eventlet import event
+import mock
+
+from karbor.resource import Resource
+from karbor.services.protection.flows import executor as flow_executor
+from karbor.services.protection.flows import workflow
+from karbor.tests import base
+
+
+def fake_task(resource_type):
+    return mock.MagicMock(inject={
+        'resource': Resource(type=resource_type, id='id', name='name')})
+
+
+class SharedTaskExecutorTest(base.TestCase):
+    def _submit(self, flow_executor, resource_type=None):
+        done = event.Event()
+        task = fake_task(resource_type) if resource_type else None
+        future = flow_executor.submit(lambda task: done.wait(), task)
+        return done, future
+
+    def test_global_limit(self):
+        shared = flow_executor.SharedTaskExecutor(max_tasks=2)
+        executor = shared.flow_executor()
+        tasks = [self._submit(executor) for _ in range(3)]
+
+        statistics = shared.statistics()
+        self.assertEqual(2, statistics['running'])
+        self.assertEqual(1, statistics['queued'])
+        self.assertEqual(1.0, statistics['utilization'])
+
+        for done, future in tasks:
+            done.send(True)
+            self.assertTrue(future.result())
+        self.assertEqual(0, shared.statistics()['running'])
+
+    def test_per_flow_limit(self):
+        shared = flow_executor.SharedTaskExecutor(max_tasks_per_flow=1)
+        executor1 = shared.flow_executor()
+        executor2 = shared.flow_executor()
+        first = self._submit(executor1)
+        second = self._submit(executor1)
+        other = self._submit(executor2)
+
+        statistics = shared.statistics()
+        self.assertEqual(2, statistics['running'])
+        self.assertEqual(1, statistics['queued'])
+        self.assertEqual(2, statistics['flows'])
+        self.assertIsNone(statistics['utilization'])
+
+        for done, future in (first, second, other):
+            done.send(True)
+            self.assertTrue(future.result())
+
+    def test_per_resource_type_limit(self):
+        shared = flow_executor.SharedTaskExecutor(
+            max_tasks_per_type={'OS::Cinder::Volume': '1'})
+        executor = shared.flow_executor()
+        volume1 = self._submit(executor, 'OS::Cinder::Volume')
+        volume2 = self._submit(executor, 'OS::Cinder::Volume')
+        image = self._submit(executor, 'OS::Glance::Image')
+
+        statistics = shared.statistics()
+        self.assertEqual({'OS::Cinder::Volume': 1, 'OS::Glance::Image': 1},
+                         statistics['running_per_type'])
+        self.assertEqual({'OS::Cinder::Volume': 1},
+                         statistics['queued_per_type'])
+
+        volume1[0].send(True)
+        volume1[1].result()
+        self.assertEqual(0, shared.statistics()['queued'])
+        for done, future in (volume2, image):
+            done.send(True)
+            future.result()
+
+    def test_task_failure(self):
+        shared = flow_executor.SharedTaskExecutor(max_tasks=1)
+        executor = shared.flow_executor()
+
+        def fail():
+            raise ValueError('boom')
+        self.assertRaises(ValueError, executor.submit(fail).result)
+        self.assertEqual(1, executor.submit(lambda: 1).result())
+
+    def test_flow_engine_uses_shared_executor(self):
+        engine = workflow.TaskFlowEngine()
+        flow = engine.build_flow('test')
+        task = engine.create_task(lambda: True, name='fake')
+        engine.add_tasks(flow, task)
+        with mock.patch.object(flow_executor.SharedTaskExecutor,
+                               'submit_with_priority', autospec=True,
+                               side_effect=flow_executor.SharedTaskExecutor.
+                               submit_with_priority) as mock_submit:
+            engine.run_engine(engine.get_engine(flow))
+        self.assertEqual(1, mock_submit.call_count)
+
+    def test_priority_order(self):
+        shared = flow_executor.SharedTaskExecutor(max_tasks=1)
+        executor = shared.flow_executor({'long': 10, 'short': 1})
+        done, first = self._submit(executor)
+        started = []
+        futures = []
+        for name in ('unknown', 'short', 'long'):
+            task = mock.Mock(inject={})
+            task.name = name
+            futures.append(executor.submit(
+                lambda task: started.append(task.name), task))
+
+        done.send(True)
+        for future in futures:
+            future.result()
+        self.assertEqual(['long', 'short', 'unknown'], started)
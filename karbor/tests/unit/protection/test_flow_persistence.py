@@ -0,0 +1,148 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+import fixtures
+import mock
+from taskflow import states
+
+from karbor.common import constants
+from karbor import context
+from karbor import exception
+from karbor.services.protection.flows import persistence
+from karbor.services.protection.flows import workflow
+from karbor.tests import base
+
+
+class FlowPersistenceTest(base.TestCase):
+    def setUp(self):
+        super(FlowPersistenceTest, self).setUp()
+        tempdir = self.useFixture(fixtures.TempDir()).path
+        self.override_config('flow_persistence_connection',
+                             'file://%s' % os.path.join(tempdir, 'flows'))
+        self.addCleanup(setattr, persistence, '_backend', None)
+        self.backend = persistence.get_backend()
+        self.engine = workflow.TaskFlowEngine()
+        self.checkpoint = mock.MagicMock(id='checkpoint_id')
+        self.provider = mock.MagicMock(id='provider_id')
+        self.context = context.RequestContext(user_id='user_id',
+                                              project_id='project_id')
+
+    def _build_flow(self, calls):
+        flow = self.engine.build_flow('test', 'linear')
+        self.engine.add_tasks(
+            flow,
+            self.engine.create_task(lambda: calls.append('first'),
+                                    name='first'),
+            self.engine.create_task(lambda: calls.append('second'),
+                                    name='second'))
+        return flow
+
+    def test_disabled(self):
+        self.override_config('flow_persistence_connection', None)
+        self.assertIsNone(persistence.get_backend())
+
+    def test_resume_skips_completed_tasks(self):
+        book, flow_detail = persistence.create_logbook(
+            self.backend, constants.OPERATION_PROTECT, self.context,
+            self.checkpoint, self.provider, plan={'id': 'plan_id'})
+
+        calls = []
+        flow_engine = self.engine.get_engine(
+            self._build_flow(calls), backend=self.backend, book=book,
+            flow_detail=flow_detail)
+        for _ in flow_engine.run_iter():
+            if calls:
+                # the service stops after the first task
+                break
+        self.assertEqual(['first'], calls)
+
+        claimed = persistence.claim_unfinished_logbooks(self.backend)
+        self.assertEqual(1, len(claimed))
+        book, flow_detail = claimed[0]
+        self.assertEqual('checkpoint_id', book.meta['checkpoint_id'])
+        self.assertEqual({'id': 'plan_id'}, book.meta['plan'])
+        self.assertEqual('project_id', book.meta['project_id'])
+        self.assertNotIn('context', book.meta)
+
+        calls = []
+        flow_engine = self.engine.get_engine(
+            self._build_flow(calls), backend=self.backend, book=book,
+            flow_detail=flow_detail)
+        self.engine.run_engine(flow_engine)
+        self.assertEqual(['second'], calls)
+        self.assertEqual(states.SUCCESS, flow_engine.storage.get_flow_state())
+
+    @mock.patch.object(persistence.client_factory.ClientFactory,
+                       'get_keystone_plugin')
+    def test_logbook_trust(self, mock_plugin):
+        keystone_plugin = mock_plugin.return_value
+        keystone_plugin.create_trust_to_karbor.return_value = 'trust_id'
+        self.context = context.RequestContext(
+            user_id='user_id', project_id='project_id',
+            auth_token='token', auth_token_info={'token': {}})
+        book, _ = persistence.create_logbook(
+            self.backend, constants.OPERATION_DELETE, self.context,
+            self.checkpoint, self.provider)
+        keystone_plugin.create_trust_to_karbor.assert_called_once_with(
+            self.context)
+        self.assertEqual('trust_id', book.meta['trust_id'])
+        self.assertNotIn('token', str(book.meta))
+
+        with mock.patch.object(persistence.karbor_keystone_plugin,
+                               'get_session_context') as mock_context:
+            self.assertIs(mock_context.return_value,
+                          persistence.get_context(book))
+        keystone_plugin.create_trust_session.assert_called_once_with(
+            'trust_id')
+        mock_context.assert_called_once_with(
+            keystone_plugin.create_trust_session.return_value)
+
+        persistence.destroy_logbook(self.backend, book)
+        keystone_plugin.delete_trust_to_karbor.assert_called_once_with(
+            'trust_id')
+
+    def test_get_context_without_trust(self):
+        book, _ = persistence.create_logbook(
+            self.backend, constants.OPERATION_DELETE, self.context,
+            self.checkpoint, self.provider)
+        self.assertIsNone(book.meta['trust_id'])
+        self.assertRaises(exception.AuthorizationFailure,
+                          persistence.get_context, book)
+
+    def test_claim_skips_live_owner_and_other_host(self):
+        book, _ = persistence.create_logbook(
+            self.backend, constants.OPERATION_DELETE, self.context,
+            self.checkpoint, self.provider)
+        with mock.patch.object(persistence, '_is_process_alive',
+                               return_value=True):
+            self.assertEqual(
+                [], persistence.claim_unfinished_logbooks(self.backend))
+
+        self.override_config('host', 'other-host')
+        self.assertEqual(
+            [], persistence.claim_unfinished_logbooks(self.backend))
+
+    def test_claim_destroys_finished_flows(self):
+        book, flow_detail = persistence.create_logbook(
+            self.backend, constants.OPERATION_DELETE, self.context,
+            self.checkpoint, self.provider)
+        self.engine.run_engine(self.engine.get_engine(
+            self._build_flow([]), backend=self.backend, book=book,
+            flow_detail=flow_detail))
+
+        self.assertEqual(
+            [], persistence.claim_unfinished_logbooks(self.backend))
+        with persistence.contextlib.closing(
+                self.backend.get_connection()) as conn:
+            self.assertEqual([], list(conn.get_logbooks()))
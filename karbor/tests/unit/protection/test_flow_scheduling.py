@@ -0,0 +1,179 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from taskflow import task as taskflow_task
+
+from karbor.common import constants
+from karbor.resource import Resource
+from karbor.services.protection.bank_plugin import Bank
+from karbor.services.protection.flows import scheduling
+from karbor.services.protection.flows import workflow
+from karbor.services.protection import graph
+from karbor.services.protection import resource_flow
+from karbor.tests import base
+from karbor.tests.unit.protection import fakes
+
+(
+    parent_type,
+    child_type,
+    grandchild_type,
+) = fakes.FakeProtectionPlugin.SUPPORTED_RESOURCES
+
+parent = Resource(id='A1', name='parent', type=parent_type)
+child = Resource(id='B1', name='child', type=child_type)
+other_child = Resource(id='B2', name='other_child', type=child_type)
+
+
+def task_name(hook, resource):
+    return '{}_{}_{}_{}'.format(constants.OPERATION_PROTECT, hook,
+                                resource.type, resource.id)
+
+
+class FlowSchedulingTest(base.TestCase):
+    def setUp(self):
+        super(FlowSchedulingTest, self).setUp()
+        resource_graph = {
+            parent: [child, other_child],
+            child: [],
+            other_child: [],
+        }
+        self.test_graph = graph.build_graph([parent],
+                                            resource_graph.__getitem__)
+        self.engine = workflow.TaskFlowEngine()
+        plugin = fakes.FakeProtectionPlugin()
+        self.flow = resource_flow.build_resource_flow(
+            constants.OPERATION_PROTECT, self.engine,
+            {parent_type: plugin, child_type: plugin}, self.test_graph)
+        self.bank = Bank(fakes.FakeBankPlugin())
+        self.history = scheduling.TaskDurationHistory(
+            self.bank, '/task_durations/protect')
+
+    def test_longest_remaining_path_first(self):
+        self.history.update([
+            (self.engine.search_task(self.flow, task_name('on_main', child)),
+             1.0),
+            (self.engine.search_task(self.flow,
+                                     task_name('on_main', other_child)),
+             100.0),
+        ])
+
+        priorities = scheduling.get_priorities(self.flow, self.history)
+        self.assertGreater(
+            priorities[task_name('on_prepare_begin', other_child)],
+            priorities[task_name('on_prepare_begin', child)])
+        self.assertGreater(priorities[task_name('on_main', other_child)],
+                           priorities[task_name('on_main', child)])
+        # on_main of other_child, its on_complete and the on_complete of
+        # the parent are left
+        self.assertEqual(
+            102.0, priorities[task_name('on_main', other_child)])
+
+    def test_estimate_by_resource_type(self):
+        self.history.update([
+            (self.engine.search_task(self.flow, task_name('on_main', child)),
+             10.0),
+        ])
+        new_child = Resource(id='B3', name='new_child', type=child_type)
+        task = mock.Mock(inject={'resource': new_child})
+        task.name = task_name('on_main', new_child)
+        self.assertEqual(10.0, self.history.estimate(task))
+        task.name = task_name('on_complete', new_child)
+        self.assertEqual(scheduling.DEFAULT_TASK_DURATION,
+                         self.history.estimate(task))
+
+    def test_history_size(self):
+        self.override_config('task_duration_history_size', 3)
+        tasks = []
+        for num in range(3):
+            resource = Resource(id='B%s' % num, name='child',
+                                type=child_type)
+            task = mock.Mock(inject={'resource': resource})
+            task.name = task_name('on_main', resource)
+            tasks.append(task)
+        self.history.update([(tasks[0], 10.0), (tasks[1], 20.0)])
+        self.history.update([(tasks[2], 30.0)])
+        self.history.save()
+
+        durations = self.bank.get_object('/task_durations/protect')
+        self.assertEqual(3, len(durations))
+        self.assertNotIn(tasks[0].name, durations)
+        self.assertEqual(20.0, self.history.estimate(tasks[1]))
+        self.assertEqual(30.0, self.history.estimate(tasks[2]))
+        # the dropped task is estimated by its resource type
+        self.assertAlmostEqual(18.1, self.history.estimate(tasks[0]))
+
+    def test_record_durations(self):
+        store = resource_flow.build_resource_store(None, self.test_graph,
+                                                   None)
+        store['checkpoint'] = None
+        flow_engine = self.engine.get_engine(self.flow, store=store)
+        scheduling.record_durations(flow_engine, self.flow, self.history)
+        self.engine.run_engine(flow_engine)
+        self.history.save()
+
+        durations = self.bank.get_object('/task_durations/protect')
+        self.assertIn(task_name('on_main', child), durations)
+        self.assertIn('{}_{}_{}'.format(constants.OPERATION_PROTECT,
+                                        'on_main', child_type), durations)
+
+        history = scheduling.TaskDurationHistory(
+            self.bank, '/task_durations/protect')
+        self.assertEqual(
+            durations[task_name('on_main', parent)],
+            history.estimate(self.engine.search_task(
+                self.flow, task_name('on_main', parent))))
+
+    def test_save_interval(self):
+        task = self.engine.search_task(self.flow, task_name('on_main', child))
+        self.history.update([(task, 10.0)])
+        self.assertRaises(Exception, self.bank.get_object,
+                          '/task_durations/protect')
+
+        self.override_config('task_duration_save_interval', 0)
+        self.history.update([(task, 20.0)])
+        durations = self.bank.get_object('/task_durations/protect')
+        self.assertEqual(13.0, durations[task_name('on_main', child)])
+
+    def test_save_merges_other_services(self):
+        task = self.engine.search_task(self.flow, task_name('on_main', child))
+        other_task = self.engine.search_task(
+            self.flow, task_name('on_main', other_child))
+        other_history = scheduling.TaskDurationHistory(
+            self.bank, '/task_durations/protect')
+        self.history.update([(task, 10.0)])
+        other_history.update([(other_task, 100.0), (task, 20.0)])
+        other_history.save()
+        self.history.save()
+
+        durations = self.bank.get_object('/task_durations/protect')
+        self.assertEqual(100.0, durations[task_name('on_main', other_child)])
+        self.assertEqual(17.0, durations[task_name('on_main', child)])
+        self.assertEqual(100.0, self.history.estimate(other_task))
+
+    def test_deep_flow(self):
+        tasks = [taskflow_task.FunctorTask(lambda: None, name=str(num))
+                 for num in range(5000)]
+        flow = self.engine.build_flow('deep', 'linear')
+        self.engine.add_tasks(flow, *tasks)
+
+        priorities = scheduling.get_priorities(flow, self.history)
+        self.assertEqual(5000 * scheduling.DEFAULT_TASK_DURATION,
+                         priorities['0'])
+        self.assertEqual(scheduling.DEFAULT_TASK_DURATION,
+                         priorities['4999'])
+
+    def test_disabled(self):
+        self.override_config('critical_path_scheduling', False)
+        self.assertIsNone(scheduling.get_history(fakes.FakeProvider(),
+                                                 constants.OPERATION_PROTECT))
+        self.assertIsNone(scheduling.get_priorities(self.flow, None))
@@ -0,0 +1,77 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+import itertools
+
+import mock
+
+from karbor.common import constants
+from karbor.resource import Resource
+from karbor.services.protection.flows import timings
+from karbor.services.protection.flows import workflow
+from karbor.services.protection import graph
+from karbor.services.protection import resource_flow
+from karbor.tests import base
+from karbor.tests.unit.protection import fakes
+
+(
+    parent_type,
+    child_type,
+    grandchild_type,
+) = fakes.FakeProtectionPlugin.SUPPORTED_RESOURCES
+
+parent = Resource(id='A1', name='parent', type=parent_type)
+child = Resource(id='B1', name='child', type=child_type)
+
+
+class FlowTimingsTest(base.TestCase):
+    def test_record_checkpoint_timings(self):
+        resource_graph = graph.build_graph(
+            [parent], {parent: [child], child: []}.__getitem__)
+        engine = workflow.TaskFlowEngine()
+        plugin = fakes.FakeProtectionPlugin()
+        flow = resource_flow.build_resource_flow(
+            constants.OPERATION_PROTECT, engine,
+            {parent_type: plugin, child_type: plugin}, resource_graph)
+        store = resource_flow.build_resource_store(None, resource_graph,
+                                                   None)
+        checkpoint = mock.MagicMock(id='checkpoint_id')
+        store['checkpoint'] = checkpoint
+        flow_engine = engine.get_engine(flow, store=store)
+        timings.record_checkpoint_timings(
+            flow_engine, constants.OPERATION_PROTECT, flow, checkpoint)
+        now = datetime.datetime(2017, 1, 1)
+        clock = (now + datetime.timedelta(seconds=second)
+                 for second in itertools.count())
+        with mock.patch.object(timings.timeutils, 'utcnow',
+                               side_effect=lambda: next(clock)):
+            engine.run_engine(flow_engine)
+
+        breakdown = checkpoint.update_timings.call_args[0][0]
+        self.assertEqual(constants.OPERATION_PROTECT,
+                         breakdown['operation_type'])
+        self.assertEqual(8, len(breakdown['tasks']))
+        self.assertEqual(
+            set(resource_flow.HOOKS),
+            set(breakdown['resource_types'][child_type]))
+        tasks = {(task['resource_id'], task['hook']): task
+                 for task in breakdown['tasks']}
+        first = tasks[(parent.id, resource_flow.HOOK_PRE_BEGIN)]
+        self.assertEqual(0.0, first['wait_for_dependencies'])
+        self.assertEqual('SUCCESS', first['result'])
+        after_child = tasks[(parent.id, resource_flow.HOOK_PRE_FINISH)]
+        self.assertLessEqual(
+            tasks[(child.id, resource_flow.HOOK_PRE_FINISH)]['finished_at'],
+            after_child['started_at'])
+        self.assertGreater(after_child['wait_for_dependencies'], 0.0)
+        self.assertGreater(after_child['duration'], 0.0)
@@ -11,18 +11,31 @@
 #    under the License.
 
 import collections
+import zlib
+
 from karbor.common import constants
 from karbor.context import RequestContext
+from karbor import exception
 from karbor.resource import Resource
 from karbor.services.protection.bank_plugin import Bank
 from karbor.services.protection.bank_plugin import BankPlugin
 from karbor.services.protection.bank_plugin import BankSection
+from karbor.services.protection import chunk_store
 from karbor.services.protection import client_factory
 from karbor.services.protection.protection_plugins. \
     image.image_protection_plugin import GlanceProtectionPlugin
+from karbor.services.protection.protection_plugins. \
+    image import image_protection_plugin
+from karbor.services.protection.protection_plugins. \
+    image.image_protection_plugin import ImageBackupProgress
+from karbor.services.protection.protection_plugins. \
+    image.image_protection_plugin import ImageBankIO
+from karbor.services.protection.protection_plugins. \
+    image.image_protection_plugin import ImageChunkUploader
 from karbor.services.protection.protection_plugins.image \
     import image_plugin_schemas
 from karbor.tests import base
+from karbor.tests.unit.protection.fakes import InMemoryBankPlugin
 import mock
 from oslo_config import cfg
 from oslo_config import fixture
@@ -169,6 +182,198 @@ class GlanceProtectionPluginTest(base.TestCase):
         call_hooks(delete_operation, self.checkpoint, resource, self.cntxt,
                    {})
 
+    def test_chunk_uploader_splits_stream(self):
+        objects = {}
+        bank_section = mock.MagicMock()
+        bank_section.update_object.side_effect = objects.__setitem__
+        image_response = [b'a' * 5, b'b' * 7, b'c' * 2]
+
+        uploader = ImageChunkUploader(bank_section, 4, 3, 2)
+        chunks_num = uploader.upload(image_response)
+
+        self.assertEqual(4, chunks_num)
+        self.assertEqual({
+            'data_1': b'aaaa',
+            'data_2': b'abbb',
+            'data_3': b'bbbb',
+            'data_4': b'cc',
+        }, objects)
+
+    def test_chunk_uploader_deduplication(self):
+        bank_section = mock.MagicMock()
+        store = mock.MagicMock()
+        store.put.side_effect = [True, False, True]
+
+        uploader = ImageChunkUploader(bank_section, 4, 1, 2, store,
+                                      'checkpoint@image')
+        self.assertEqual(3, uploader.upload([b'aaaaaaaabbbb']))
+
+        digest_a = chunk_store.chunk_digest(b'aaaa')
+        digest_b = chunk_store.chunk_digest(b'bbbb')
+        self.assertEqual([digest_a, digest_a, digest_b], uploader.manifest)
+        store.put.assert_has_calls([
+            mock.call(digest_a, b'aaaa', 'checkpoint@image'),
+            mock.call(digest_a, b'aaaa', 'checkpoint@image'),
+            mock.call(digest_b, b'bbbb', 'checkpoint@image'),
+        ])
+        bank_section.update_object.assert_not_called()
+
+    def test_image_bank_io_from_chunk_store(self):
+        chunks = {'digest_1': b'abcd', 'digest_2': b'ef'}
+        store = mock.MagicMock()
+        store.get.side_effect = chunks.get
+
+        image_data = ImageBankIO(mock.MagicMock(),
+                                 ['digest_1', 'digest_2', 'digest_1'], 2,
+                                 store)
+        self.assertEqual(b'abcdefabcd', b''.join(image_data))
+
+    def test_chunk_uploader_resume(self):
+        objects = {}
+        bank_section = mock.MagicMock()
+        bank_section.update_object.side_effect = objects.__setitem__
+        progress = ImageBackupProgress(mock.MagicMock(), 'image',
+                                       'checksum', 4, chunks_num=1,
+                                       checksum=zlib.crc32(b'aaaa'))
+
+        uploader = ImageChunkUploader(bank_section, 4, 2, 2,
+                                      progress=progress)
+        self.assertEqual(3, uploader.upload([b'bbbbcc']))
+        self.assertEqual({'data_2': b'bbbb', 'data_3': b'cc'}, objects)
+        self.assertEqual(zlib.crc32(b'aaaabbbbcc') & 0xffffffff,
+                         uploader.checksum)
+        self.assertEqual(3, progress.chunks_num)
+        self.assertEqual(uploader.checksum, progress.checksum)
+
+    def test_backup_progress_commit_out_of_order(self):
+        bank_section = Bank(InMemoryBankPlugin()).get_sub_section('/image')
+        progress = ImageBackupProgress(bank_section, 'image', 'checksum', 4,
+                                       interval=2)
+        progress.commit(2, 22)
+        self.assertEqual(0, progress.chunks_num)
+        progress.commit(1, 11)
+        self.assertEqual(2, progress.chunks_num)
+        self.assertEqual(22, progress.checksum)
+        progress.commit(3, 33)
+
+        loaded = ImageBackupProgress.load(bank_section, 'image', 'checksum',
+                                          4)
+        self.assertEqual(2, loaded.chunks_num)
+        self.assertEqual(22, loaded.checksum)
+        self.assertEqual(8, loaded.offset)
+
+        loaded = ImageBackupProgress.load(bank_section, 'image', 'other', 4)
+        self.assertEqual(0, loaded.chunks_num)
+
+        progress.remove()
+        loaded = ImageBackupProgress.load(bank_section, 'image', 'checksum',
+                                          4)
+        self.assertEqual(0, loaded.chunks_num)
+
+    def test_get_image_data_range(self):
+        glance_client = mock.MagicMock()
+        resp = mock.MagicMock(status_code=206)
+        glance_client.http_client.get.return_value = (resp, [b'cdef'])
+
+        data = image_protection_plugin.get_image_data(glance_client,
+                                                      'image', 2)
+        self.assertEqual(b'cdef', b''.join(data))
+        glance_client.http_client.get.assert_called_once_with(
+            '/v2/images/image/file', headers={'Range': 'bytes=2-'})
+
+    def test_get_image_data_range_ignored(self):
+        glance_client = mock.MagicMock()
+        resp = mock.MagicMock(status_code=200)
+        glance_client.http_client.get.return_value = (resp,
+                                                      [b'a', b'bcd', b'ef'])
+
+        data = image_protection_plugin.get_image_data(glance_client,
+                                                      'image', 2)
+        self.assertEqual(b'cdef', b''.join(data))
+
+    def test_chunk_uploader_empty_stream(self):
+        bank_section = mock.MagicMock()
+        uploader = ImageChunkUploader(bank_section, 4, 2, 2)
+        self.assertEqual(0, uploader.upload([]))
+        bank_section.update_object.assert_not_called()
+
+    def test_chunk_uploader_upload_failed(self):
+        bank_section = mock.MagicMock()
+        bank_section.update_object.side_effect = IOError('boom')
+        uploader = ImageChunkUploader(bank_section, 4, 2, 2)
+        self.assertRaises(IOError, uploader.upload, [b'a' * 64])
+
+    def test_image_bank_io_prefetch(self):
+        objects = {'data_1': b'abcd', 'data_2': b'efgh', 'data_3': b'ij'}
+        bank_section = mock.MagicMock()
+        bank_section.get_object.side_effect = objects.get
+
+        image_data = ImageBankIO(bank_section,
+                                 ['data_1', 'data_2', 'data_3'], 2)
+        self.assertEqual(b'abcdefghij', b''.join(image_data))
+        self.assertEqual(b'', image_data.read())
+        self.assertEqual(3, bank_section.get_object.call_count)
+
+    def test_image_bank_io_read_length(self):
+        objects = {'data_1': b'abcd', 'data_2': u'ef'}
+        bank_section = mock.MagicMock()
+        bank_section.get_object.side_effect = objects.get
+
+        image_data = ImageBankIO(bank_section, ['data_1', 'data_2'], 4)
+        self.assertEqual(b'abc', image_data.read(3))
+        self.assertEqual(b'd', image_data.read(3))
+        self.assertEqual(b'ef', image_data.read(3))
+        self.assertEqual(b'', image_data.read(3))
+
+    def test_chunk_uploader_manifest(self):
+        bank_section = mock.MagicMock()
+        uploader = ImageChunkUploader(bank_section, 4, 2, 2)
+        self.assertEqual(2, uploader.upload([b'aaaabb']))
+        self.assertEqual([chunk_store.chunk_digest(b'aaaa'),
+                          chunk_store.chunk_digest(b'bb')],
+                         uploader.manifest)
+
+    def test_image_bank_io_verify_retry(self):
+        bank_section = mock.MagicMock()
+        bank_section.get_object.side_effect = [b'xxxx', b'abcd', b'ef']
+        digests = [chunk_store.chunk_digest(b'abcd'),
+                   chunk_store.chunk_digest(b'ef')]
+
+        image_data = ImageBankIO(bank_section, ['data_1', 'data_2'], 1,
+                                 digests=digests, retries=1)
+        self.assertEqual(b'abcdef', b''.join(image_data))
+        self.assertEqual(3, bank_section.get_object.call_count)
+
+    def test_image_bank_io_verify_corrupted(self):
+        bank_section = mock.MagicMock()
+        bank_section.get_object.return_value = b'xxxx'
+        digests = [chunk_store.chunk_digest(b'abcd')]
+
+        image_data = ImageBankIO(bank_section, ['data_1'], 1,
+                                 digests=digests, retries=2)
+        self.assertRaises(exception.BankObjectCorrupted, image_data.read)
+        self.assertEqual(3, bank_section.get_object.call_count)
+
+    def test_scrub_image_backup(self):
+        bank_section = Bank(InMemoryBankPlugin()).get_sub_section('/image')
+        bank_section.update_object('metadata', {'chunks_num': 3})
+        bank_section.update_object('data_1', b'abcd')
+        bank_section.update_object('data_2', b'xxxx')
+        bank_section.update_object('manifest', [
+            chunk_store.chunk_digest(b'abcd'),
+            chunk_store.chunk_digest(b'efgh'),
+            chunk_store.chunk_digest(b'ij'),
+        ])
+
+        corrupted = image_protection_plugin.scrub_image_backup(bank_section)
+        self.assertEqual(['data_2', 'data_3'], corrupted)
+
+    def test_scrub_image_backup_without_manifest(self):
+        bank_section = Bank(InMemoryBankPlugin()).get_sub_section('/image')
+        bank_section.update_object('data_1', b'abcd')
+        self.assertIsNone(
+            image_protection_plugin.scrub_image_backup(bank_section))
+
     def test_get_supported_resources_types(self):
         types = self.plugin.get_supported_resources_types()
         self.assertEqual(types,
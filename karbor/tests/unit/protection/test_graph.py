@@ -214,6 +214,40 @@ class GraphBuilderTest(base.TestCase):
         for start_node in test_graph:
             self.assertIn(start_node, unpacked_graph)
 
+    def test_select_subgraph(self):
+        server = resource.Resource('server', 's1', 'server')
+        volume = resource.Resource('volume', 'v1', 'volume')
+        image = resource.Resource('image', 'i1', 'image')
+        other_server = resource.Resource('server', 's2', 'other_server')
+        test_base = {
+            server: [volume, image],
+            volume: [],
+            image: [],
+            other_server: [],
+        }
+        test_graph = graph.build_graph(test_base.keys(), test_base.__getitem__)
+
+        subgraph = graph.select_subgraph(test_graph, ['server#s1'])
+        self.assertEqual([server], [node.value for node in subgraph])
+        self.assertEqual({volume, image},
+                         {node.value for node in subgraph[0].child_nodes})
+
+        # a selected child of a selected resource is not a start node
+        subgraph = graph.select_subgraph(test_graph,
+                                         ['volume#v1', 'server#s1'])
+        self.assertEqual([server], [node.value for node in subgraph])
+
+        subgraph = graph.select_subgraph(test_graph,
+                                         ['volume#v1', 'server#s2'])
+        self.assertEqual({volume, other_server},
+                         {node.value for node in subgraph})
+
+    def test_select_subgraph_unknown_resource(self):
+        server = resource.Resource('server', 's1', 'server')
+        test_graph = graph.build_graph([server], lambda node: [])
+        with self.assertRaisesRegex(exception.InvalidInput, "volume#v1"):
+            graph.select_subgraph(test_graph, ['server#s1', 'volume#v1'])
+
 
 class _TestGraphWalkerListener(graph.GraphWalkerListener):
     def __init__(self, expected_event_stream, test):
@@ -10,15 +10,23 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+
+from eventlet import event
+from eventlet import greenthread
+import fixtures
 import mock
 
 from oslo_config import cfg
 import oslo_messaging
 
+from karbor.common import constants
 from karbor import exception
 from karbor.resource import Resource
+from karbor.services.protection.flows import persistence as flow_persistence
 from karbor.services.protection.flows import worker as flow_manager
 from karbor.services.protection import manager
+from karbor.services.protection import operation_queue
 from karbor.services.protection import protectable_registry
 from karbor.services.protection import provider
 
@@ -37,6 +45,85 @@ class ProtectionServiceTest(base.TestCase):
         self.pro_manager = manager.ProtectionManager()
         self.protection_plan = fakes.fake_protection_plan()
 
+    @mock.patch('os.getpid')
+    def test_init_host_in_forked_worker(self, mock_getpid):
+        registry = self.pro_manager.provider_registry
+        mock_getpid.return_value = self.pro_manager._pid
+        self.pro_manager.init_host()
+        self.assertIs(registry, self.pro_manager.provider_registry)
+
+        mock_getpid.return_value = self.pro_manager._pid + 1
+        self.pro_manager.init_host()
+        self.assertIsNot(registry, self.pro_manager.provider_registry)
+        self.assertEqual(mock_getpid.return_value, self.pro_manager._pid)
+
+    @mock.patch.object(flow_manager.Worker, 'get_flow')
+    @mock.patch.object(provider.ProviderRegistry, 'show_provider')
+    @mock.patch.object(flow_persistence, 'get_context')
+    @mock.patch.object(flow_persistence, 'claim_unfinished_logbooks')
+    @mock.patch.object(flow_persistence, 'get_backend')
+    def test_init_host_resumes_flows(self, mock_backend, mock_claim,
+                                     mock_context, mock_provider, mock_flow):
+        book = mock.MagicMock(meta={
+            'operation_type': 'protect',
+            'provider_id': 'provider1',
+            'checkpoint_id': 'fake_checkpoint',
+            'plan': self.protection_plan,
+            'user_id': 'fake_user_id',
+            'project_id': 'fake_project_id',
+            'trust_id': 'fake_trust_id',
+        })
+        mock_claim.return_value = [(book, mock.sentinel.flow_detail)]
+        mock_context.return_value = mock.MagicMock(
+            project_id='fake_project_id')
+        mock_provider.return_value = fakes.FakeProvider()
+        queue = self.pro_manager._operation_queue
+        queue.resubmit = mock.MagicMock()
+
+        self.pro_manager.init_host()
+
+        mock_context.assert_called_once_with(book)
+        self.assertIs(mock_context.return_value,
+                      mock_flow.call_args[1]['context'])
+        self.assertEqual((book, mock.sentinel.flow_detail),
+                         mock_flow.call_args[1]['logbook'])
+        self.assertEqual(self.protection_plan, mock_flow.call_args[1]['plan'])
+        queue.resubmit.assert_called_once_with(
+            'protect', 'fake_project_id', self.pro_manager.worker.run_flow,
+            mock_flow.return_value)
+
+    @mock.patch.object(flow_manager.Worker, 'run_flow')
+    @mock.patch.object(flow_manager.Worker, 'get_flow')
+    @mock.patch.object(provider.ProviderRegistry, 'show_provider')
+    @mock.patch.object(flow_persistence, 'get_context')
+    @mock.patch.object(flow_persistence, 'claim_unfinished_logbooks')
+    @mock.patch.object(flow_persistence, 'get_backend')
+    def test_init_host_resumes_more_flows_than_queue_slots(
+            self, mock_backend, mock_claim, mock_context, mock_provider,
+            mock_flow, mock_run_flow):
+        self.pro_manager._operation_queue = operation_queue.OperationQueue(
+            max_running=1, max_queued=1)
+        mock_claim.return_value = [
+            (mock.MagicMock(meta={
+                'operation_type': 'delete',
+                'provider_id': 'provider1',
+                'checkpoint_id': 'checkpoint%s' % num,
+                'trust_id': 'fake_trust_id',
+            }), mock.sentinel.flow_detail)
+            for num in range(3)]
+        mock_provider.return_value = fakes.FakeProvider()
+        blocker = event.Event()
+        mock_run_flow.side_effect = lambda flow: blocker.wait()
+
+        self.pro_manager.init_host()
+        statistics = self.pro_manager._operation_queue.statistics()
+        self.assertEqual(1, statistics['running'])
+        self.assertEqual(2, statistics['queued'])
+        blocker.send()
+        for _ in range(5):
+            greenthread.sleep(0)
+        self.assertEqual(3, mock_run_flow.call_count)
+
     @mock.patch.object(protectable_registry.ProtectableRegistry,
                        'list_resource_types')
     def test_list_protectable_types(self, mocker):
@@ -124,13 +211,144 @@ class ProtectionServiceTest(base.TestCase):
         mock_provider.return_value = fakes.FakeProvider()
         self.pro_manager.protect(None, fakes.fake_protection_plan())
 
+    @mock.patch.object(provider.ProviderRegistry, 'show_provider')
     @mock.patch.object(flow_manager.Worker, 'get_flow')
-    def test_protect_in_error(self, mock_flow):
+    def test_protect_in_error(self, mock_flow, mock_provider):
+        mock_provider.return_value = fakes.FakeProvider()
+        checkpoint = fakes.FakeCheckpoint()
         mock_flow.side_effect = Exception()
+        with mock.patch.object(fakes.FakeCheckpointCollection, 'create',
+                               return_value=checkpoint):
+            checkpoint_id = self.pro_manager.protect(
+                None, fakes.fake_protection_plan())
+            self.assertEqual(checkpoint.id, checkpoint_id)
+            greenthread.sleep(0)
+        self.assertEqual(constants.CHECKPOINT_STATUS_ERROR,
+                         checkpoint.status)
+
+    @mock.patch.object(provider.ProviderRegistry, 'show_provider')
+    def test_protect_returns_before_graph_build(self, mock_provider):
+        mock_provider.return_value = fakes.FakeProvider()
+        with mock.patch.object(self.pro_manager,
+                               '_spawn_reserved') as mock_spawn:
+            with mock.patch.object(self.pro_manager.protectable_registry,
+                                   'build_graph') as mock_build_graph:
+                self.pro_manager.protect(None, fakes.fake_protection_plan())
+        self.assertFalse(mock_build_graph.called)
+        self.assertEqual(self.pro_manager._run_protect,
+                         mock_spawn.call_args[0][2])
+
+    @mock.patch.object(provider.ProviderRegistry, 'show_provider')
+    def test_protect_queue_filled_while_creating_checkpoint(self,
+                                                            mock_provider):
+        mock_provider.return_value = fakes.FakeProvider()
+        queue = operation_queue.OperationQueue(max_running=1, max_queued=1)
+        self.pro_manager._operation_queue = queue
+        blocker = event.Event()
+        queue.submit(constants.OPERATION_PROTECT, 'p1', blocker.wait)
+        checkpoint = fakes.FakeCheckpoint()
+
+        def create(plan, checkpoint_properties=None):
+            # other requests are served while the checkpoint is written
+            self.assertRaises(exception.OperationQueueFull, queue.submit,
+                              constants.OPERATION_DELETE, 'p2', mock.Mock())
+            return checkpoint
+
+        with mock.patch.object(fakes.FakeCheckpointCollection, 'create',
+                               side_effect=create):
+            with mock.patch.object(self.pro_manager,
+                                   '_run_protect') as mock_run_protect:
+                self.assertEqual(checkpoint.id, self.pro_manager.protect(
+                    None, fakes.fake_protection_plan()))
+                self.assertEqual(1, queue.statistics()['queued'])
+                blocker.send()
+                for _ in range(5):
+                    greenthread.sleep(0)
+        self.assertEqual(1, mock_run_protect.call_count)
+        self.assertEqual(0, queue.statistics()['reserved'])
+
+    @mock.patch.object(provider.ProviderRegistry, 'show_provider')
+    def test_protect_persisted_before_returning(self, mock_provider):
+        tempdir = self.useFixture(fixtures.TempDir()).path
+        self.override_config('flow_persistence_connection',
+                             'file://%s' % os.path.join(tempdir, 'flows'))
+        self.addCleanup(setattr, flow_persistence, '_backend', None)
+        mock_provider.return_value = fakes.FakeProvider()
+        checkpoint = fakes.FakeCheckpoint()
+        with mock.patch.object(fakes.FakeCheckpointCollection, 'create',
+                               return_value=checkpoint):
+            with mock.patch.object(self.pro_manager,
+                                   '_spawn_reserved') as mock_spawn:
+                self.pro_manager.protect(None, self.protection_plan)
+        logbook = mock_spawn.call_args[0][-1]
+        self.assertEqual(self.pro_manager._run_protect,
+                         mock_spawn.call_args[0][2])
+
+        # the service restarts before the queued protect started
+        claimed = flow_persistence.claim_unfinished_logbooks(
+            flow_persistence.get_backend())
+        self.assertEqual([logbook[0].uuid],
+                         [book.uuid for book, _ in claimed])
+        self.assertEqual(checkpoint.id, claimed[0][0].meta['checkpoint_id'])
+        self.assertEqual(self.protection_plan, claimed[0][0].meta['plan'])
+
+    @mock.patch.object(flow_persistence, 'destroy_logbook')
+    @mock.patch.object(provider.ProviderRegistry, 'show_provider')
+    @mock.patch.object(flow_persistence, 'get_context')
+    @mock.patch.object(flow_persistence, 'claim_unfinished_logbooks')
+    @mock.patch.object(flow_persistence, 'get_backend')
+    def test_init_host_fails_checkpoint_not_resumed(
+            self, mock_backend, mock_claim, mock_context, mock_provider,
+            mock_destroy):
+        book = mock.MagicMock(meta={
+            'operation_type': 'protect',
+            'provider_id': 'provider1',
+            'checkpoint_id': 'fake_checkpoint',
+            'plan': self.protection_plan,
+        })
+        mock_claim.return_value = [(book, mock.sentinel.flow_detail)]
+        mock_provider.return_value = fakes.FakeProvider()
+        checkpoint = fakes.FakeCheckpoint()
+        checkpoint.status = constants.CHECKPOINT_STATUS_PROTECTING
+        with mock.patch.object(fakes.FakeCheckpointCollection, 'get',
+                               return_value=checkpoint):
+            with mock.patch.object(self.pro_manager.worker, 'get_flow',
+                                   side_effect=Exception()):
+                self.pro_manager.init_host()
+        mock_destroy.assert_called_once_with(mock_backend.return_value,
+                                             book)
+        self.assertEqual(constants.CHECKPOINT_STATUS_ERROR,
+                         checkpoint.status)
+
+    @mock.patch.object(provider.ProviderRegistry, 'show_provider')
+    def test_protect_releases_slot_on_error(self, mock_provider):
+        mock_provider.return_value = fakes.FakeProvider()
+        with mock.patch.object(fakes.FakeCheckpointCollection, 'create',
+                               side_effect=Exception()):
+            self.assertRaises(oslo_messaging.ExpectedException,
+                              self.pro_manager.protect, None,
+                              fakes.fake_protection_plan())
+        self.assertEqual(
+            0, self.pro_manager._operation_queue.statistics()['reserved'])
+
+    @mock.patch.object(flow_manager.Worker, 'get_flow')
+    @mock.patch.object(provider.ProviderRegistry, 'show_provider')
+    def test_restore_selected_resources(self, mock_provider, mock_flow):
+        mock_provider.return_value = fakes.FakeProvider()
+        restore = fakes.fake_restore()
+        restore['parameters'] = {}
+        self.pro_manager._spawn_reserved = mock.MagicMock()
+
+        self.pro_manager.restore(None, restore, None, resources=['fake#C'])
+        resource_graph = mock_flow.call_args[1]['resource_graph']
+        self.assertEqual([fakes.C], [node.value for node in resource_graph])
+        self.assertEqual(
+            {fakes.D, fakes.E},
+            {node.value for node in resource_graph[0].child_nodes})
+
         self.assertRaises(oslo_messaging.ExpectedException,
-                          self.pro_manager.protect,
-                          None,
-                          fakes.fake_protection_plan())
+                          self.pro_manager.restore, None, restore, None,
+                          resources=['fake#F'])
 
     @mock.patch.object(provider.ProviderRegistry, 'show_provider')
     def test_show_checkpoint(self, mock_provider):
@@ -0,0 +1,122 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from eventlet import event
+from eventlet import greenthread
+
+from karbor.common import constants
+from karbor import exception
+from karbor.services.protection import operation_queue
+from karbor.tests import base
+
+
+class OperationQueueTest(base.TestCase):
+    def setUp(self):
+        super(OperationQueueTest, self).setUp()
+        self.started = []
+        self.blocker = event.Event()
+
+    def _block(self):
+        self.blocker.wait()
+
+    def _submit(self, queue, operation_type, project_id, name):
+        queue.submit(operation_type, project_id, self.started.append, name)
+
+    def _run_queue(self, queue):
+        self.blocker.send()
+        for _ in range(10):
+            greenthread.sleep(0)
+
+    def test_priorities(self):
+        queue = operation_queue.OperationQueue(max_running=1)
+        queue.submit(constants.OPERATION_PROTECT, 'p1', self._block)
+        self._submit(queue, constants.OPERATION_DELETE, 'p1', 'delete')
+        self._submit(queue, constants.OPERATION_PROTECT, 'p1', 'protect')
+        self._submit(queue, constants.OPERATION_RESTORE, 'p1', 'restore')
+
+        self._run_queue(queue)
+        self.assertEqual(['restore', 'protect', 'delete'], self.started)
+
+    def test_fair_between_projects(self):
+        queue = operation_queue.OperationQueue(max_running=1)
+        queue.submit(constants.OPERATION_PROTECT, 'p1', self._block)
+        for num in range(3):
+            self._submit(queue, constants.OPERATION_PROTECT, 'p1',
+                         'p1-%s' % num)
+        self._submit(queue, constants.OPERATION_PROTECT, 'p2', 'p2-0')
+
+        self._run_queue(queue)
+        self.assertEqual(['p1-0', 'p2-0', 'p1-1', 'p1-2'], self.started)
+
+    def test_project_weights(self):
+        queue = operation_queue.OperationQueue(
+            max_running=1, project_weights={'p2': '2'})
+        queue.submit(constants.OPERATION_PROTECT, 'p1', self._block)
+        for num in range(2):
+            self._submit(queue, constants.OPERATION_PROTECT, 'p1',
+                         'p1-%s' % num)
+        for num in range(4):
+            self._submit(queue, constants.OPERATION_PROTECT, 'p2',
+                         'p2-%s' % num)
+
+        self._run_queue(queue)
+        self.assertEqual(['p2-0', 'p1-0', 'p2-1', 'p2-2', 'p1-1', 'p2-3'],
+                         self.started)
+
+    def test_reject_when_full(self):
+        queue = operation_queue.OperationQueue(max_running=1, max_queued=1)
+        queue.submit(constants.OPERATION_PROTECT, 'p1', self._block)
+        self._submit(queue, constants.OPERATION_PROTECT, 'p1', 'queued')
+        self.assertRaises(exception.OperationQueueFull,
+                          queue.check_admission,
+                          constants.OPERATION_RESTORE)
+        self.assertRaises(exception.OperationQueueFull,
+                          self._submit, queue,
+                          constants.OPERATION_PROTECT, 'p2', 'rejected')
+
+        self._run_queue(queue)
+        self.assertEqual(['queued'], self.started)
+        statistics = queue.statistics()
+        self.assertEqual(0, statistics['queued'])
+        self.assertEqual(
+            1, statistics['operations'][constants.OPERATION_PROTECT][
+                'rejected'])
+        self.assertEqual(
+            2, statistics['operations'][constants.OPERATION_PROTECT][
+                'started'])
+
+    def test_reserve(self):
+        queue = operation_queue.OperationQueue(max_running=1, max_queued=1)
+        queue.submit(constants.OPERATION_PROTECT, 'p1', self._block)
+        queue.reserve(constants.OPERATION_PROTECT)
+        self.assertRaises(exception.OperationQueueFull,
+                          self._submit, queue,
+                          constants.OPERATION_RESTORE, 'p2', 'rejected')
+        self.assertEqual(1, queue.statistics()['reserved'])
+
+        queue.submit_reserved(constants.OPERATION_PROTECT, 'p1',
+                              self.started.append, 'reserved')
+        self.assertEqual(0, queue.statistics()['reserved'])
+        self._run_queue(queue)
+        self.assertEqual(['reserved'], self.started)
+
+        queue.reserve(constants.OPERATION_DELETE)
+        queue.release()
+        self.assertEqual(0, queue.statistics()['reserved'])
+
+    def test_no_limit(self):
+        queue = operation_queue.OperationQueue()
+        queue.submit(constants.OPERATION_PROTECT, 'p1', self._block)
+        self._submit(queue, constants.OPERATION_DELETE, 'p1', 'delete')
+        self.assertEqual(2, queue.statistics()['running'])
+        self._run_queue(queue)
+        self.assertEqual(['delete'], self.started)
@@ -60,15 +60,13 @@ class ResourceFlowTest(base.TestCase):
             grandchild_type: protection,
         }
         flow = resource_flow.build_resource_flow(operation_type,
-                                                 context,
                                                  self.taskflow_engine,
                                                  plugin_map,
-                                                 self.test_graph,
-                                                 parameters)
+                                                 self.test_graph)
 
-        store = {
-            'checkpoint': checkpoint
-        }
+        store = resource_flow.build_resource_store(context, self.test_graph,
+                                                   parameters)
+        store['checkpoint'] = checkpoint
         store.update(kwargs)
 
         engine = self.taskflow_engine.get_engine(flow,
@@ -208,3 +206,55 @@ class ResourceFlowTest(base.TestCase):
                             order_list.index(('main', resource_id)))
             self.assertLess(order_list.index(('main', resource_id)),
                             order_list.index(('complete', resource_id)))
+
+    @mock.patch('karbor.tests.unit.protection.fakes.FakeProtectionPlugin')
+    def test_resource_flow_reused_with_run_parameters(self, mock_protection):
+        mock_operation = fakes.MockOperation()
+        mock_protection.get_protect_operation.return_value = mock_operation
+        self.provider.load_plugins = mock.MagicMock(return_value={
+            parent_type: mock_protection,
+            child_type: mock_protection,
+            grandchild_type: mock_protection,
+        })
+        flow_cache = resource_flow.ResourceFlowCache(max_size=4)
+
+        for value in ('value1', 'value2'):
+            flow = flow_cache.get_flow(constants.OPERATION_PROTECT,
+                                       self.taskflow_engine, self.provider,
+                                       self.test_graph)
+            parameters = {parent_type: {'option': value}}
+            store = resource_flow.build_resource_store(
+                'context', self.test_graph, parameters)
+            store['checkpoint'] = 'checkpoint'
+            engine = self.taskflow_engine.get_engine(flow, store=store)
+            flow_cache.release_when_finished(engine, flow)
+            self.taskflow_engine.run_engine(engine)
+            mock_operation.on_main.assert_any_call(
+                checkpoint='checkpoint', context='context',
+                resource=parent, parameters={'option': value})
+
+        self.assertEqual(1, self.provider.load_plugins.call_count)
+        self.assertEqual(1, flow_cache.hits)
+        self.assertEqual(1, flow_cache.misses)
+
+    def test_resource_flow_cache_exclusive_use(self):
+        flow_cache = resource_flow.ResourceFlowCache(max_size=1)
+        with mock.patch.object(resource_flow, 'build_resource_flow',
+                               side_effect=lambda *args: mock.Mock()):
+            get_flow = partial(flow_cache.get_flow,
+                               constants.OPERATION_PROTECT,
+                               self.taskflow_engine, self.provider)
+            first = get_flow(self.test_graph)
+            second = get_flow(self.test_graph)
+            self.assertIsNot(first, second)
+
+            flow_cache.release(first)
+            flow_cache.release(second)
+            # only max_size idle flows are kept
+            self.assertIs(second, get_flow(self.test_graph))
+            self.assertIsNot(first, get_flow(self.test_graph))
+
+            other_graph = graph.build_graph([child],
+                                            self.resource_graph.__getitem__)
+            flow_cache.release(first)
+            self.assertIsNot(first, get_flow(other_graph))
@@ -0,0 +1,53 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from karbor import exception
+from karbor.services.protection import rpcapi
+from karbor.tests import base
+
+
+class ProtectionAPITest(base.TestCase):
+    def setUp(self):
+        super(ProtectionAPITest, self).setUp()
+        self.rpcapi = rpcapi.ProtectionAPI()
+        self.rpcapi.client = mock.MagicMock()
+        self.cctxt = self.rpcapi.client.prepare.return_value
+
+    def test_restore(self):
+        self.rpcapi.restore(None, 'restore', 'auth')
+        self.rpcapi.client.prepare.assert_called_once_with(version='1.0')
+        self.cctxt.call.assert_called_once_with(
+            None, 'restore', restore='restore', restore_auth='auth')
+
+    def test_restore_resources(self):
+        self.rpcapi.client.can_send_version.return_value = True
+        self.rpcapi.restore(None, 'restore', 'auth', resources=['A#a'])
+        self.rpcapi.client.can_send_version.assert_called_once_with('1.1')
+        self.rpcapi.client.prepare.assert_called_once_with(version='1.1')
+        self.cctxt.call.assert_called_once_with(
+            None, 'restore', restore='restore', restore_auth='auth',
+            resources=['A#a'])
+
+    def test_restore_resources_old_service(self):
+        self.rpcapi.client.can_send_version.return_value = False
+        self.assertRaises(exception.InvalidInput, self.rpcapi.restore,
+                          None, 'restore', 'auth', resources=['A#a'])
+        self.assertFalse(self.cctxt.call.called)
+
+    def test_restore_resources_version_cap(self):
+        self.override_config('protection', '1.0', group='upgrade_levels')
+        protection_api = rpcapi.ProtectionAPI()
+        self.assertFalse(protection_api.client.can_send_version('1.1'))
+        self.assertRaises(exception.InvalidInput, protection_api.restore,
+                          None, 'restore', 'auth', resources=['A#a'])
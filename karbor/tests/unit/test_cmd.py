@@ -19,6 +19,7 @@ except ImportError:
 from oslo_config import cfg
 
 from karbor.cmd import api as karbor_api
+from karbor.cmd import protection as karbor_protection
 from karbor.tests import base
 from karbor import version
 
@@ -57,3 +58,25 @@ class TestKarborApiCmd(base.TestCase):
         launcher.launch_service.assert_called_once_with(server,
                                                         workers=server.workers)
         launcher.wait.assert_called_once_with()
+
+
+class TestKarborProtectionCmd(base.TestCase):
+    """Unit test cases for the karbor protection service command."""
+
+    def setUp(self):
+        super(TestKarborProtectionCmd, self).setUp()
+        sys.argv = ['karbor-protection']
+
+    @mock.patch('karbor.service.wait')
+    @mock.patch('karbor.service.serve')
+    @mock.patch('karbor.service.Service.create')
+    @mock.patch('oslo_log.log.setup')
+    def test_main_workers(self, log_setup, service_create, serve, wait):
+        self.override_config('protection_workers', 4)
+        server = service_create.return_value
+
+        karbor_protection.main()
+
+        service_create.assert_called_once_with(binary='karbor-protection')
+        serve.assert_called_once_with(server, workers=4)
+        wait.assert_called_once_with()